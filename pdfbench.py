@@ -0,0 +1,387 @@
+"""
+    Benchmark the PDF tools on synthetic documents.
+
+    Usage:
+
+    python pdfbench.py [--tiers small,medium,large] [--repeat 3] \
+                       [--output results.json] [--baseline base.json] \
+                       [--threshold 0.25] [--workdir path] [--verify]
+
+    Command line options:
+
+        --tiers       Comma separated size tiers to run (default: small,medium)
+                      small:  20 pages      medium: 1000 pages
+                      large:  10000 pages
+
+        --repeat      Number of timed runs per case; the median is reported
+
+        --output      Optional JSON file receiving the results
+
+        --baseline    Optional JSON results file from an earlier run. Cases
+                      slower or using more memory than the baseline by more
+                      than --threshold are reported as regressions and the
+                      exit status is 1.
+
+        --threshold   Allowed relative slowdown before a case is flagged
+                      (default 0.25, ie. 25%)
+
+        --workdir     Optional directory for the generated documents,
+                      created if needed (default: a temporary directory)
+
+        --verify      Instead of timing, check that rotate, reorder and
+                      combine copy stream data byte for byte and that their
+                      peak memory does not grow with the size of the
+                      streams. The exit status is 1 on failure.
+
+    Each tier is generated in several variants: classic xref table or
+    cross reference stream, optional RC4 encryption (with an empty or a
+    given user password) and resources shared between pages. Every tool class then runs
+    validate_inputs() + process() on each variant; wall time is measured
+    without tracing and peak Python memory in a separate run under
+    tracemalloc. The reorder-objstm cases write the same output as reorder
+    with compressed object streams, at zlib levels 6 and 1, to show the
+    output size saved against the time spent.
+
+    Example: Record a baseline, then compare against it after a change
+
+              python pdfbench.py --output base.json
+              python pdfbench.py --baseline base.json
+
+"""
+import argparse
+import hashlib
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+import zlib
+import PyPDF2
+import pdftools_utils as pu
+import pdfcombine
+import pdfinfo
+import pdfreorder
+import pdfrotate
+import pdfsplit
+
+TIERS = {'small': 20, 'medium': 1000, 'large': 10000}
+
+VARIANTS = {'table':   {'xrefStream': False}
+          , 'xrefstm': {'xrefStream': True}
+          , 'shared':  {'xrefStream': False, 'sharedSize': 65536}
+          , 'rc4':     {'xrefStream': False, 'encrypt': True}
+          , 'rc4-user': {'xrefStream': False, 'encrypt': True, 'password': 'user'}}
+
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-t', '--tiers',     help='Size tiers',         type=str, default = 'small,medium')
+    parser.add_argument('-n', '--repeat',    help='Timed runs per case', type=int, default = 3)
+    parser.add_argument('-o', '--output',    help='Results JSON file',  type=str, default = '')
+    parser.add_argument('-b', '--baseline',  help='Baseline JSON file', type=str, default = '')
+    parser.add_argument('-r', '--threshold', help='Regression threshold', type=float, default = 0.25)
+    parser.add_argument('-w', '--workdir',   help='Work directory',     type=str, default = '')
+    parser.add_argument('-v', '--verify',    help='Check pass-through stream copying', action='store_true')
+    args = parser.parse_args()
+    if args.workdir:
+        try:
+            os.makedirs(args.workdir, exist_ok=True)
+        except OSError as e:
+            parser.error('Cannot use work directory {0}: {1}'.format(args.workdir, e))
+    return args
+
+
+def makePdf(pathfile, pages, streamSize=256, objects=2, sharedSize=0
+          , xrefStream=False, encrypt=False, password='', fanout=32, flate=False):
+    '''
+    Write a synthetic PDF file.
+    pages      - number of pages
+    streamSize - approximate size in bytes of each page's content stream
+    objects    - number of extra objects (link annotations) per page
+    sharedSize - size of an image XObject shared by every page (0 for none)
+    xrefStream - write a cross reference stream instead of an xref table
+    encrypt    - encrypt with RC4
+    password   - user password of the encrypted file (default: empty)
+    fanout     - maximum number of kids per page tree node
+    flate      - compress the content streams with /FlateDecode
+    '''
+    objs = dict()
+    nextId = [3]
+    def add(body):
+        idnum = nextId[0]
+        nextId[0] += 1
+        objs[idnum] = body
+        return idnum
+
+    resources = b'<< /Font << /F1 << /Type /Font /Subtype /Type1 /BaseFont /Helvetica >> >>'
+    if sharedSize:
+        image = os.urandom(sharedSize)
+        imgId = add(b'<< /Type /XObject /Subtype /Image /Width 256 /Height '
+                  + str(max(1, sharedSize // 256)).encode()
+                  + b' /ColorSpace /DeviceGray /BitsPerComponent 8 /Length '
+                  + str(len(image)).encode() + b' >>\nstream\n' + image + b'\nendstream')
+        resources += b' /XObject << /Im0 ' + str(imgId).encode() + b' 0 R >>'
+    resources += b' >>'
+
+    pageIds = list()
+    for i in range(pages):
+        text = 'BT /F1 24 Tf 72 720 Td (Page {0}) Tj ET\n'.format(i + 1).encode()
+        filler = b'% ' + b'x' * 76 + b'\n'
+        content = text + filler * max(0, (streamSize - len(text)) // len(filler))
+        filters = b''
+        if flate:
+            content = zlib.compress(content)
+            filters = b' /Filter /FlateDecode'
+        contentId = add(b'<< /Length ' + str(len(content)).encode() + filters
+                      + b' >>\nstream\n' + content + b'\nendstream')
+        annots = [add('<< /Type /Annot /Subtype /Link /Rect [0 0 {0} {0}] /Border [0 0 0] >>'
+                      .format(10 + j).encode()) for j in range(objects)]
+        pageIds.append(add(b'<< /Type /Page /MediaBox [0 0 612 792] /Resources '
+                         + resources + b' /Contents ' + str(contentId).encode() + b' 0 R'
+                         + b' /Annots [' + b' '.join(str(a).encode() + b' 0 R' for a in annots)
+                         + b'] /Parent %PARENT% >>'))
+
+    # Balanced page tree; the root is object 2
+    level = [(idnum, 1) for idnum in pageIds]
+    while len(level) > fanout or not level:
+        parents = list()
+        for i in range(0, len(level), fanout):
+            kids = level[i:i + fanout]
+            parents.append((add(kids), sum(count for idnum, count in kids)))
+        level = parents
+    objs[2] = level
+    parentOf = dict()
+    for idnum, body in objs.items():
+        if isinstance(body, list):
+            for kid, count in body:
+                parentOf[kid] = idnum
+    for idnum, body in list(objs.items()):
+        if isinstance(body, list):
+            kids = b' '.join(str(kid).encode() + b' 0 R' for kid, count in body)
+            body = (b'<< /Type /Pages /Kids [' + kids + b'] /Count '
+                  + str(sum(count for kid, count in body)).encode())
+            if idnum != 2:
+                body += b' /Parent %PARENT%'
+            objs[idnum] = body + b' >>'
+        if idnum in parentOf:
+            objs[idnum] = objs[idnum].replace(b'%PARENT%', str(parentOf[idnum]).encode() + b' 0 R')
+    objs[1] = b'<< /Type /Catalog /Pages 2 0 R >>'
+    infoId = add(b'<< /Title (Synthetic benchmark document) /Producer (pdfbench) >>')
+
+    out = bytearray(b'%PDF-1.5\n%\xe2\xe3\xcf\xd3\n')
+    offsets = dict()
+    for idnum in sorted(objs):
+        offsets[idnum] = len(out)
+        out += str(idnum).encode() + b' 0 obj\n' + objs[idnum] + b'\nendobj\n'
+    size = nextId[0]
+    if xrefStream:
+        offsets[size] = len(out)
+        rows = bytearray(b'\x00\x00\x00\x00\x00\xff\xff')
+        for idnum in range(1, size + 1):
+            rows += b'\x01' + offsets[idnum].to_bytes(4, 'big') + b'\x00\x00'
+        data = zlib.compress(bytes(rows))
+        out += (str(size).encode() + b' 0 obj\n<< /Type /XRef /Size ' + str(size + 1).encode()
+              + b' /W [1 4 2] /Root 1 0 R /Info ' + str(infoId).encode()
+              + b' 0 R /Filter /FlateDecode /Length ' + str(len(data)).encode()
+              + b' >>\nstream\n' + data + b'\nendstream\nendobj\n')
+        xref = offsets[size]
+    else:
+        xref = len(out)
+        out += b'xref\n0 ' + str(size).encode() + b'\n0000000000 65535 f\r\n'
+        for idnum in range(1, size):
+            out += '{0:010d} 00000 n\r\n'.format(offsets[idnum]).encode()
+        out += (b'trailer\n<< /Size ' + str(size).encode() + b' /Root 1 0 R /Info '
+              + str(infoId).encode() + b' 0 R >>\n')
+    out += b'startxref\n' + str(xref).encode() + b'\n%%EOF\n'
+    with open(pathfile, 'wb') as fh:
+        fh.write(out)
+
+    if encrypt:
+        with open(pathfile, 'rb') as fh:
+            Reader = PyPDF2.PdfFileReader(fh)
+            Writer = PyPDF2.PdfFileWriter()
+            Writer.appendPagesFromReader(Reader)
+            Writer.encrypt(password, 'owner')
+            with open(pathfile + '.tmp', 'wb') as fw:
+                Writer.write(fw)
+        os.replace(pathfile + '.tmp', pathfile)
+
+
+def cases(pathfile, N, password=''):
+    '''
+    Return (name, processor class, kwargs) for each benchmarked operation.
+    '''
+    encrypted = pu.PdfDoc(pathfile)
+    encrypted.close()
+    half = '1-{0}'.format(max(1, N // 2))
+    c = [('rotate', pdfrotate.PdfRotator
+        , {'inpath': pathfile, 'pages': half, 'rotation': 'CW'})
+       , ('reorder', pdfreorder.PdfReorderer
+        , {'inpath': pathfile, 'pages': '{0}-1'.format(N)})
+       , ('combine', pdfcombine.PdfCombiner
+        , {'inpath': [[pathfile], [pathfile, half, 'FV']]
+         , 'outpath': pathfile + '_combined.pdf'})
+       , ('reorder-objstm', pdfreorder.PdfReorderer
+        , {'inpath': pathfile, 'pages': '{0}-1'.format(N), 'object_streams': True})
+       , ('reorder-objstm-fast', pdfreorder.PdfReorderer
+        , {'inpath': pathfile, 'pages': '{0}-1'.format(N), 'object_streams': True
+         , 'compress_level': 1})
+       , ('split', pdfsplit.PdfSplitter, {'inpath': pathfile, 'every': 10})
+       , ('info', pdfinfo.PdfInfo, {'inpath': pathfile})]
+    if not encrypted.isEncrypted:
+        c.append(('rotate-incremental', pdfrotate.PdfRotator
+                , {'inpath': pathfile, 'pages': '1', 'rotation': 'CW', 'incremental': True}))
+    if password:
+        for name, cls, kwargs in c:
+            kwargs['password'] = password
+    return c
+
+
+def runCase(cls, kwargs):
+    P = cls()
+    ok = P.validate_inputs(**kwargs) and P.process()
+    if not ok:
+        raise RuntimeError('{0} failed: {1}'.format(cls.__name__, P.status()))
+    return P
+
+
+def measure(cls, kwargs, repeat):
+    '''
+    Return median seconds, peak traced bytes and output size for one case.
+    '''
+    times = list()
+    for i in range(repeat):
+        t0 = time.perf_counter()
+        P = runCase(cls, kwargs)
+        times.append(time.perf_counter() - t0)
+    tracemalloc.start()
+    runCase(cls, kwargs)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    ofile = P.get_ofile() if hasattr(P, 'get_ofile') else None
+    return {'seconds': statistics.median(times), 'peak_bytes': peak
+          , 'output_bytes': os.path.getsize(ofile) if ofile else 0}
+
+
+def run(tiers, repeat, workdir):
+    results = dict()
+    for tier in tiers:
+        N = TIERS[tier]
+        for variant, options in VARIANTS.items():
+            pathfile = os.path.join(workdir, '{0}_{1}.pdf'.format(tier, variant))
+            makePdf(pathfile, N, **options)
+            for name, cls, kwargs in cases(pathfile, N, options.get('password', '')):
+                key = '{0}/{1}/{2}'.format(tier, variant, name)
+                results[key] = measure(cls, kwargs, repeat)
+                r = results[key]
+                print('{0:40s} {1:9.4f} s {2:10.1f} KiB peak {3:10.1f} KiB out'.format(
+                      key, r['seconds'], r['peak_bytes'] / 1024.0, r['output_bytes'] / 1024.0))
+    return results
+
+
+def compare(results, baseline, threshold):
+    '''
+    Return a list of messages for cases that regressed against baseline.
+    '''
+    regressions = list()
+    for key, r in sorted(results.items()):
+        b = baseline.get(key)
+        if b is None:
+            continue
+        for metric in ('seconds', 'peak_bytes'):
+            if b[metric] and r[metric] > b[metric] * (1 + threshold):
+                regressions.append('{0} {1}: {2:.4g} vs baseline {3:.4g} (+{4:.0%})'.format(
+                    key, metric, r[metric], b[metric], r[metric] / b[metric] - 1))
+    return regressions
+
+
+def streamDigests(pathfile):
+    '''
+    Return the set of sha256 digests of the raw (still encoded) data of
+    every stream object in pathfile.
+    '''
+    digests = set()
+    with pu.PdfIndex(pathfile) as idx:
+        for idnum in range(1, int(idx.trailer['/Size'])):
+            entry = idx.entry(idnum)
+            if entry is None or entry[0] != 'n':
+                continue
+            obj = idx.getObject(PyPDF2.generic.IndirectObject(idnum, 0, idx))
+            if isinstance(obj, PyPDF2.generic.StreamObject) \
+                    and obj.get('/Type') not in ('/XRef', '/ObjStm'):
+                digests.add(hashlib.sha256(obj._data).hexdigest())
+    return digests
+
+
+def verify(workdir, sizes=(1, 4, 16)):
+    '''
+    Check pass-through stream copying: for documents whose shared image
+    is sizes MiB, the streams of the rotate, reorder and combine outputs
+    must be byte-identical to the input's, and the peak memory of each
+    tool must stay flat as the image grows.
+    Return a list of failure messages.
+    '''
+    failures = list()
+    peaks = dict()
+    for size in sizes:
+        pathfile = os.path.join(workdir, 'verify_{0}.pdf'.format(size))
+        makePdf(pathfile, 8, sharedSize=size << 20, flate=True)
+        source = streamDigests(pathfile)
+        for name, cls, kwargs in cases(pathfile, 8):
+            if name == 'info':
+                continue
+            tracemalloc.start()
+            P = runCase(cls, kwargs)
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            peaks.setdefault(name, list()).append(peak)
+            print('{0:24s} {1:3d} MiB image {2:10.1f} KiB peak'.format(
+                  name, size, peak / 1024.0))
+            if not streamDigests(P.get_ofile()) <= source:
+                failures.append('{0}: output streams differ from the input ({1} MiB)'.format(name, size))
+    for name, p in peaks.items():
+        # Anything that held the image in memory would grow by the
+        # difference in image sizes
+        if p[-1] > p[0] + ((sizes[-1] - sizes[0]) << 20) // 4:
+            failures.append('{0}: peak memory grows with stream size ({1} -> {2} bytes)'.format(
+                            name, p[0], p[-1]))
+    return failures
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    # Measure the tools, not the metadata cache
+    os.environ['PDFTOOLS_NO_CACHE'] = '1'
+    if args.verify:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            failures = verify(args.workdir or tmpdir)
+        for msg in failures:
+            print('FAILED ' + msg)
+        if failures:
+            sys.exit(1)
+        print('Stream data is passed through unchanged')
+        sys.exit(0)
+    tiers = [tier.strip() for tier in args.tiers.split(',') if tier.strip()]
+    with tempfile.TemporaryDirectory() as tmpdir:
+        workdir = args.workdir or tmpdir
+        results = run(tiers, args.repeat, workdir)
+    report = {'meta': {'python': platform.python_version()
+                     , 'PyPDF2': PyPDF2.__version__
+                     , 'platform': platform.platform()
+                     , 'time': time.strftime('%Y-%m-%dT%H:%M:%S')}
+            , 'results': results}
+    if args.output:
+        with open(args.output, 'w') as fh:
+            json.dump(report, fh, indent=2)
+    if args.baseline:
+        with open(args.baseline) as fh:
+            baseline = json.load(fh)['results']
+        regressions = compare(results, baseline, args.threshold)
+        for msg in regressions:
+            print('REGRESSION ' + msg)
+        if regressions:
+            sys.exit(1)
+        print('No regressions against {0}'.format(args.baseline))
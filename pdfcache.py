@@ -0,0 +1,73 @@
+"""
+    Inspect and empty the per-user caches of the PDF tools.
+
+    Usage:
+
+    python pdfcache.py stats [--outputs | --meta]
+
+    python pdfcache.py purge [--outputs | --meta]
+
+    Commands:
+
+        stats         Print the number of entries and the size of each
+                      cache as JSON, with the hits and misses of the
+                      output cache.
+
+        purge         Remove every entry.
+
+    Options:
+
+        --outputs     Only the output cache, which keeps the output files
+                      of jobs run with --cache
+
+        --meta        Only the metadata cache, which keeps the page counts
+                      and document info of input files
+
+    The caches live in the directory given by pdftools_utils.getCacheDir
+    (PDFTOOLS_CACHE_DIR overrides it). PDFTOOLS_OUTPUT_CACHE_MB sets the
+    size of the output cache, beyond which the least recently used
+    outputs are evicted (default: 1024).
+
+    Example: Show how often jobs were served from the output cache
+
+              python pdfcache.py stats --outputs
+
+"""
+import argparse
+import json
+import pdftools_utils as pu
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('command', choices=['stats', 'purge'])
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument('-o', '--outputs', help='Only the output cache', action='store_true')
+    group.add_argument('-m', '--meta',    help='Only the metadata cache', action='store_true')
+    return parser.parse_args()
+
+
+def caches(args):
+    '''
+    Return the selected caches by name; a cache that cannot be opened
+    is None.
+    '''
+    selected = dict()
+    if not args.outputs:
+        selected['meta'] = pu.getMetaCache()
+    if not args.meta:
+        selected['outputs'] = pu.getOutputCache()
+    return selected
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    result = dict()
+    for name, cache in caches(args).items():
+        if cache is None:
+            result[name] = 'unavailable'
+        elif args.command == 'stats':
+            result[name] = cache.stats()
+        else:
+            cache.purge()
+            result[name] = 'purged'
+    print(json.dumps(result, indent=2))
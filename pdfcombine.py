@@ -1,12 +1,16 @@
 """
-    Combine (merge) two pdf files.
+    Combine (merge) pdf files.
 
     Usage:
 
-    python pdfreorder.py --inpath1 "path/file1" --inpath2 "path/file2" \
+    python pdfcombine.py --inpath1 "path/file1" --inpath2 "path/file2" \
                          [--rotate1 CW|CCW|FV]  [--rotate2 CW|CCW|FV]  \
                          [--clobber]
 
+    python pdfcombine.py --inpath "path/file1" [pages [rotation]] \
+                         --inpath "path/file2" [pages [rotation]] ... \
+                         [--outpath "path/file"] [--clobber] [--linearize]
+
     Command line options:
 
         --inpath1     Path and file name of first input PDF file
@@ -20,12 +24,92 @@
 
         --rotate2     Optional rotation applied to all pages of file2
 
+        --inpath      Path and file name of an input PDF file, optionally
+                      followed by a page specification ("all" for every
+                      page) and a rotation applied to those pages.
+                      May be repeated for any number of input files;
+                      files are combined in the order given.
+
+        --outpath     Optional path and file name of the output file
+
         --clobber     Optional, if provided output overwrites file1
+                      (--in-place is accepted as well)
+
+        --linearize   Optional, write a linearized ("fast web view") file,
+                      whose first page displays before the whole file has
+                      been downloaded
+
+        --cache       Optional, keep the output in the per-user output
+                      cache and serve later runs of the same job on
+                      unchanged inputs from it (see pdfcache.py).
+                      Ignored when the output replaces an input
+
+        --repair      Optional, read input files whose cross reference
+                      sections are broken by rebuilding them from a scan
+                      of the whole file. The output is written with
+                      intact cross reference sections
+
+        --password    Optional password, user or owner, of encrypted
+                      input files that the empty password does not open.
+                      Without it, PDFTOOLS_PASSWORD_CALLBACK may name a
+                      function, as module:function, given the path of
+                      such a file and returning its password.
+                      The output is not encrypted
+
+        --object-streams
+                      Optional, pack objects other than streams into
+                      compressed object streams and write a compressed
+                      cross reference stream. Smaller output for documents
+                      with many small objects; requires PDF 1.5 readers.
+                      Ignored with --linearize
+
+        --compress-level
+                      Optional zlib level, 0-9, of --object-streams
+                      (default: 6)
+
+        --objects-per-stream
+                      Optional number of objects in each object stream
+                      (default: 100)
+
+        --progress    Optional, print progress to the terminal
+
+        --batch       Optional, run the same operation on many files: a
+                      directory (every .pdf file in it), a quoted glob
+                      pattern, or a manifest file listing one input path
+                      or one JSON object of arguments per line.
+                      Each file is combined with the files given by
+                      --inpath, if any, and written to the default
+                      output file name described below
+
+        --workers     Optional number of worker processes for --batch
+                      (default: number of CPUs)
 
-    If the --clobber option is not provided, then the output file name is
-    formed as file1_file2.pdf where file1 and file2 are the names of the
-    input files without extension. The output file is placed in the same
-    directory as the input file.
+        --summary     Optional file receiving the JSON batch summary
+                      (default: printed)
+
+        --profile     Optional file receiving a profile of the run: the
+                      time spent in each phase (opening, cross reference
+                      parsing, page copying, writing) and the bytes read
+                      and written, objects copied, pages and peak memory.
+                      With --batch, each job's profile is added to its
+                      summary entry instead. The PDFTOOLS_PROFILE
+                      environment variable sets the file as well
+
+        --profile-format
+                      Optional format of --profile: json (default), or
+                      chrome for a trace viewable in chrome://tracing
+
+    If neither the --outpath nor the --clobber option is provided, then the
+    output file name is formed as file1_file2.pdf where file1 and file2 are
+    the names of the input files without extension (file1_combined.pdf when
+    there are more than two input files). The output file is placed in the
+    same directory as the first input file. It only appears under its final
+    name, or replaces file1, once it is complete.
+
+    Each input is written to the output and released before the next one is
+    read, so memory use depends on the largest input, not on their total.
+    Resources (fonts, images, ...) that are byte-identical across inputs are
+    written once; use --no-dedup to write every copy.
 
     Examples: 
 
@@ -38,11 +122,16 @@
 
          python pdfcombine.py --inpath1 doc.pdf --inpath2 doc2.pdf -rotate1 CW
 
+
+      Combine pages 1-3 of doc1.pdf, all of doc2.pdf rotated 180 degrees
+      and doc3.pdf
+
+         python pdfcombine.py --inpath doc1.pdf "1-3" --inpath doc2.pdf all FV \
+                              --inpath doc3.pdf --outpath all.pdf
+
 """
 import argparse
-import PyPDF2
 import os
-import uuid
 import pdftools_utils as pu
 
 
@@ -52,12 +141,25 @@ def parse_args():
     parser.add_argument('-j', '--inpath2',  help='Second input file', type=str, default = '')
     parser.add_argument('-r', '--rotate1',  help='File 1 rotation',   type=str, default = '')
     parser.add_argument('-s', '--rotate2',  help='File 1 rotation',   type=str, default = '')
-    parser.add_argument('-c', '--clobber',  help='Overwrite file 1', action='store_true')
+    parser.add_argument('-f', '--inpath',   help='Input file [pages [rotation]]', type=str
+                      , nargs='+', action='append', metavar='PATH')
+    parser.add_argument('-o', '--outpath',  help='Output file',       type=str, default = '')
+    parser.add_argument('-c', '--clobber', '--in-place', help='Overwrite file 1', action='store_true')
+    parser.add_argument('-d', '--no-dedup', help='Keep duplicate resources', action='store_true')
+    parser.add_argument('-l', '--linearize', help='Write a linearized file', action='store_true')
+    pu.addCompressionArgs(parser)
+    pu.addRepairArgs(parser)
+    pu.addPasswordArgs(parser)
+    pu.addCacheArgs(parser)
+    parser.add_argument('-g', '--progress', help='Show progress', action='store_true')
+    pu.addBatchArgs(parser)
+    pu.addProfileArgs(parser)
     return parser.parse_args()
 
 
-class PdfCombiner():
+class PdfCombiner(pu.Progress):
     def __init__(self, **kwargs):
+        super().__init__()
         self.msg = ''
         degree_sign= u'\N{DEGREE SIGN}'
         self.rotOptionList = ('None'
@@ -65,29 +167,62 @@ class PdfCombiner():
                              , '90' + degree_sign + ' CCW'
                              , 'Flip Vertical')
         self.ofile = None
+        self.docs = []
 
+    def close_docs(self):
+        for doc in self.docs:
+            doc.close()
+        self.docs = []
+
+    @pu.profiled('combine.validate_inputs')
     def validate_inputs(self, **kwargs):
+        """
+        Test for valid inputs and return status.
+        Inputs are given either as inpath1/inpath2 with rotate1/rotate2,
+        or as inpath, a list of [path, pages, rotation] lists where pages
+        and rotation are optional.
+        """
         self.args_d = kwargs
-        for infile in ['inpath1', 'inpath2']:
-            if not os.path.isfile(self.args_d[infile]):
-                ok = False
-                self.msg = 'Cannot find input file {0}'.format(self.args_d[infile])
-            elif not pu.ispdf(self.args_d[infile]):
-                ok = False
-                self.msg = '{0} does not look like a valid PDF.'.format(self.args_d[infile])
-            elif pu.isRestricted(self.args_d[infile]):
-                ok = False
-                self.msg = 'File is restricted:\n {0}'.format(self.args_d[infile])
-            else:
-                ok = True
-                self.msg = 'Inputs validated'
+        self.reset_progress()
+        self.close_docs()
+        if self.args_d.get('inpath'):
+            self.inputs = list()
+            for item in self.args_d['inpath']:
+                item = list(item) + ['', '']
+                self.inputs.append((item[0], item[1], item[2].upper()))
+        else:
+            self.inputs = [(self.args_d['inpath1'], '', self.args_d.get('rotate1', '').upper())
+                         , (self.args_d['inpath2'], '', self.args_d.get('rotate2', '').upper())]
+        self.pageLists = list()
+        ok = False
+        for path, pageSpec, rotation in self.inputs:
+            doc, self.msg = pu.openDoc(path, self.args_d.get('repair', False)
+                                     , self.args_d.get('password', ''))
+            ok = doc is not None
+            if ok:
+                self.docs.append(doc)
+                if pageSpec and pageSpec.lower() != 'all':
+                    try:
+                        pageList = pu.pages(pageSpec, doc.numPages)
+                    except pu.PageSpecError as e:
+                        pageList = None
+                        ok = False
+                        self.msg = '{0}: {1}'.format(path, e)
+                else:
+                    pageList = range(doc.numPages)
+                if ok and not pageList:
+                    ok = False
+                    self.msg = 'No pages to process in {0}. Check pages specification.'.format(path)
+                self.pageLists.append(pageList)
             if not ok:
+                self.close_docs()
                 break
-        self.rotate1  = self.args_d['rotate1'].upper()
-        self.rotate2  = self.args_d['rotate2'].upper()
-        self.file1    = self.args_d['inpath1']
-        self.file2    = self.args_d['inpath2']
-        self.clobber  = self.args_d['clobber']
+        self.file1    = self.inputs[0][0] if self.inputs else ''
+        self.clobber  = self.args_d.get('clobber', False) or self.args_d.get('in_place', False)
+        self.outpath  = self.args_d.get('outpath', '')
+        self.dedup    = not self.args_d.get('no_dedup', False)
+        self.linearize = self.args_d.get('linearize', False)
+        self.bytesSaved = 0
         return ok
 
     def status(self):
@@ -96,70 +231,75 @@ class PdfCombiner():
     def get_ofile(self):
         return self.ofile
 
+    @pu.profiled('combine.process')
     def process(self):
         # Form outout file path/name
         pdir1,pfile1 = os.path.split(self.file1)
-        pdir2,pfile2 = os.path.split(self.file2)
         if not pdir1:
             pdir1 = '.'
-        if not pdir2:
-            pdir2 = '.'
         if self.clobber:
             self.ofile = os.path.join(pdir1,pfile1)
-            tempfile = os.path.join(pdir1, str(uuid.uuid4()) + '.pdf')
-            os.rename(self.file1, tempfile)
-            self.file1 = tempfile
-        else:
+        elif self.outpath:
+            self.ofile = self.outpath
+        elif len(self.inputs) == 2:
+            pfile2 = os.path.split(self.inputs[1][0])[1]
             self.ofile = pdir1 + '/' + os.path.splitext(pfile1)[0] 
             self.ofile += '_' + os.path.splitext(pfile2)[0] + '.pdf'
-            tempfile = '' 
-
-        # Open each file to be merged
-        with open(self.file1, 'rb') as pdf1File:
-            with open(self.file2, 'rb') as pdf2File:
-   
-                # Read files
-                pdf1Reader = PyPDF2.PdfFileReader(pdf1File)
-                pdf2Reader = PyPDF2.PdfFileReader(pdf2File)
-
-                # Create a new PdfFileWriter object which represents a blank PDF document
-                pdfWriter = PyPDF2.PdfFileWriter()
-           
-                # Loop through all pages of the first document
-                for pageNum in range(pdf1Reader.numPages):
-                    pageObj = pdf1Reader.getPage(pageNum)
-                    if self.rotate1 == 'CW':
-                        pageObj.rotateClockwise(90)
-                    elif self.rotate1 == 'CCW':
-                        pageObj.rotateCounterClockwise(90)
-                    elif self.rotate1 == 'FV':
-                        pageObj.rotateCounterClockwise(180)
-                    pdfWriter.addPage(pageObj)
-           
-                # Loop through all pages of the second document
-                for pageNum in range(pdf2Reader.numPages):
-                    pageObj = pdf2Reader.getPage(pageNum)
-                    if self.rotate2 == 'CW':
-                        pageObj.rotateClockwise(90)
-                    elif self.rotate2 == 'CCW':
-                        pageObj.rotateCounterClockwise(90)
-                    elif self.rotate2 == 'FV':
-                        pageObj.rotateCounterClockwise(180)
-                    pdfWriter.addPage(pageObj)
-           
-                # Write combined document
-                with open(self.ofile, 'wb') as pdfOutputFile:
-                    pdfWriter.write(pdfOutputFile)
-   
-        # Housekeeping
-        if self.clobber:
-            self.file1 = self.ofile
-        if os.path.isfile(tempfile):
-            os.remove(tempfile)
+        else:
+            self.ofile = pdir1 + '/' + os.path.splitext(pfile1)[0] + '_combined.pdf'
+
+        total = sum(len(pageList) for pageList in self.pageLists)
+        cache, key = pu.outputCacheKey(self.args_d, 'combine', [item[0] for item in self.inputs]
+                                     , {'inputs': [[list(pageList), item[2]] for pageList, item in zip(self.pageLists, self.inputs)]
+                                      , 'dedup': self.dedup})
+        if cache is not None and cache.get(key, [self.ofile]):
+            self.close_docs()
+            self.msg = 'Output served from cache'
+            return True
+        try:
+            version = max(doc.version for doc in self.docs)
+            # Every input is closed before the output is moved into place
+            with pu.AtomicWriter(self.ofile, self.linearize) as pdfOutputFile:
+                pdfWriter = pu.PdfStreamWriter(pdfOutputFile, version, self.dedup
+                                               , **pu.writerOptions(self.args_d))
+                done = 0
+                for i, doc in enumerate(self.docs):
+                    pdfWriter.addPages(doc, self.pageLists[i], self.inputs[i][2]
+                                     , lambda n: self.report(done + n, total))
+                    done += len(self.pageLists[i])
+                    # Done with this input, release its objects
+                    doc.close()
+                pdfWriter.close()
+            self.bytesSaved = pdfWriter.bytesSaved
+            self.msg = 'Combined {0} files'.format(len(self.inputs))
+            if pdfWriter.duplicates:
+                s = '\nShared {0} duplicate resources, saved {1} bytes'
+                self.msg += s.format(pdfWriter.duplicates, pdfWriter.bytesSaved)
+            if cache is not None:
+                cache.put(key, [self.ofile])
+        except pu.Cancelled:
+            self.msg = 'Cancelled'
+            return False
+        finally:
+            self.close_docs()
         return True
 
 if __name__ == "__main__":
     args = parse_args()
-    C = PdfCombiner()
-    if not (C.validate_inputs(**vars(args)) and C.process()):
-        print(C.status())
+    if args.batch:
+        jobs = pu.batchJobs(args.batch, pu.batchBase(args))
+        for job in jobs:
+            if isinstance(job['inpath'], str):
+                # Each batch file is combined with the --inpath files
+                job['inpath'] = [[job['inpath']]] + (args.inpath or [])
+                job['outpath'] = ''
+        summary = pu.runBatch('pdfcombine', 'PdfCombiner', jobs, args.workers)
+        pu.writeSummary(summary, args.summary)
+    else:
+        C = PdfCombiner()
+        pu.cliProgress(C, args.progress)
+        with pu.profiling(args.profile, args.profile_format):
+            if not (C.validate_inputs(**vars(args)) and C.process()):
+                print(C.status())
+            elif C.bytesSaved:
+                print(C.status())
@@ -3,19 +3,59 @@
 
     Usage:
 
-    python pdfinfo.py --inpath "path/file"
+    python pdfinfo.py --inpath "path/file" [--linearized]
 
     Command line options:
 
         --inpath      Path and file name of input PDF file
 
+        --linearized  Optional, check whether the file is linearized and
+                      whether its linearization data matches the file
+
+        --repair      Optional, read a file whose cross reference sections
+                      are broken by rebuilding them from a scan of the
+                      whole file, and report that it was repaired
+
+        --password    Optional password, user or owner, of encrypted
+                      input files that the empty password does not open.
+                      Without it, PDFTOOLS_PASSWORD_CALLBACK may name a
+                      function, as module:function, given the path of
+                      such a file and returning its password
+
+        --batch       Optional, run the same operation on many files: a
+                      directory (every .pdf file in it), a quoted glob
+                      pattern, or a manifest file listing one input path
+                      or one JSON object of arguments per line.
+                      Replaces --inpath
+
+        --workers     Optional number of worker processes for --batch
+                      (default: number of CPUs)
+
+        --summary     Optional file receiving the JSON batch summary
+                      (default: printed)
+
+        --profile     Optional file receiving a profile of the run: the
+                      time spent in each phase (opening, cross reference
+                      parsing, page copying, writing) and the bytes read
+                      and written, objects copied, pages and peak memory.
+                      With --batch, each job's profile is added to its
+                      summary entry instead. The PDFTOOLS_PROFILE
+                      environment variable sets the file as well
+
+        --profile-format
+                      Optional format of --profile: json (default), or
+                      chrome for a trace viewable in chrome://tracing
+
+    Page counts and document info are kept in a per-user cache (see
+    pdftools_utils.getCacheDir) and reused while a file is unchanged.
+    Set PDFTOOLS_NO_CACHE=1 to bypass the cache.
+
     Example: Retrieve and display document info for doc.pdf
 
               python pdfinfo.py --inpath doc.pdf
 
 """
 import argparse
-import PyPDF2 
 import os
 import pdftools_utils as pu
 
@@ -24,14 +64,24 @@ def parse_args():
     parser.add_argument('-i', '--inpath'
                       , help='Input path/file'
                       , type=str, default = '')
+    parser.add_argument('-l', '--linearized'
+                      , help='Check the linearization'
+                      , action='store_true')
+    pu.addRepairArgs(parser)
+    pu.addPasswordArgs(parser)
+    pu.addBatchArgs(parser)
+    pu.addProfileArgs(parser)
     return parser.parse_args()
 
 
-class PdfInfo:
+class PdfInfo(pu.Progress):
     def __init__(self):
+        super().__init__()
         self.doc_info = str()
+        self.meta = None
         self.msg = ''
 
+    @pu.profiled('info.validate_inputs')
     def validate_inputs(self, **kwargs):
         """
         Test for valid inputs and return status.
@@ -39,26 +89,52 @@ class PdfInfo:
         Ensure proper format of rotation input.
         """
         self.args_d = kwargs
-        if not os.path.isfile(self.args_d['inpath']):
+        self.reset_progress()
+        # Cached or trailer-only metadata; no full parse needed
+        self.meta = None
+        if not self.args_d['inpath'] or not os.path.isfile(self.args_d['inpath']):
             ok = False
             self.msg = 'Cannot find input file {0}'.format(self.args_d['inpath'])
-        elif not pu.ispdf(self.args_d['inpath']):
-            ok = False
-            self.msg = '{0} does not look like a valid PDF.'.format(self.args_d['inpath'])
-        elif pu.isRestricted(self.args_d['inpath']):
-            ok = False
-            self.msg = 'File is restricted:\n {0}'.format(self.args_d['inpath'])
         else:
-            ok = True
-            self.msg = 'Inputs validated'
+            self.meta = pu.fileMeta(self.args_d['inpath'])
+            if (not self.meta['ispdf'] and self.args_d.get('repair')) or self.meta['restricted']:
+                self.meta = self.opened_meta()
+            if self.meta is None:
+                ok = False
+            elif not self.meta['ispdf']:
+                ok = False
+                self.msg = '{0} does not look like a valid PDF.'.format(self.args_d['inpath'])
+            else:
+                ok = True
+                self.msg = 'Inputs validated'
         return ok
 
+    def opened_meta(self):
+        """
+        Metadata of a file opened in full, for files the cached metadata
+        does not describe: damaged files with repair, and encrypted files
+        needing a password. Returns None, with msg set, when the file
+        cannot be opened.
+        """
+        doc, self.msg = pu.openDoc(self.args_d['inpath'], self.args_d.get('repair', False)
+                                 , self.args_d.get('password', ''))
+        if doc is None:
+            return None
+        with doc:
+            meta = {'ispdf': True, 'restricted': False, 'numPages': doc.numPages
+                  , 'info': dict(), 'repaired': doc.repaired}
+            docInfo = doc.trailer['/Info'] if '/Info' in doc.trailer else dict()
+            for key in docInfo:
+                meta['info'][key[1:]] = str(docInfo[key])
+        return meta
+
     def status(self):
         return self.msg
 
     def get_doc_info(self):
         return self.doc_info
 
+    @pu.profiled('info.process')
     def process(self):
         """
         Main processing core.
@@ -66,15 +142,27 @@ class PdfInfo:
         """
         ok = True
         try:
-            with open(self.args_d['inpath'], 'rb') as fr:
-                Reader = PyPDF2.PdfFileReader(fr)
-                if Reader.isEncrypted:
-                    Reader.decrypt('')
-                info = Reader.getDocumentInfo()
-                self.doc_info = 'Pages: {0}'.format(Reader.numPages) + '\n'
-                for item in info:
-                    self.doc_info += '{0} = {1}'.format(item[1:], info[item]) + '\n'
-                self.doc_info = self.doc_info[:-1]
+            numPages, info = self.meta['numPages'], self.meta['info']
+            self.doc_info = 'Pages: {0}'.format(numPages) + '\n'
+            for item in info:
+                self.doc_info += '{0} = {1}'.format(item, info[item]) + '\n'
+            if self.meta.get('repaired'):
+                self.doc_info += 'Repaired: cross reference sections rebuilt\n'
+            if self.args_d.get('linearized'):
+                problems = pu.checkLinearized(self.args_d['inpath'])
+                if problems is None:
+                    self.doc_info += 'Linearized: no\n'
+                elif not problems:
+                    self.doc_info += 'Linearized: yes\n'
+                else:
+                    self.doc_info += 'Linearized: invalid\n'
+                    for problem in problems:
+                        self.doc_info += '    {0}\n'.format(problem)
+            self.doc_info = self.doc_info[:-1]
+            self.report(1, 1)
+        except pu.Cancelled:
+            ok = False
+            self.msg = 'Cancelled'
         except Exception:
             # no msg update, errors already caught in validate()
             ok = False
@@ -83,9 +171,15 @@ class PdfInfo:
 
 if __name__ == "__main__":
     args = parse_args()
-    P = PdfInfo()
-    if not (P.validate_inputs(**vars(args)) and P.process()):
-        print(P.status())
+    if args.batch:
+        jobs = pu.batchJobs(args.batch, pu.batchBase(args))
+        summary = pu.runBatch('pdfinfo', 'PdfInfo', jobs, args.workers)
+        pu.writeSummary(summary, args.summary)
     else:
-        print(P.doc_info)
-
+        P = PdfInfo()
+        pu.cliProgress(P)
+        with pu.profiling(args.profile, args.profile_format):
+            if not (P.validate_inputs(**vars(args)) and P.process()):
+                print(P.status())
+            else:
+                print(P.doc_info)
@@ -0,0 +1,370 @@
+"""
+    Apply several page operations to PDF files with one read and one write.
+
+    Usage:
+
+    python pdfpipeline.py --inpath "path/file" --steps "steps" \
+                          [--outpath "path/file" | --in-place] [--linearize]
+
+    Command line options:
+
+        --inpath      Path and file name of input PDF file
+
+        --steps       Semicolon separated list of operations, applied in
+                      the order given to the pages of the document as it
+                      stands after the previous operation:
+
+                      rotate SPEC CW|CCW|FV   rotate the pages in SPEC
+                      reorder SPEC            keep the pages in SPEC, in
+                                              that order, like pdfreorder
+                      delete SPEC             drop the pages in SPEC
+                      append PATH [SPEC [ROT]]
+                                              add pages of another file
+                                              (default: all) at the end
+                      prepend PATH [SPEC [ROT]]
+                                              add them at the beginning
+
+                      SPEC is written like the --pages option of
+                      pdfreorder, "all" for every page; quote it if it
+                      contains spaces. Note: this option must be quoted
+
+        --outpath     Optional path and file name of the output file
+
+        --in-place    Optional, replace the input file with the output
+
+        --linearize   Optional, write a linearized ("fast web view") file,
+                      whose first page displays before the whole file has
+                      been downloaded
+
+        --cache       Optional, keep the output in the per-user output
+                      cache and serve later runs of the same job on
+                      unchanged inputs from it (see pdfcache.py).
+                      Ignored when the output replaces an input
+
+        --repair      Optional, read input files whose cross reference
+                      sections are broken by rebuilding them from a scan
+                      of the whole file. The output is written with
+                      intact cross reference sections
+
+        --password    Optional password, user or owner, of encrypted
+                      input files that the empty password does not open.
+                      Without it, PDFTOOLS_PASSWORD_CALLBACK may name a
+                      function, as module:function, given the path of
+                      such a file and returning its password.
+                      The output is not encrypted
+
+        --object-streams
+                      Optional, pack objects other than streams into
+                      compressed object streams and write a compressed
+                      cross reference stream. Smaller output for documents
+                      with many small objects; requires PDF 1.5 readers.
+                      Ignored with --linearize
+
+        --compress-level
+                      Optional zlib level, 0-9, of --object-streams
+                      (default: 6)
+
+        --objects-per-stream
+                      Optional number of objects in each object stream
+                      (default: 100)
+
+        --progress    Optional, print progress to the terminal
+
+        --batch       Optional, run the same operation on many files: a
+                      directory (every .pdf file in it), a quoted glob
+                      pattern, or a manifest file listing one input path
+                      or one JSON object of arguments per line.
+                      Replaces --inpath
+
+        --workers     Optional number of worker processes for --batch
+                      (default: number of CPUs)
+
+        --summary     Optional file receiving the JSON batch summary
+                      (default: printed)
+
+        --profile     Optional file receiving a profile of the run: the
+                      time spent in each phase (opening, cross reference
+                      parsing, page copying, writing) and the bytes read
+                      and written, objects copied, pages and peak memory.
+                      With --batch, each job's profile is added to its
+                      summary entry instead. The PDFTOOLS_PROFILE
+                      environment variable sets the file as well
+
+        --profile-format
+                      Optional format of --profile: json (default), or
+                      chrome for a trace viewable in chrome://tracing
+
+    The operations only rearrange references to the pages of the inputs;
+    each input file is parsed once, and a single output file is written
+    when all operations are planned. No intermediate files are written.
+    If neither --outpath nor --in-place is provided, the output file name
+    is derived from the input file name by appending "_pipeline" before
+    the extension.
+
+    Example: Rotate pages 3-5 of doc.pdf, drop page 7 and append cover.pdf
+
+              python pdfpipeline.py --inpath doc.pdf \
+                  --steps "rotate 3-5 CW; delete 7; append cover.pdf"
+
+"""
+import argparse
+import os
+import shlex
+import pdftools_utils as pu
+
+# Quarter turns clockwise of each rotation, and back
+TURNS = {None: 0, 'CW': 1, 'FV': 2, 'CCW': 3}
+ROTATIONS = {0: None, 1: 'CW', 2: 'FV', 3: 'CCW'}
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-i', '--inpath',   help='Input path/file',  type=str, default = '')
+    parser.add_argument('-s', '--steps',    help='Operations, separated by ;', type=str, default = '')
+    parser.add_argument('-o', '--outpath',  help='Output path/file', type=str, default = '')
+    parser.add_argument('-I', '--in-place', help='Replace the input file', action='store_true')
+    parser.add_argument('-l', '--linearize', help='Write a linearized file', action='store_true')
+    pu.addCompressionArgs(parser)
+    pu.addRepairArgs(parser)
+    pu.addPasswordArgs(parser)
+    pu.addCacheArgs(parser)
+    parser.add_argument('-g', '--progress', help='Show progress', action='store_true')
+    pu.addBatchArgs(parser)
+    pu.addProfileArgs(parser)
+    return parser.parse_args()
+
+
+class PlanError(ValueError):
+    '''
+    Raised for an operation that cannot be planned.
+    '''
+
+
+class PagePlan:
+    '''
+    Plan of the output pages of a series of page operations.
+    Every output page is an entry (source, pageNum, turns) referring to
+    page pageNum of input document source, rotated by turns quarter
+    turns clockwise. Operations only edit the entries; each input is
+    opened once and nothing is read beyond the page tree until write().
+    With repair, inputs with broken cross reference sections are read
+    through a rebuilt index (see pdftools_utils.PdfIndex); encrypted
+    inputs are opened with password (see pdftools_utils.PdfDoc).
+
+    Usage:
+        plan = PagePlan('doc.pdf')
+        plan.rotate('3-5', 'CW').delete('7').append('cover.pdf')
+        with open('out.pdf', 'wb') as fh:
+            plan.write(fh)
+        plan.close()
+    '''
+    def __init__(self, pathfile, repair=False, password=''):
+        self.repair = repair
+        self.password = password
+        self.docs = list()
+        self.paths = list()
+        self.entries = self._source(pathfile, 'all', None)
+
+    def _source(self, pathfile, spec, rotation):
+        '''
+        Return the entries of the pages in spec of pathfile, opening it
+        unless it is already one of the sources.
+        '''
+        key = os.path.abspath(pathfile)
+        if key in self.paths:
+            source = self.paths.index(key)
+        else:
+            doc, msg = pu.openDoc(pathfile, self.repair, self.password)
+            if doc is None:
+                raise PlanError(msg)
+            self.docs.append(doc)
+            self.paths.append(key)
+            source = len(self.docs) - 1
+        N = self.docs[source].numPages
+        pageNums = range(N) if spec.strip().lower() == 'all' else pu.pages(spec, N)
+        turns = TURNS[rotation]
+        return [(source, pageNum, turns) for pageNum in pageNums]
+
+    def _select(self, spec):
+        if spec.strip().lower() == 'all':
+            return range(len(self.entries))
+        return pu.pages(spec, len(self.entries))
+
+    def rotate(self, spec, rotation):
+        selected = set(self._select(spec))
+        turns = TURNS[rotation]
+        self.entries = [(source, pageNum, (t + turns) % 4) if i in selected else (source, pageNum, t)
+                        for i, (source, pageNum, t) in enumerate(self.entries)]
+        return self
+
+    def reorder(self, spec):
+        self.entries = [self.entries[i] for i in self._select(spec)]
+        return self
+
+    def delete(self, spec):
+        dropped = set(self._select(spec))
+        self.entries = [entry for i, entry in enumerate(self.entries) if i not in dropped]
+        return self
+
+    def append(self, pathfile, spec='all', rotation=None):
+        self.entries = self.entries + self._source(pathfile, spec, rotation)
+        return self
+
+    def prepend(self, pathfile, spec='all', rotation=None):
+        self.entries = self._source(pathfile, spec, rotation) + self.entries
+        return self
+
+    def apply(self, step):
+        '''
+        Apply one operation written as in the --steps option.
+        '''
+        words = shlex.split(step)
+        if not words:
+            return self
+        op, params = words[0].lower(), words[1:]
+        # Number of parameters, and the position of the rotation if any
+        counts = {'rotate': (2, 2, 1), 'reorder': (1, 1, None), 'delete': (1, 1, None)
+                , 'append': (1, 3, 2), 'prepend': (1, 3, 2)}
+        if op not in counts:
+            raise PlanError('Unknown operation {0}'.format(op))
+        low, high, rot = counts[op]
+        if not low <= len(params) <= high:
+            raise PlanError('Wrong number of parameters in "{0}"'.format(step.strip()))
+        if rot is not None and rot < len(params):
+            params[rot] = params[rot].upper()
+            if params[rot] not in ('CW', 'CCW', 'FV'):
+                raise PlanError('Unknown rotation {0}'.format(params[rot]))
+        return getattr(self, op)(*params)
+
+    def version(self):
+        return max(doc.version for doc in self.docs)
+
+    def write(self, fh, progress=None, **options):
+        '''
+        Write the planned pages to fh. Runs of consecutive pages from the
+        same input are copied together, so that they share the objects
+        they reference.
+        progress - optional callback(i) called after the i-th page is written
+        options  - further PdfStreamWriter keyword arguments
+        '''
+        Writer = pu.PdfStreamWriter(fh, self.version(), dedup=len(self.docs) > 1, **options)
+        done = 0
+        be = 0
+        while be < len(self.entries):
+            source = self.entries[be][0]
+            ed = be
+            while ed < len(self.entries) and self.entries[ed][0] == source:
+                ed += 1
+            run = self.entries[be:ed]
+            Writer.addPages(self.docs[source], [pageNum for s, pageNum, t in run]
+                          , [ROTATIONS[t] for s, pageNum, t in run]
+                          , None if progress is None else lambda i: progress(done + i))
+            done += len(run)
+            be = ed
+        Writer.close()
+        return Writer
+
+    def close(self):
+        for doc in self.docs:
+            doc.close()
+
+
+class PdfPipeline(pu.Progress):
+    def __init__(self):
+        super().__init__()
+        self.plan = None
+        self.ofile = None
+        self.msg = ''
+
+    @pu.profiled('pipeline.validate_inputs')
+    def validate_inputs(self, **kwargs):
+        """
+        Test for valid inputs and return status.
+        Check for existence and validity of the PDF input files and plan
+        every operation.
+        """
+        self.args_d = kwargs
+        self.reset_progress()
+        if self.plan is not None:
+            self.plan.close()
+            self.plan = None
+        steps = self.args_d.get('steps') or ''
+        if isinstance(steps, str):
+            steps = steps.split(';')
+        try:
+            self.plan = PagePlan(self.args_d['inpath'], self.args_d.get('repair', False)
+                               , self.args_d.get('password', ''))
+            for step in steps:
+                self.plan.apply(step)
+        except ValueError as e:
+            self.msg = str(e)
+            if self.plan is not None:
+                self.plan.close()
+                self.plan = None
+            return False
+        if not self.plan.entries:
+            self.msg = 'No pages to process. Check pages specification.'
+            self.plan.close()
+            self.plan = None
+            return False
+        return True
+
+    def status(self):
+        return self.msg
+
+    def get_ofile(self):
+        return self.ofile
+
+    def output_path(self):
+        if self.args_d.get('in_place'):
+            return self.args_d['inpath']
+        if self.args_d.get('outpath'):
+            return self.args_d['outpath']
+        indir,infile = os.path.split(self.args_d['inpath'])
+        tmpfi = os.path.splitext(infile)[0] + '_pipeline.pdf'
+        return os.path.join(indir, tmpfi)
+
+    @pu.profiled('pipeline.process')
+    def process(self):
+        """
+        Main processing core.
+        Write the planned pages of the inputs to the output.
+        """
+        ok = True
+        self.ofile = self.output_path()
+        N = len(self.plan.entries)
+        cache, key = pu.outputCacheKey(self.args_d, 'pipeline', self.plan.paths
+                                     , {'entries': self.plan.entries})
+        if cache is not None and cache.get(key, [self.ofile]):
+            self.plan.close()
+            self.plan = None
+            self.msg = 'Output served from cache'
+            return True
+        try:
+            with pu.AtomicWriter(self.ofile, self.args_d.get('linearize', False)) as fw:
+                self.plan.write(fw, lambda i: self.report(i, N), **pu.writerOptions(self.args_d))
+                # Release the inputs before one may be replaced
+                self.plan.close()
+            self.msg = 'Wrote {0} pages'.format(N)
+            if cache is not None:
+                cache.put(key, [self.ofile])
+        except pu.Cancelled:
+            ok = False
+            self.msg = 'Cancelled'
+        finally:
+            self.plan.close()
+            self.plan = None
+        return ok
+
+if __name__ == "__main__":
+    args = parse_args()
+    if args.batch:
+        jobs = pu.batchJobs(args.batch, pu.batchBase(args))
+        summary = pu.runBatch('pdfpipeline', 'PdfPipeline', jobs, args.workers)
+        pu.writeSummary(summary, args.summary)
+    else:
+        P = PdfPipeline()
+        pu.cliProgress(P, args.progress)
+        with pu.profiling(args.profile, args.profile_format):
+            if P.validate_inputs(**vars(args)):
+                P.process()
+            print(P.status())
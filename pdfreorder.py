@@ -3,7 +3,8 @@
 
     Usage:
 
-    python pdfreorder.py --pages "page-spec" --inpath "path/file"
+    python pdfreorder.py --pages "page-spec" --inpath "path/file" [--in-place] \
+                         [--linearize] [--parallel N]
 
     Command line options:
 
@@ -14,9 +15,79 @@
 
         --inpath      Path and file name of input PDF file
 
+        --in-place    Optional, replace the input file with the output
+
+        --linearize   Optional, write a linearized ("fast web view") file,
+                      whose first page displays before the whole file has
+                      been downloaded
+
+        --parallel    Optional number of worker processes copying ranges of
+                      pages at the same time (default: 1). Objects that
+                      pages of different ranges share are written once
+                      per range
+
+        --cache       Optional, keep the output in the per-user output
+                      cache and serve later runs of the same job on
+                      unchanged inputs from it (see pdfcache.py).
+                      Ignored when the output replaces an input
+
+        --repair      Optional, read input files whose cross reference
+                      sections are broken by rebuilding them from a scan
+                      of the whole file. The output is written with
+                      intact cross reference sections
+
+        --password    Optional password, user or owner, of encrypted
+                      input files that the empty password does not open.
+                      Without it, PDFTOOLS_PASSWORD_CALLBACK may name a
+                      function, as module:function, given the path of
+                      such a file and returning its password.
+                      The output is not encrypted
+
+        --object-streams
+                      Optional, pack objects other than streams into
+                      compressed object streams and write a compressed
+                      cross reference stream. Smaller output for documents
+                      with many small objects; requires PDF 1.5 readers.
+                      Ignored with --linearize
+
+        --compress-level
+                      Optional zlib level, 0-9, of --object-streams
+                      (default: 6)
+
+        --objects-per-stream
+                      Optional number of objects in each object stream
+                      (default: 100)
+
+        --progress    Optional, print progress to the terminal
+
+        --batch       Optional, run the same operation on many files: a
+                      directory (every .pdf file in it), a quoted glob
+                      pattern, or a manifest file listing one input path
+                      or one JSON object of arguments per line.
+                      Replaces --inpath
+
+        --workers     Optional number of worker processes for --batch
+                      (default: number of CPUs)
+
+        --summary     Optional file receiving the JSON batch summary
+                      (default: printed)
+
+        --profile     Optional file receiving a profile of the run: the
+                      time spent in each phase (opening, cross reference
+                      parsing, page copying, writing) and the bytes read
+                      and written, objects copied, pages and peak memory.
+                      With --batch, each job's profile is added to its
+                      summary entry instead. The PDFTOOLS_PROFILE
+                      environment variable sets the file as well
+
+        --profile-format
+                      Optional format of --profile: json (default), or
+                      chrome for a trace viewable in chrome://tracing
+
     The output file name is derived from the input file name by appending the
     string "_reoder" to the input file name before the extension. The output
-    file is placed in the same directory as the input file.
+    file is placed in the same directory as the input file. It only appears
+    under its final name, or replaces the input, once it is complete.
 
     Examples: 
 
@@ -36,7 +107,6 @@
 
 """
 import argparse
-import PyPDF2 
 import os
 import pdftools_utils as pu
 
@@ -44,38 +114,50 @@ def parse_args():
     parser = argparse.ArgumentParser()
     parser.add_argument('-p', '--pages',    help='Pages to rotate',  type=str, default = '1')
     parser.add_argument('-i', '--inpath',   help='Input path/file',  type=str, default = '')
+    parser.add_argument('-I', '--in-place', help='Replace the input file', action='store_true')
+    parser.add_argument('-l', '--linearize', help='Write a linearized file', action='store_true')
+    parser.add_argument('-P', '--parallel', help='Worker processes copying pages', type=int, default = 1)
+    pu.addCompressionArgs(parser)
+    pu.addRepairArgs(parser)
+    pu.addPasswordArgs(parser)
+    pu.addCacheArgs(parser)
+    parser.add_argument('-g', '--progress', help='Show progress', action='store_true')
+    pu.addBatchArgs(parser)
+    pu.addProfileArgs(parser)
     return parser.parse_args()
 
 
-class PdfReorderer:
+class PdfReorderer(pu.Progress):
     def __init__(self):
+        super().__init__()
         self.ofile = None
+        self.doc = None
         self.msg = ''
 
+    @pu.profiled('reorder.validate_inputs')
     def validate_inputs(self, **kwargs):
         """
         Test for valid inputs and return status.
         Check for existence and validity of PDF input file.
         """
         self.args_d = kwargs
-        if not os.path.isfile(self.args_d['inpath']):
-            ok = False
-            s = 'Cannot find input file {0}'
-            self.msg = s.format(self.args_d['inpath'])
-        elif not pu.ispdf(self.args_d['inpath']):
-            ok = False
-            s = '{0} does not look like a valid PDF.'
-            self.msg = s.format(self.args_d['inpath'])
-        elif pu.isRestricted(self.args_d['inpath']):
-            ok = False
-            self.msg = 'File is restricted:\n {0}'.format(self.args_d['inpath'])
-        elif not pu.pages(self.args_d['pages']
-                        , pu.getNumPages(self.args_d['inpath'])):
-            ok = False
-            self.msg = 'No pages to process. Check pages specification.'
-        else:
-            ok = True
-            self.msg = 'Inputs validated'
+        self.reset_progress()
+        if self.doc is not None:
+            self.doc.close()
+        self.doc, self.msg = pu.openDoc(self.args_d['inpath'], self.args_d.get('repair', False)
+                                      , self.args_d.get('password', ''))
+        ok = self.doc is not None
+        if ok:
+            try:
+                self.pageSpec = pu.pages(self.args_d['pages'], self.doc.numPages)
+                if not self.pageSpec:
+                    ok = False
+                    self.msg = 'No pages to process. Check pages specification.'
+            except pu.PageSpecError as e:
+                ok = False
+                self.msg = str(e)
+            if not ok:
+                self.doc.close()
         return ok
 
     def status(self):
@@ -84,25 +166,47 @@ class PdfReorderer:
     def get_ofile(self):
         return self.ofile
 
+    @pu.profiled('reorder.process')
     def process(self):
         """
         Main processing core.
         Read pages from input, reorder, and write specified pages to output.
         """
         ok = True
-        with open(self.args_d['inpath'], 'rb') as fr:
-            Reader = PyPDF2.PdfFileReader(fr)
-            Writer = PyPDF2.PdfFileWriter()
-            pagesToReorder = pu.pages(self.args_d['pages'], Reader.numPages)
+        with self.doc:
+            pagesToReorder = self.pageSpec
             if pagesToReorder:
-                indir,infile = os.path.split(self.args_d['inpath'])
-                tmpfi = os.path.splitext(infile)[0] + '_reorder.pdf'
-                self.ofile = os.path.join(indir, tmpfi)
-                for pageNum in pagesToReorder:
-                    pageObj = Reader.getPage(pageNum)
-                    Writer.addPage(pageObj)
-                with open(self.ofile, 'wb') as fw:
-                    Writer.write(fw)
+                if self.args_d.get('in_place'):
+                    self.ofile = self.args_d['inpath']
+                else:
+                    indir,infile = os.path.split(self.args_d['inpath'])
+                    tmpfi = os.path.splitext(infile)[0] + '_reorder.pdf'
+                    self.ofile = os.path.join(indir, tmpfi)
+                N = len(pagesToReorder)
+                cache, key = pu.outputCacheKey(self.args_d, 'reorder', [self.args_d['inpath']]
+                                             , {'pages': list(pagesToReorder)})
+                if cache is not None and cache.get(key, [self.ofile]):
+                    self.msg = 'Output served from cache'
+                    return ok
+                try:
+                    with pu.AtomicWriter(self.ofile, self.args_d.get('linearize', False)) as fw:
+                        Writer = pu.PdfStreamWriter(fw, self.doc.version, **pu.writerOptions(self.args_d))
+                        parallel = self.args_d.get('parallel') or 1
+                        if parallel > 1:
+                            Writer.addPagesParallel(self.doc, pagesToReorder, None
+                                                  , lambda i: self.report(i, N), parallel
+                                                  , os.path.dirname(os.path.abspath(self.ofile)))
+                        else:
+                            Writer.addPages(self.doc, pagesToReorder, None
+                                          , lambda i: self.report(i, N))
+                        Writer.close()
+                        # Release the input before it may be replaced
+                        self.doc.close()
+                    if cache is not None:
+                        cache.put(key, [self.ofile])
+                except pu.Cancelled:
+                    ok = False
+                    self.msg = 'Cancelled'
             else:
                 ok = False
                 self.msg = 'No pages to process'
@@ -110,6 +214,13 @@ class PdfReorderer:
 
 if __name__ == "__main__":
     args = parse_args()
-    R = PdfReorderer()
-    if not (R.validate_inputs(**vars(args)) and R.process()):
-        print(R.status())
+    if args.batch:
+        jobs = pu.batchJobs(args.batch, pu.batchBase(args))
+        summary = pu.runBatch('pdfreorder', 'PdfReorderer', jobs, args.workers)
+        pu.writeSummary(summary, args.summary)
+    else:
+        R = PdfReorderer()
+        pu.cliProgress(R, args.progress)
+        with pu.profiling(args.profile, args.profile_format):
+            if not (R.validate_inputs(**vars(args)) and R.process()):
+                print(R.status())
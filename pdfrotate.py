@@ -3,7 +3,8 @@
 
     Usage:
 
-    python pdfrotate.py --pages "page-spec" --rotation CW|CC|FV  --inpath "path/file"
+    python pdfrotate.py --pages "page-spec" --rotation CW|CC|FV  --inpath "path/file" \
+                        [--incremental] [--in-place] [--linearize] [--parallel N]
 
     Command line options:
 
@@ -19,9 +20,89 @@
 
         --inpath      Path and file name of input PDF file
 
+        --progress    Optional, print progress to the terminal
+
+        --incremental Optional, append an incremental update holding only the
+                      rotated pages instead of rewriting the whole document.
+                      With --in-place the update is appended to the input
+                      file itself and only the update is written; otherwise
+                      the output is a copy of the input, cloned where the
+                      file system allows it, followed by the update section.
+                      Not available for encrypted files.
+
+        --in-place    Optional, replace the input file with the output
+
+        --linearize   Optional, write a linearized ("fast web view") file,
+                      whose first page displays before the whole file has
+                      been downloaded
+                      Not available with --incremental
+
+        --parallel    Optional number of worker processes copying ranges of
+                      pages at the same time (default: 1). Objects that
+                      pages of different ranges share are written once
+                      per range. Ignored with --incremental
+
+        --cache       Optional, keep the output in the per-user output
+                      cache and serve later runs of the same job on
+                      unchanged inputs from it (see pdfcache.py).
+                      Ignored when the output replaces an input
+
+        --repair      Optional, read input files whose cross reference
+                      sections are broken by rebuilding them from a scan
+                      of the whole file. The output is written with
+                      intact cross reference sections. Not available
+                      with --incremental
+
+        --password    Optional password, user or owner, of encrypted
+                      input files that the empty password does not open.
+                      Without it, PDFTOOLS_PASSWORD_CALLBACK may name a
+                      function, as module:function, given the path of
+                      such a file and returning its password.
+                      The output is not encrypted
+
+        --object-streams
+                      Optional, pack objects other than streams into
+                      compressed object streams and write a compressed
+                      cross reference stream. Smaller output for documents
+                      with many small objects; requires PDF 1.5 readers.
+                      Ignored with --linearize and --incremental
+
+        --compress-level
+                      Optional zlib level, 0-9, of --object-streams
+                      (default: 6)
+
+        --objects-per-stream
+                      Optional number of objects in each object stream
+                      (default: 100)
+
+        --batch       Optional, run the same operation on many files: a
+                      directory (every .pdf file in it), a quoted glob
+                      pattern, or a manifest file listing one input path
+                      or one JSON object of arguments per line.
+                      Replaces --inpath
+
+        --workers     Optional number of worker processes for --batch
+                      (default: number of CPUs)
+
+        --summary     Optional file receiving the JSON batch summary
+                      (default: printed)
+
+        --profile     Optional file receiving a profile of the run: the
+                      time spent in each phase (opening, cross reference
+                      parsing, page copying, writing) and the bytes read
+                      and written, objects copied, pages and peak memory.
+                      With --batch, each job's profile is added to its
+                      summary entry instead. The PDFTOOLS_PROFILE
+                      environment variable sets the file as well
+
+        --profile-format
+                      Optional format of --profile: json (default), or
+                      chrome for a trace viewable in chrome://tracing
+
     The output file name is derived from the input file name by appending the
     string "_rot" to the input file name before the extension. The output
-    file is placed in the same directory as the input file.
+    file is placed in the same directory as the input file. It only appears
+    under its final name, or replaces the input, once it is complete.
 
     Example: Rotate the first four pages of doc.pdf
 
@@ -29,7 +110,6 @@
 
 """
 import argparse
-import PyPDF2 
 import os
 import pdftools_utils as pu
 
@@ -38,12 +118,25 @@ def parse_args():
     parser.add_argument('-p', '--pages',    help='Pages to rotate',  type=str, default = '1')
     parser.add_argument('-r', '--rotation', help='Type of rotation', type=str, default = 'CW')
     parser.add_argument('-i', '--inpath',   help='Input path/file',  type=str, default = '')
+    parser.add_argument('-n', '--incremental', help='Append rotated pages as an incremental update', action='store_true')
+    parser.add_argument('-I', '--in-place', help='Replace the input file', action='store_true')
+    parser.add_argument('-l', '--linearize', help='Write a linearized file', action='store_true')
+    parser.add_argument('-P', '--parallel', help='Worker processes copying pages', type=int, default = 1)
+    pu.addCompressionArgs(parser)
+    pu.addRepairArgs(parser)
+    pu.addPasswordArgs(parser)
+    pu.addCacheArgs(parser)
+    parser.add_argument('-g', '--progress', help='Show progress', action='store_true')
+    pu.addBatchArgs(parser)
+    pu.addProfileArgs(parser)
     return parser.parse_args()
 
 
-class PdfRotator:
+class PdfRotator(pu.Progress):
     def __init__(self):
+        super().__init__()
         self.ofile = None
+        self.doc = None
         self.msg = ''
         degree_sign= u'\N{DEGREE SIGN}'
         self.rotOptionList = ('Select Rotation'
@@ -51,6 +144,7 @@ class PdfRotator:
                              , '90' + degree_sign + ' Counter-Clockwise'
                              , '180' + degree_sign + ' (Flip Vertical)')
 
+    @pu.profiled('rotate.validate_inputs')
     def validate_inputs(self, **kwargs):
         """
         Test for valid inputs and return status.
@@ -58,19 +152,31 @@ class PdfRotator:
         Ensure proper format of rotation input.
         """
         self.args_d = kwargs
-        if not os.path.isfile(self.args_d['inpath']):
-            ok = False
-            self.msg = 'Cannot find input file {0}'.format(self.args_d['inpath'])
-        elif not pu.ispdf(self.args_d['inpath']):
-            ok = False
-            self.msg = '{0} does not look like a valid PDF.'.format(self.args_d['inpath'])
-        elif pu.isRestricted(self.args_d['inpath']):
-            ok = False
-            self.msg = 'File is restricted:\n {0}'.format(self.args_d['inpath'])
-        else:
-            ok = True
+        self.reset_progress()
+        if self.doc is not None:
+            self.doc.close()
+        self.doc, self.msg = pu.openDoc(self.args_d['inpath'], self.args_d.get('repair', False)
+                                      , self.args_d.get('password', ''))
+        ok = self.doc is not None
+        if ok:
             self.args_d['rotation'] = self.args_d['rotation'].upper()
-            self.msg = 'Inputs validated'
+            self.incremental = self.args_d.get('incremental', False)
+            try:
+                self.pageSpec = pu.pages(self.args_d['pages'], self.doc.numPages)
+            except pu.PageSpecError as e:
+                ok = False
+                self.msg = str(e)
+            if ok and self.incremental and self.doc.isEncrypted:
+                ok = False
+                self.msg = 'Incremental update is not available for encrypted files.'
+            if ok and self.incremental and self.args_d.get('repair'):
+                ok = False
+                self.msg = 'Incremental update needs the intact cross reference sections of the input.'
+            if ok and self.incremental and self.args_d.get('linearize'):
+                ok = False
+                self.msg = 'Incremental update cannot produce a linearized file.'
+            if not ok:
+                self.doc.close()
         return ok
 
     def status(self):
@@ -79,35 +185,123 @@ class PdfRotator:
     def get_ofile(self):
         return self.ofile
 
+    def output_path(self):
+        if self.args_d.get('in_place'):
+            return self.args_d['inpath']
+        indir,infile = os.path.split(self.args_d['inpath'])
+        tmpfi = os.path.splitext(infile)[0] + '_rot.pdf'
+        return os.path.join(indir, tmpfi)
+
+    @pu.profiled('rotate.process')
     def process(self):
         """
         Main processing core.
         Read pages from input PDF, rotate specified pages, write to output.
         """
-        with open(self.args_d['inpath'], 'rb') as fr:
-            Reader = PyPDF2.PdfFileReader(fr)
-            Writer = PyPDF2.PdfFileWriter()
-            pagesToRotate = pu.pages(self.args_d['pages'], Reader.numPages)
-            indir,infile = os.path.split(self.args_d['inpath'])
-            tmpfi = os.path.splitext(infile)[0] + '_rot.pdf'
-            self.ofile = os.path.join(indir, tmpfi)
-            for pageNum in range(Reader.numPages):
-                pageObj = Reader.getPage(pageNum)
+        self.ofile = self.output_path()
+        cache, key = pu.outputCacheKey(self.args_d, 'rotate', [self.args_d['inpath']]
+                                     , {'pages': self.pageSpec.merged, 'rotation': self.args_d['rotation']
+                                      , 'incremental': self.incremental})
+        if cache is not None and cache.get(key, [self.ofile]):
+            self.doc.close()
+            self.msg = 'Output served from cache'
+            return True
+        if self.incremental:
+            ok = self.process_incremental()
+        else:
+            ok = self.process_rewrite()
+        if ok and cache is not None:
+            cache.put(key, [self.ofile])
+        return ok
+
+    def process_rewrite(self):
+        """
+        Write every page of the input to the output, rotating the
+        specified pages.
+        """
+        ok = True
+        with self.doc:
+            N = self.doc.numPages
+            pagesToRotate = self.pageSpec
+            self.ofile = self.output_path()
+            rotations = list()
+            for pageNum in range(N):
                 if pageNum in pagesToRotate:
-                    if self.args_d['rotation'] == 'CW':
-                        pageObj.rotateClockwise(90)
-                    elif self.args_d['rotation'] == 'CCW': 
-                        pageObj.rotateCounterClockwise(90)
-                    elif self.args_d['rotation'] == 'FV': 
-                        pageObj.rotateClockwise(180)
-                Writer.addPage(pageObj)
-            with open(self.ofile, 'wb') as fw:
-                Writer.write(fw)
+                    rotations.append(self.args_d['rotation'])
+                else:
+                    rotations.append(None)
+            try:
+                with pu.AtomicWriter(self.ofile, self.args_d.get('linearize', False)) as fw:
+                    Writer = pu.PdfStreamWriter(fw, self.doc.version, **pu.writerOptions(self.args_d))
+                    parallel = self.args_d.get('parallel') or 1
+                    if parallel > 1:
+                        Writer.addPagesParallel(self.doc, range(N), rotations
+                                              , lambda i: self.report(i, N), parallel
+                                              , os.path.dirname(os.path.abspath(self.ofile)))
+                    else:
+                        Writer.addPages(self.doc, range(N), rotations
+                                      , lambda i: self.report(i, N))
+                    Writer.close()
+                    # Release the input before it may be replaced
+                    self.doc.close()
+            except pu.Cancelled:
+                ok = False
+                self.msg = 'Cancelled'
+        return ok
+
+    def process_incremental(self):
+        """
+        Append an incremental update holding only the dictionaries of the
+        rotated pages: to the input itself when in place, leaving its
+        bytes as they are, or else to a copy of the input. An input with
+        other hard links is copied too, so that they are left unchanged.
+        """
+        with self.doc:
+            self.ofile = self.output_path()
+            changed = list()
+            todo = list(self.pageSpec.sorted())
+            for i, pageNum in enumerate(todo):
+                try:
+                    self.report(i, len(todo))
+                except pu.Cancelled:
+                    self.msg = 'Cancelled'
+                    return False
+                pageObj = self.doc.getPage(pageNum)
+                if pageObj.indirectRef is None:
+                    self.msg = 'Page {0} cannot be updated incrementally.'.format(pageNum + 1)
+                    return False
+                pu.rotatePage(pageObj, self.args_d['rotation'])
+                changed.append(pageObj)
+            if self.args_d.get('in_place') and os.stat(self.ofile).st_nlink == 1:
+                with open(self.ofile, 'r+b') as fh:
+                    size = fh.seek(0, 2)
+                    try:
+                        pu.appendIncrementalUpdate(self.doc, changed, fh)
+                        fh.flush()
+                        os.fsync(fh.fileno())
+                    except BaseException:
+                        # Leave the input as it was
+                        fh.truncate(size)
+                        raise
+                    pu.count('bytesWritten', fh.tell() - size)
+            else:
+                with pu.AtomicWriter(self.ofile) as fw:
+                    fw.copyFrom(self.args_d['inpath'])
+                    pu.appendIncrementalUpdate(self.doc, changed, fw)
+                    self.doc.close()
+            self.report(len(todo), len(todo))
         return True
 
 
 if __name__ == "__main__":
     args = parse_args()
-    R = PdfRotator()
-    if not (R.validate_inputs(**vars(args)) and R.process()):
-        print(R.status())
+    if args.batch:
+        jobs = pu.batchJobs(args.batch, pu.batchBase(args))
+        summary = pu.runBatch('pdfrotate', 'PdfRotator', jobs, args.workers)
+        pu.writeSummary(summary, args.summary)
+    else:
+        R = PdfRotator()
+        pu.cliProgress(R, args.progress)
+        with pu.profiling(args.profile, args.profile_format):
+            if not (R.validate_inputs(**vars(args)) and R.process()):
+                print(R.status())
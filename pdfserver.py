@@ -0,0 +1,450 @@
+"""
+    Serve the PDF tools from a long-running local process.
+
+    Usage:
+
+    python pdfserver.py serve  [--socket path | --port N] [--workers N] \
+                               [--max-jobs N] [--verbose]
+
+    python pdfserver.py call   TOOL key=value ... [--socket path | --port N]
+
+    python pdfserver.py submit jobs.jsonl [--parallel 8] [--summary file] \
+                               [--socket path | --port N]
+
+    python pdfserver.py stats  [--socket path | --port N]
+
+    python pdfserver.py stop   [--socket path | --port N]
+
+    Commands:
+
+        serve         Run the server until it is stopped. Jobs run in a pool
+                      of worker processes that is started, with PyPDF2 and
+                      the tools imported, before the first request arrives;
+                      each worker keeps its metadata cache open between jobs.
+
+        call          Run one job and print its result as JSON. TOOL is one
+                      of combine, reorder, rotate, split or info; each
+                      key=value pair is an argument of the tool's
+                      validate_inputs(), as for the batch manifests.
+                      Values are read as JSON when possible, eg.
+                      incremental=true, otherwise as strings.
+                      profile=true adds the job's profile (see
+                      pdftools_utils.Profile) to the result.
+
+        submit        Run every job of a file holding one JSON object
+                      {"tool": ..., "args": {...}} per line, with up to
+                      --parallel requests in flight, and print or write a
+                      JSON summary like the --batch option of the tools.
+
+        stats         Print the server's job counters.
+
+        stop          Stop the server.
+
+    Options:
+
+        --socket      Unix socket path (default: server.sock in the per-user
+                      runtime directory, $XDG_RUNTIME_DIR/pdftools or
+                      else ~/.cache/pdftools/server). The socket is
+                      created accessible to the user only
+
+        --port        Serve on this TCP port of 127.0.0.1 instead of the
+                      socket. Every request must then carry the token the
+                      server writes to server-PORT.token in the runtime
+                      directory, readable by the user only; the client
+                      commands send it. Where Unix sockets are not
+                      available, eg. on Windows, TCP is the default, on
+                      port 8473, and the runtime directory is
+                      %LOCALAPPDATA%\pdftools\server
+
+        --workers     Number of worker processes (default: number of CPUs)
+
+        --max-jobs    Number of jobs run at once; further requests wait
+                      (default: number of workers)
+
+        --verbose     Log every request to stderr
+
+    Jobs read and write files with the permissions of the server's user,
+    so only that user may submit them: through the socket's permissions,
+    or the token with --port.
+
+    The client commands only import the standard library, so each call
+    costs a Python startup and a local request instead of a PyPDF2 import
+    and a new process. Relative paths in the arguments are resolved
+    against the client's working directory.
+
+    Example: Rotate the first page of doc.pdf through a running server
+
+              python pdfserver.py serve &
+              python pdfserver.py call rotate inpath=doc.pdf pages=1 rotation=CW
+
+"""
+import argparse
+import concurrent.futures
+import concurrent.futures.process
+import http.client
+import http.server
+import hmac
+import importlib
+import json
+import os
+import secrets
+import socket
+import socketserver
+import sys
+import threading
+import time
+
+TOOLS = {'combine': ('pdfcombine', 'PdfCombiner')
+       , 'reorder': ('pdfreorder', 'PdfReorderer')
+       , 'rotate':  ('pdfrotate',  'PdfRotator')
+       , 'split':   ('pdfsplit',   'PdfSplitter')
+       , 'info':    ('pdfinfo',    'PdfInfo')}
+
+# Defaults of the command line tools for arguments they always read
+DEFAULTS = {'reorder': {'pages': '1'}
+          , 'rotate':  {'pages': '1', 'rotation': 'CW'}}
+
+PATH_ARGS = ('inpath', 'inpath1', 'inpath2', 'outpath', 'outdir')
+
+TOKEN_HEADER = 'X-Pdftools-Token'
+
+# Without Unix sockets (Windows) the server is on this port by default
+DEFAULT_PORT = 8473
+
+HAS_UNIX_SOCKETS = hasattr(socket, 'AF_UNIX')
+
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-s', '--socket',   help='Unix socket path', type=str, default = '')
+    parser.add_argument('-p', '--port',     help='TCP port on 127.0.0.1, with a token', type=int, default = None)
+    sub = parser.add_subparsers(dest='command')
+    serve = sub.add_parser('serve')
+    serve.add_argument('-w', '--workers',  help='Worker processes', type=int, default = None)
+    serve.add_argument('-j', '--max-jobs', help='Jobs run at once', type=int, default = None)
+    serve.add_argument('-v', '--verbose',  help='Log requests', action='store_true')
+    call = sub.add_parser('call')
+    call.add_argument('tool', choices=sorted(TOOLS))
+    call.add_argument('args', nargs='*', help='key=value arguments')
+    submit = sub.add_parser('submit')
+    submit.add_argument('jobs', help='JSON lines file of jobs')
+    submit.add_argument('-n', '--parallel', help='Requests in flight', type=int, default = 8)
+    submit.add_argument('-m', '--summary',  help='Summary JSON file (default stdout)', type=str, default = '')
+    sub.add_parser('stats')
+    sub.add_parser('stop')
+    args = parser.parse_args()
+    if args.command is None:
+        parser.error('a command is required')
+    if args.socket and not HAS_UNIX_SOCKETS:
+        parser.error('Unix sockets are not available here; use --port')
+    if args.port is None and not args.socket:
+        if HAS_UNIX_SOCKETS:
+            args.socket = os.path.join(runtimeDir(), 'server.sock')
+        else:
+            args.port = DEFAULT_PORT
+    return args
+
+
+def runtimeDir():
+    '''
+    Return the per-user directory of the server's socket and token,
+    made accessible to the user only. PDFTOOLS_RUNTIME_DIR overrides
+    the default.
+    '''
+    path = os.environ.get('PDFTOOLS_RUNTIME_DIR')
+    if not path:
+        if os.environ.get('XDG_RUNTIME_DIR'):
+            path = os.path.join(os.environ['XDG_RUNTIME_DIR'], 'pdftools')
+        else:
+            if os.name == 'nt':
+                base = os.environ.get('LOCALAPPDATA', os.path.expanduser('~'))
+            else:
+                base = os.environ.get('XDG_CACHE_HOME'
+                                    , os.path.join(os.path.expanduser('~'), '.cache'))
+            # A directory of its own, as the cache directory may have
+            # been created before with a wider mode
+            path = os.path.join(base, 'pdftools', 'server')
+    os.makedirs(path, mode=0o700, exist_ok=True)
+    # makedirs leaves the mode of an existing directory as it is
+    os.chmod(path, 0o700)
+    return path
+
+
+def tokenPath(port):
+    return os.path.join(runtimeDir(), 'server-{0}.token'.format(port))
+
+
+def _warm():
+    '''
+    Worker process initializer: import the tools and open the cache.
+    '''
+    for module, className in TOOLS.values():
+        importlib.import_module(module)
+    importlib.import_module('pdftools_utils').getMetaCache()
+
+
+class PdfServer:
+    '''
+    Runs tool jobs in a pool of warm worker processes, at most maxJobs
+    at a time, and keeps counters of the jobs run.
+    '''
+    def __init__(self, workers=None, maxJobs=None):
+        self.workers = workers or os.cpu_count() or 1
+        self.slots = threading.BoundedSemaphore(maxJobs or self.workers)
+        self.lock = threading.Lock()
+        self.counts = {'jobs': 0, 'ok': 0, 'failed': 0, 'running': 0}
+        self.started = time.time()
+        self.pool = None
+        self.start_pool()
+
+    def start_pool(self):
+        self.pool = concurrent.futures.ProcessPoolExecutor(self.workers, initializer=_warm)
+        # Start every worker now rather than on the first requests
+        for future in [self.pool.submit(os.getpid) for i in range(self.workers)]:
+            future.result()
+
+    def run(self, tool, args):
+        '''
+        Run one job and return its result entry.
+        '''
+        pu = importlib.import_module('pdftools_utils')
+        if tool not in TOOLS:
+            return {'args': pu.redactArgs(args), 'ok': False, 'ofile': None
+                  , 'msg': 'Unknown tool {0}'.format(tool)}
+        module, className = TOOLS[tool]
+        kwargs = dict(DEFAULTS.get(tool, {}))
+        kwargs.update(args)
+        with self.slots:
+            with self.lock:
+                self.counts['running'] += 1
+                pool = self.pool
+            try:
+                result = pool.submit(pu.runJob, module, className, kwargs).result()
+            except concurrent.futures.process.BrokenProcessPool as e:
+                with self.lock:
+                    if self.pool is pool:
+                        pool.shutdown(wait=False)
+                        self.start_pool()
+                result = {'args': pu.redactArgs(kwargs), 'ok': False, 'ofile': None
+                        , 'msg': 'Worker died: {0}'.format(e)}
+            finally:
+                with self.lock:
+                    self.counts['running'] -= 1
+        with self.lock:
+            self.counts['jobs'] += 1
+            self.counts['ok' if result['ok'] else 'failed'] += 1
+        return result
+
+    def stats(self):
+        with self.lock:
+            stats = dict(self.counts)
+        stats['workers'] = self.workers
+        stats['uptime'] = round(time.time() - self.started, 3)
+        return stats
+
+    def close(self):
+        self.pool.shutdown()
+
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+    server_version = 'pdftools'
+    protocol_version = 'HTTP/1.1'
+
+    def address_string(self):
+        return self.client_address[0] if self.client_address else 'local'
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def reply(self, code, obj):
+        data = json.dumps(obj).encode()
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def authorized(self):
+        '''
+        Check the token of a TCP request; reply 403 and return False
+        when it is missing or wrong.
+        '''
+        token = self.server.token
+        if token is None or hmac.compare_digest(self.headers.get(TOKEN_HEADER, ''), token):
+            return True
+        self.reply(403, {'msg': 'Forbidden'})
+        return False
+
+    def do_GET(self):
+        if not self.authorized():
+            return
+        if self.path == '/stats':
+            self.reply(200, self.server.app.stats())
+        else:
+            self.reply(404, {'msg': 'Not found'})
+
+    def do_POST(self):
+        if not self.authorized():
+            return
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+            body = json.loads(self.rfile.read(length) or b'{}')
+        except ValueError as e:
+            self.reply(400, {'msg': 'Bad request: {0}'.format(e)})
+            return
+        if self.path == '/run':
+            self.reply(200, self.server.app.run(body.get('tool'), body.get('args', {})))
+        elif self.path == '/shutdown':
+            self.reply(200, {'msg': 'Stopping'})
+            threading.Thread(target=self.server.shutdown, daemon=True).start()
+        else:
+            self.reply(404, {'msg': 'Not found'})
+
+
+class _TCPServer(socketserver.ThreadingMixIn, http.server.HTTPServer):
+    daemon_threads = True
+
+if HAS_UNIX_SOCKETS:
+    class _UnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+        daemon_threads = True
+
+    class _UnixConnection(http.client.HTTPConnection):
+        def __init__(self, socketPath, timeout=None):
+            super().__init__('localhost', timeout=timeout)
+            self.socketPath = socketPath
+
+        def connect(self):
+            self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                self.sock.connect(self.socketPath)
+            except FileNotFoundError as e:
+                raise ConnectionRefusedError(str(e))
+
+
+def serve(args):
+    app = PdfServer(args.workers, args.max_jobs)
+    token = None
+    if args.socket:
+        if os.path.exists(args.socket):
+            os.remove(args.socket)
+        # Created accessible to the user only, with no window before a chmod
+        umask = os.umask(0o177)
+        try:
+            server = _UnixServer(args.socket, _Handler)
+        finally:
+            os.umask(umask)
+        where = args.socket
+    else:
+        server = _TCPServer(('127.0.0.1', args.port), _Handler)
+        where = '127.0.0.1:{0}'.format(args.port)
+        token = secrets.token_hex(32)
+        removeFile(tokenPath(args.port))
+        fd = os.open(tokenPath(args.port), os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        with os.fdopen(fd, 'w') as fh:
+            fh.write(token)
+    server.app = app
+    server.token = token
+    server.verbose = args.verbose
+    print('Serving on {0} with {1} workers'.format(where, app.workers), file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        app.close()
+        if args.socket and os.path.exists(args.socket):
+            os.remove(args.socket)
+        if token is not None:
+            removeFile(tokenPath(args.port))
+
+
+def removeFile(pathfile):
+    try:
+        os.remove(pathfile)
+    except FileNotFoundError:
+        pass
+
+
+def request(args, method, path, body=None):
+    '''
+    Send one request to the server and return the decoded JSON reply.
+    '''
+    headers = {'Content-Type': 'application/json'}
+    if args.socket:
+        conn = _UnixConnection(args.socket)
+    else:
+        try:
+            with open(tokenPath(args.port)) as fh:
+                headers[TOKEN_HEADER] = fh.read().strip()
+        except FileNotFoundError as e:
+            raise ConnectionRefusedError(str(e))
+        conn = http.client.HTTPConnection('127.0.0.1', args.port)
+    try:
+        data = json.dumps(body).encode() if body is not None else None
+        conn.request(method, path, body=data, headers=headers)
+        return json.loads(conn.getresponse().read())
+    finally:
+        conn.close()
+
+
+def absPaths(args):
+    '''
+    Return a copy of job arguments with relative paths made absolute.
+    '''
+    args = dict(args)
+    for key in PATH_ARGS:
+        if key in args and isinstance(args[key], str) and args[key]:
+            args[key] = os.path.abspath(args[key])
+    if isinstance(args.get('inpath'), list):
+        args['inpath'] = [[os.path.abspath(item[0])] + list(item[1:])
+                          for item in args['inpath']]
+    return args
+
+
+def parseValue(value):
+    try:
+        return json.loads(value)
+    except ValueError:
+        return value
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    try:
+        if args.command == 'serve':
+            serve(args)
+        elif args.command == 'call':
+            kwargs = dict()
+            for item in args.args:
+                key, sep, value = item.partition('=')
+                kwargs[key.replace('-', '_')] = parseValue(value)
+            result = request(args, 'POST', '/run', {'tool': args.tool, 'args': absPaths(kwargs)})
+            print(json.dumps(result, indent=2))
+            sys.exit(0 if result['ok'] else 1)
+        elif args.command == 'submit':
+            jobs = list()
+            with open(args.jobs) as fh:
+                for line in fh:
+                    line = line.strip()
+                    if line and not line.startswith('#'):
+                        job = json.loads(line)
+                        jobs.append({'tool': job['tool'], 'args': absPaths(job.get('args', {}))})
+            with concurrent.futures.ThreadPoolExecutor(args.parallel) as ex:
+                results = list(ex.map(lambda job: request(args, 'POST', '/run', job), jobs))
+            nok = sum(1 for result in results if result['ok'])
+            summary = {'total': len(results), 'ok': nok, 'failed': len(results) - nok
+                     , 'results': results}
+            if args.summary:
+                with open(args.summary, 'w') as fh:
+                    json.dump(summary, fh, indent=2)
+            else:
+                print(json.dumps(summary, indent=2))
+        elif args.command == 'stats':
+            print(json.dumps(request(args, 'GET', '/stats'), indent=2))
+        elif args.command == 'stop':
+            print(request(args, 'POST', '/shutdown')['msg'])
+    except ConnectionError as e:
+        print('Cannot reach the pdftools server: {0}'.format(e), file=sys.stderr)
+        sys.exit(2)
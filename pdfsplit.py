@@ -0,0 +1,299 @@
+"""
+    Split a PDF file into several files.
+
+    Usage:
+
+    python pdfsplit.py --inpath "path/file" [--every N | --specs "specs"
+                       | --bookmarks] [--outdir "path"] [--threads N] \
+                       [--linearize]
+
+    Command line options:
+
+        --inpath      Path and file name of input PDF file
+
+        --every       Optional, write one file per N pages
+                      (default: one file per page)
+
+        --specs       Optional, semicolon separated list of page
+                      specifications, one per output file, each written
+                      like the --pages option of pdfreorder
+                      Note: this option must be quoted
+
+        --bookmarks   Optional, write one file per top-level bookmark,
+                      from its page up to the next bookmark's page
+
+        --outdir      Optional output directory
+                      (default: the directory of the input file)
+
+        --threads     Optional number of threads writing output files
+                      (default: 1)
+
+        --progress    Optional, print progress to the terminal
+
+        --linearize   Optional, write a linearized ("fast web view") file,
+                      whose first page displays before the whole file has
+                      been downloaded
+
+        --repair      Optional, read input files whose cross reference
+                      sections are broken by rebuilding them from a scan
+                      of the whole file. The output is written with
+                      intact cross reference sections
+
+        --password    Optional password, user or owner, of encrypted
+                      input files that the empty password does not open.
+                      Without it, PDFTOOLS_PASSWORD_CALLBACK may name a
+                      function, as module:function, given the path of
+                      such a file and returning its password.
+                      The output is not encrypted
+
+        --object-streams
+                      Optional, pack objects other than streams into
+                      compressed object streams and write a compressed
+                      cross reference stream. Smaller output for documents
+                      with many small objects; requires PDF 1.5 readers.
+                      Ignored with --linearize
+
+        --compress-level
+                      Optional zlib level, 0-9, of --object-streams
+                      (default: 6)
+
+        --objects-per-stream
+                      Optional number of objects in each object stream
+                      (default: 100)
+
+        --batch       Optional, run the same operation on many files: a
+                      directory (every .pdf file in it), a quoted glob
+                      pattern, or a manifest file listing one input path
+                      or one JSON object of arguments per line.
+                      Replaces --inpath
+
+        --workers     Optional number of worker processes for --batch
+                      (default: number of CPUs)
+
+        --summary     Optional file receiving the JSON batch summary
+                      (default: printed)
+
+        --profile     Optional file receiving a profile of the run: the
+                      time spent in each phase (opening, cross reference
+                      parsing, page copying, writing) and the bytes read
+                      and written, objects copied, pages and peak memory.
+                      With --batch, each job's profile is added to its
+                      summary entry instead. The PDFTOOLS_PROFILE
+                      environment variable sets the file as well
+
+        --profile-format
+                      Optional format of --profile: json (default), or
+                      chrome for a trace viewable in chrome://tracing
+
+    The input file is parsed once for all outputs, and each output file
+    holds only the objects its own pages use. The output file names are
+    derived from the input file name by appending "_1", "_2", ... before
+    the extension; with --bookmarks the bookmark title follows the number.
+    Each output file only appears under its name once it is complete.
+
+    Examples:
+
+          Split doc.pdf into single pages
+
+              python pdfsplit.py --inpath doc.pdf
+
+
+          Split doc.pdf into files of 10 pages
+
+              python pdfsplit.py --every 10 --inpath doc.pdf
+
+
+          Write three chapters of doc.pdf to separate files
+
+              python pdfsplit.py --specs "1-12; 13-40; 41-58" --inpath doc.pdf
+
+"""
+import argparse
+import concurrent.futures
+import os
+import re
+import threading
+import pdftools_utils as pu
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-i', '--inpath',    help='Input path/file',  type=str, default = '')
+    parser.add_argument('-e', '--every',     help='Pages per output file', type=int, default = 0)
+    parser.add_argument('-s', '--specs',     help='Page specs, one per output file', type=str, default = '')
+    parser.add_argument('-k', '--bookmarks', help='One output file per top-level bookmark', action='store_true')
+    parser.add_argument('-o', '--outdir',    help='Output directory', type=str, default = '')
+    parser.add_argument('-t', '--threads',   help='Threads writing output files', type=int, default = 1)
+    parser.add_argument('-g', '--progress',  help='Show progress', action='store_true')
+    parser.add_argument('-l', '--linearize', help='Write linearized files', action='store_true')
+    pu.addCompressionArgs(parser)
+    pu.addRepairArgs(parser)
+    pu.addPasswordArgs(parser)
+    pu.addBatchArgs(parser)
+    pu.addProfileArgs(parser)
+    return parser.parse_args()
+
+
+class PdfSplitter(pu.Progress):
+    def __init__(self):
+        super().__init__()
+        self.ofiles = list()
+        self.chunks = list()
+        self.doc = None
+        self.msg = ''
+
+    @pu.profiled('split.validate_inputs')
+    def validate_inputs(self, **kwargs):
+        """
+        Test for valid inputs and return status.
+        Check for existence and validity of PDF input file and output
+        directory, and work out the pages of each output file.
+        """
+        self.args_d = kwargs
+        self.reset_progress()
+        if self.doc is not None:
+            self.doc.close()
+        self.doc, self.msg = pu.openDoc(self.args_d['inpath'], self.args_d.get('repair', False)
+                                      , self.args_d.get('password', ''))
+        ok = self.doc is not None
+        if ok:
+            every = self.args_d.get('every') or 0
+            specs = self.args_d.get('specs') or ''
+            bookmarks = self.args_d.get('bookmarks', False)
+            outdir = self.args_d.get('outdir') or ''
+            if sum(1 for mode in (every, specs, bookmarks) if mode) > 1:
+                ok = False
+                self.msg = 'Choose only one of every, specs and bookmarks.'
+            elif every < 0:
+                ok = False
+                self.msg = 'Pages per output file must be positive.'
+            elif outdir and not os.path.isdir(outdir):
+                ok = False
+                self.msg = 'Cannot find output directory {0}'.format(outdir)
+            if ok:
+                try:
+                    self.chunks = self.make_chunks(every, specs, bookmarks)
+                except pu.PageSpecError as e:
+                    ok = False
+                    self.msg = str(e)
+            if ok and not self.chunks:
+                ok = False
+                if bookmarks:
+                    self.msg = 'No bookmarks pointing to pages of the document.'
+                else:
+                    self.msg = 'No pages to process. Check pages specification.'
+            if ok:
+                for i, (label, pages) in enumerate(self.chunks):
+                    if not pages:
+                        ok = False
+                        self.msg = 'No pages to process in output {0}. Check pages specification.'.format(i + 1)
+                        break
+            if not ok:
+                self.doc.close()
+        return ok
+
+    def make_chunks(self, every, specs, bookmarks):
+        """
+        Return (label, pages) for each output file, where pages are
+        zero-based page numbers of the input.
+        """
+        N = self.doc.numPages
+        if specs:
+            return [('', pu.pages(spec, N)) for spec in specs.split(';') if spec.strip()]
+        if bookmarks:
+            starts = list()
+            for title, pageNum in pu.outlines(self.doc):
+                if not starts or pageNum > starts[-1][1]:
+                    starts.append((title, pageNum))
+            if starts and starts[0][1] > 0:
+                starts.insert(0, ('', 0))
+            ends = [pageNum for title, pageNum in starts[1:]] + [N]
+            return [(title, range(be, ed)) for (title, be), ed in zip(starts, ends)]
+        every = every or 1
+        return [('', range(be, min(be + every, N))) for be in range(0, N, every)]
+
+    def status(self):
+        return self.msg
+
+    def get_ofile(self):
+        return self.ofiles[0] if self.ofiles else None
+
+    def get_ofiles(self):
+        return self.ofiles
+
+    @pu.profiled('split.process')
+    def process(self):
+        """
+        Main processing core.
+        Read pages from input and write each chunk of pages to its own
+        output file.
+        """
+        ok = True
+        with self.doc:
+            indir,infile = os.path.split(self.args_d['inpath'])
+            outdir = self.args_d.get('outdir') or indir
+            base = os.path.splitext(infile)[0]
+            width = len(str(len(self.chunks)))
+            self.ofiles = list()
+            for i, (label, pages) in enumerate(self.chunks):
+                tmpfi = '{0}_{1}'.format(base, str(i + 1).zfill(width))
+                label = re.sub(r'\s+', '_', re.sub(r'[^\w\- ]+', '', label).strip())[:40]
+                if label:
+                    tmpfi += '_' + label
+                self.ofiles.append(os.path.join(outdir, tmpfi + '.pdf'))
+
+            total = sum(len(pages) for label, pages in self.chunks)
+            lock = threading.Lock()
+            written = [0]
+            committed = list()  # outputs of this run that are in place
+            def write(i):
+                pages = self.chunks[i][1]
+                done = [0]
+                def progress(k):
+                    with lock:
+                        written[0] += k - done[0]
+                        done[0] = k
+                        n = written[0]
+                    self.report(n, total)
+                with pu.AtomicWriter(self.ofiles[i], self.args_d.get('linearize', False)) as fw:
+                    Writer = pu.PdfStreamWriter(fw, self.doc.version, **pu.writerOptions(self.args_d))
+                    Writer.addPages(self.doc, pages, None, progress)
+                    Writer.close()
+                with lock:
+                    committed.append(self.ofiles[i])
+
+            threads = max(1, self.args_d.get('threads') or 1)
+            try:
+                if threads == 1:
+                    for i in range(len(self.chunks)):
+                        write(i)
+                else:
+                    with concurrent.futures.ThreadPoolExecutor(threads) as ex:
+                        futures = [ex.submit(write, i) for i in range(len(self.chunks))]
+                        try:
+                            for future in futures:
+                                future.result()
+                        finally:
+                            for future in futures:
+                                future.cancel()
+                self.msg = 'Wrote {0} files'.format(len(self.ofiles))
+            except pu.Cancelled:
+                # Outputs not reached may be files of an earlier run
+                for ofile in committed:
+                    pu.removeFile(ofile)
+                ok = False
+                self.msg = 'Cancelled'
+        return ok
+
+if __name__ == "__main__":
+    args = parse_args()
+    if args.batch:
+        jobs = pu.batchJobs(args.batch, pu.batchBase(args))
+        summary = pu.runBatch('pdfsplit', 'PdfSplitter', jobs, args.workers)
+        pu.writeSummary(summary, args.summary)
+    else:
+        S = PdfSplitter()
+        pu.cliProgress(S, args.progress)
+        with pu.profiling(args.profile, args.profile_format):
+            if S.validate_inputs(**vars(args)):
+                S.process()
+            print(S.status())
@@ -5,6 +5,7 @@
 
     - Combine pdf files
     - Reorder, Rotate, and Extract pages of a pdf file
+    - Split a pdf file into several files
 
     Requires:
     1. PyPDF2 version 1.26.0 or newer (pip install PyPDF2)
@@ -16,11 +17,15 @@ from tkinter import ttk
 from tkinter import filedialog as fd 
 from tkinter import messagebox as mb
 from tkinter import scrolledtext as st
+from tkinter import simpledialog as sd
 import PyPDF2 
 import os
+import queue
+import threading
 import pdfcombine as comb
 import pdfreorder as reorder
 import pdfrotate as rotator
+import pdfsplit as splitter
 import pdfinfo as pdfinfo
 import pdftools_utils as pu
 
@@ -69,10 +74,12 @@ class PdfTools(tk.Frame):
         self.init_combiner_gui()
         self.init_reorderer_gui()
         self.init_rotator_gui()
+        self.init_splitter_gui()
         self.init_info_gui()
         self.Co = comb.PdfCombiner()
         self.Re = reorder.PdfReorderer()
         self.Ro = rotator.PdfRotator()
+        self.Sp = splitter.PdfSplitter()
         self.Pi = pdfinfo.PdfInfo()
 
         # Setup notebook, style
@@ -85,17 +92,40 @@ class PdfTools(tk.Frame):
         self.tab2 = ttk.Frame(self.notebook)
         self.tab3 = ttk.Frame(self.notebook)
         self.tab4 = ttk.Frame(self.notebook)
+        self.tab5 = ttk.Frame(self.notebook)
         self.notebook.add(self.tab1, text="Combine")
         self.notebook.add(self.tab2, text="Reorder")
         self.notebook.add(self.tab3, text="Rotate")
+        self.notebook.add(self.tab5, text="Split")
         self.notebook.add(self.tab4, text="Info")
         self.notebook.grid(row=0, column=0)
 
+        # Progress bar and Cancel button shared by all tabs
+        self.statusframe = tk.Frame(master)
+        self.statusframe.grid(row=1, column=0, sticky='EW')
+        self.progressbar = ttk.Progressbar(self.statusframe
+                                         , orient='horizontal'
+                                         , mode='determinate')
+        self.progressbar.pack(side='left', fill=tk.X, expand=True)
+        self.CancelButton = tk.Button(self.statusframe
+                                    , text='Cancel'
+                                    , state='disabled'
+                                    , command=self.do_cancel)
+        self.CancelButton.pack(side='right')
+
+        # Operations run on worker threads and report back through a queue
+        self.events = queue.Queue()
+        self.running = set()
+        self.active = None
+        self.passwords = dict()  # passwords of encrypted files, by path
+        self.after(100, self.poll_events)
+
         # Populate widgets
         self.create_widgets_tab1()
         self.create_widgets_tab2()
         self.create_widgets_tab3()
         self.create_widgets_tab4()
+        self.create_widgets_tab5()
 
     def create_widgets_tab1(self):
         ''''
@@ -185,6 +215,12 @@ class PdfTools(tk.Frame):
         self.entry1.config(font=("TkDefaultFont", 12))
         self.entry1.pack(fill=tk.X, expand=True)
 
+        # Overwrite checkbox
+        self.OverwriteButton3 = tk.Checkbutton(self.tab2
+                                             , text="Overwrite input file"
+                                             , variable=self.overwrite3)
+        self.OverwriteButton3.pack(side='top', fill=tk.X, expand=True)
+
         # Reorder! button
         self.ReorderButton = tk.Button(self.tab2
                                      , text='Reorder!'
@@ -235,6 +271,18 @@ class PdfTools(tk.Frame):
         self.om3.config(font=("TkDefaultFont", 12))
         self.om3.pack(side='top', fill=tk.X, expand=True)
 
+        # Incremental update checkbox
+        self.IncrementalButton = tk.Checkbutton(self.tab3
+                                              , text="Append as incremental update"
+                                              , variable=self.incremental)
+        self.IncrementalButton.pack(side='top', fill=tk.X, expand=True)
+
+        # Overwrite checkbox
+        self.OverwriteButton4 = tk.Checkbutton(self.tab3
+                                             , text="Overwrite input file"
+                                             , variable=self.overwrite4)
+        self.OverwriteButton4.pack(side='top', fill=tk.X, expand=True)
+
         # Rotate! button
         self.RotateButton = tk.Button(self.tab3
                                     , text='Rotate!'
@@ -266,6 +314,49 @@ class PdfTools(tk.Frame):
                                        , font = ("TkDefaultFont", 10))
         self.textArea1.pack(side='top', fill=tk.X, expand=True)
 
+    def create_widgets_tab5(self):
+        ''''
+        Place widgets for Splitter applet
+        '''
+        # File selection button
+        self.FileButton6 = tk.Button(self.tab5
+                                   , text=openString
+                                   , activebackground='red'
+                                   , command=self.setfile6)
+        self.FileButton6.config(font=("TkDefaultFont", 12))
+        self.FileButton6.pack(side='top', fill='both', expand=True)
+
+        # Label to dispay number of pages in document
+        self.npagelabel3 = tk.Label(self.tab5, text = ' ')
+        self.npagelabel3.config(font=("TkDefaultFont", 10))
+        self.npagelabel3.pack(fill='both', expand=True)
+
+        # Split mode radio buttons
+        for text, value in (('Every N pages', 'every')
+                          , ('Page ranges (eg. 1-3; 4,6; 7-9)', 'specs')
+                          , ('Top-level bookmarks', 'bookmarks')):
+            tk.Radiobutton(self.tab5
+                         , text=text
+                         , value=value
+                         , variable=self.splitmode).pack(side='top', anchor='w')
+
+        # Text enty box for N or the page ranges
+        self.split_text = ''
+        self.entry3 = tk.Entry(self.tab5, textvariable=self.split_text)
+        self.entry3.config(font=("TkDefaultFont", 12))
+        self.entry3.pack(fill='both', expand=True)
+
+        # Split! button
+        self.SplitButton = tk.Button(self.tab5
+                                   , text='Split!'
+                                   , activebackground='red'
+                                   , bg='green', fg='white'
+                                   , command=self.do_split)
+        self.SplitButton.config(font=("TkDefaultFont", 12, "bold"))
+        self.SplitButton.pack(side="bottom"
+                            , fill=tk.X
+                            , expand=True)
+
     def init_combiner_gui(self):
         self.file1 = None
         self.file2 = None
@@ -277,10 +368,19 @@ class PdfTools(tk.Frame):
 
     def init_reorderer_gui(self):
         self.defdir3 = get_default_dir()
+        self.overwrite3 = tk.BooleanVar()
 
     def init_rotator_gui(self):
         self.defdir4 = get_default_dir()
         self.rotate = 'NONE'
+        self.incremental = tk.BooleanVar()
+        self.overwrite4 = tk.BooleanVar()
+
+    def init_splitter_gui(self):
+        self.defdir6 = get_default_dir()
+        self.file6 = None
+        self.splitmode = tk.StringVar()
+        self.splitmode.set('every')
 
     def init_info_gui(self):
         self.defdir5 = get_default_dir()
@@ -371,6 +471,22 @@ class PdfTools(tk.Frame):
             self.updateMostRecentFile(self.file4)
             print("file 4 is " + self.file4)
 
+    def setfile6(self):
+        '''
+        Setup file input for PDF splitter
+        '''
+        self.file6= fd.askopenfilename(initialdir=self.defdir6,
+          filetypes=[("PDF Files", "*.pdf"), ("All Files", "*.*")])
+        if self.file6:
+            self.FileButton6["text"] = self.file6
+            self.FileButton6["bg"] = "yellow"
+            self.defdir6 = os.path.split(self.file6)[0]
+            N = pu.getNumPages(self.file6)
+            displayPages= 'Document contains {0} pages'.format(N)
+            self.npagelabel3["text"] = displayPages
+            self.updateMostRecentFile(self.file6)
+            print("file 6 is " + self.file6)
+
     def setfile5(self):
         '''
         Setup file input for PDF info
@@ -408,6 +524,87 @@ class PdfTools(tk.Frame):
         self.rotate_pages = self.entry2.get()
         print("entry2: entered text is " + self.rotate_pages)
 
+    def run_task(self, P, args, on_done, show_progress=True):
+        '''
+        Validate and process with processor P on a worker thread.
+        on_done(ok) is called from the Tk main loop when P finishes.
+        Returns False when P is still busy with an earlier task; a
+        message box says so for tasks showing progress, other callers
+        report it themselves.
+        '''
+        if P in self.running:
+            if show_progress:
+                mb.showinfo(title=None, message='Operation already in progress')
+            return False
+        self.running.add(P)
+        if show_progress:
+            self.active = P
+            self.progressbar['value'] = 0
+            self.CancelButton['state'] = 'normal'
+            P.set_progress(lambda done, total:
+                           self.events.put(('progress', P, done, total)))
+        args = dict(args, password=self.ask_password)
+        def work():
+            try:
+                ok = P.validate_inputs(**args) and P.process()
+            except Exception as e:
+                ok = False
+                P.msg = 'Error: {0}'.format(e)
+            self.events.put(('done', P, ok, on_done))
+        threading.Thread(target=work, daemon=True).start()
+        return True
+
+    def poll_events(self):
+        '''
+        Apply progress and completion events sent by worker threads
+        '''
+        try:
+            while True:
+                event = self.events.get_nowait()
+                if event[0] == 'progress':
+                    P, done, total = event[1:]
+                    if P is self.active:
+                        self.progressbar['maximum'] = max(total, 1)
+                        self.progressbar['value'] = done
+                elif event[0] == 'password':
+                    pathfile, answer = event[1:]
+                    answer.put(sd.askstring('Password'
+                                          , 'Password of\n' + pathfile
+                                          , show='*', parent=self.master))
+                else:
+                    P, ok, on_done = event[1:]
+                    if not ok:
+                        # A wrong password is asked for again next time
+                        self.passwords = dict()
+                    self.running.discard(P)
+                    if P is self.active:
+                        self.active = None
+                        self.progressbar['value'] = 0
+                        self.CancelButton['state'] = 'disabled'
+                    on_done(ok)
+        except queue.Empty:
+            pass
+        self.after(100, self.poll_events)
+
+    def ask_password(self, pathfile):
+        '''
+        Return the password of encrypted file pathfile, asked for once
+        per session. Called by worker threads when the empty password
+        does not open a file; the dialog runs on the Tk main loop.
+        '''
+        if pathfile not in self.passwords:
+            answer = queue.Queue()
+            self.events.put(('password', pathfile, answer))
+            self.passwords[pathfile] = answer.get()
+        return self.passwords[pathfile]
+
+    def do_cancel(self):
+        '''
+        Cancel the operation shown in the progress bar
+        '''
+        if self.active is not None:
+            self.active.cancel()
+
     def do_combine(self):
         '''
         Setup inputs and call PDF combiner
@@ -417,11 +614,16 @@ class PdfTools(tk.Frame):
               , 'rotate1' : self.rotation[0]
               , 'rotate2' : self.rotation[1]
               , 'clobber' : self.overwrite1.get()}
-        if self.Co.validate_inputs(**args) and self.Co.process():
-            mb.showinfo(title=None, message="Created " + self.Co.get_ofile())
-        else:
-            mb.showinfo(title=None, message=self.Co.status())
-            print(self.Co.status())
+        def done(ok):
+            if ok:
+                msg = "Created " + self.Co.get_ofile()
+                if self.Co.bytesSaved:
+                    msg += '\n' + self.Co.status()
+                mb.showinfo(title=None, message=msg)
+            else:
+                mb.showinfo(title=None, message=self.Co.status())
+                print(self.Co.status())
+        self.run_task(self.Co, args, done)
 
     def do_reorder(self):
         '''
@@ -429,12 +631,15 @@ class PdfTools(tk.Frame):
         '''
         self.set_reorder_text('')
         args = {'inpath' : self.file3,
-                'pages'  : self.reorder_pages}
-        if self.Re.validate_inputs(**args) and self.Re.process():
-            mb.showinfo(title=None, message="Created " + self.Re.get_ofile())
-        else:
-            mb.showinfo(title=None, message=self.Re.status())
-            print(self.Re.status())
+                'pages'  : self.reorder_pages,
+                'in_place' : self.overwrite3.get()}
+        def done(ok):
+            if ok:
+                mb.showinfo(title=None, message="Created " + self.Re.get_ofile())
+            else:
+                mb.showinfo(title=None, message=self.Re.status())
+                print(self.Re.status())
+        self.run_task(self.Re, args, done)
 
     def do_rotate(self):
         '''
@@ -443,26 +648,63 @@ class PdfTools(tk.Frame):
         self.set_rotate_text('')
         args = {'inpath'   : self.file4,
                 'pages'    : self.rotate_pages,
-                'rotation' : self.rotate}
-        if self.Ro.validate_inputs(**args) and self.Ro.process():
-            mb.showinfo(title=None, message="Created " + self.Ro.get_ofile())
+                'rotation' : self.rotate,
+                'incremental' : self.incremental.get(),
+                'in_place' : self.overwrite4.get()}
+        def done(ok):
+            if ok:
+                mb.showinfo(title=None, message="Created " + self.Ro.get_ofile())
+            else:
+                mb.showinfo(title=None, message=self.Ro.status())
+                print(self.Ro.status())
+        self.run_task(self.Ro, args, done)
+
+    def do_split(self):
+        '''
+        Setup inputs and call PDF splitter
+        '''
+        self.split_text = self.entry3.get()
+        args = {'inpath' : self.file6}
+        mode = self.splitmode.get()
+        if mode == 'every':
+            try:
+                args['every'] = int(self.split_text or 1)
+            except ValueError:
+                mb.showinfo(title=None, message='Enter the number of pages per file')
+                return
+        elif mode == 'specs':
+            args['specs'] = self.split_text
         else:
-            mb.showinfo(title=None, message=self.Ro.status())
-            print(self.Ro.status())
+            args['bookmarks'] = True
+        def done(ok):
+            if ok:
+                msg = "{0} in {1}".format(self.Sp.status()
+                                        , os.path.dirname(self.Sp.get_ofile()))
+                mb.showinfo(title=None, message=msg)
+            else:
+                mb.showinfo(title=None, message=self.Sp.status())
+                print(self.Sp.status())
+        self.run_task(self.Sp, args, done)
 
     def do_info(self):
         '''
         Setup inputs and call PDF file info
         '''
         args = {'inpath' : self.mru_file,}
-        self.textArea1.configure(state ='normal')
-        self.textArea1.delete('1.0', tk.END)
-        if self.Pi.validate_inputs(**args) and self.Pi.process():
-            self.textArea1.insert(tk.INSERT, self.Pi.get_doc_info())
-        else:
-            self.textArea1.insert(tk.INSERT, '\n' + self.Pi.status())
-            print(self.Pi.status())
-        self.textArea1.configure(state ='disabled')
+        def done(ok):
+            self.textArea1.configure(state ='normal')
+            self.textArea1.delete('1.0', tk.END)
+            if ok:
+                self.textArea1.insert(tk.INSERT, self.Pi.get_doc_info())
+            else:
+                self.textArea1.insert(tk.INSERT, '\n' + self.Pi.status())
+                print(self.Pi.status())
+            self.textArea1.configure(state ='disabled')
+        if not self.run_task(self.Pi, args, done, show_progress=False):
+            self.textArea1.configure(state ='normal')
+            self.textArea1.delete('1.0', tk.END)
+            self.textArea1.insert(tk.INSERT, '\nBusy reading the previous file; select this file again when it is done.')
+            self.textArea1.configure(state ='disabled')
 
 
 root = tk.Tk()
@@ -2,73 +2,3333 @@
     Helper utilities for PDFtools
 """
 import PyPDF2 
+import asyncio
+import bisect
+import collections
+import concurrent.futures
+import contextlib
+import fnmatch
+import functools
+import glob
+import hashlib
+import importlib
+import json
+import mmap
+import os
+import re
+import signal
+import sqlite3
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import uuid
+import weakref
+import zlib
+from io import BytesIO
+try:
+    import fcntl
+    import resource
+except ImportError:  # Windows
+    fcntl = None
+    resource = None
 
-def ispdf(pathfile):
+class Profile:
+    '''
+    Timing spans and counters of a run. span(name) times the enclosed
+    block; count(name, n) adds n to a counter. Each finished span is
+    passed to callback(span), if given, as a dict with name, start and
+    duration (seconds since the profile began), thread and args.
+
+    Usage:
+        profile = Profile()
+        with profile.span('copyPages'):
+            ...
+        profile.count('pages', 10)
+        profile.dump('profile.json')
+    '''
+    def __init__(self, callback=None):
+        self.callback = callback
+        self.started = time.perf_counter()
+        self.spans = list()
+        self.counters = dict()
+        self.lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def span(self, name, **args):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            span = {'name': name, 'start': start - self.started
+                  , 'duration': time.perf_counter() - start
+                  , 'thread': threading.get_ident(), 'args': args}
+            with self.lock:
+                self.spans.append(span)
+            if self.callback is not None:
+                self.callback(span)
+
+    def count(self, name, n=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def summary(self):
+        '''
+        Return the profile as a JSON serializable dict: total seconds,
+        count and seconds per span name, counters, peak RSS and spans.
+        '''
+        with self.lock:
+            spans = list(self.spans)
+            counters = dict(self.counters)
+        phases = dict()
+        for span in spans:
+            phase = phases.setdefault(span['name'], {'count': 0, 'seconds': 0.0})
+            phase['count'] += 1
+            phase['seconds'] += span['duration']
+        return {'seconds': time.perf_counter() - self.started, 'phases': phases
+              , 'counters': counters, 'peakRssKiB': peakRss(), 'spans': spans}
+
+    def chromeTrace(self):
+        '''
+        Return the profile in the Chrome trace event format, for
+        chrome://tracing or Perfetto.
+        '''
+        summary = self.summary()
+        pid = os.getpid()
+        events = [{'name': span['name'], 'ph': 'X', 'pid': pid, 'tid': span['thread']
+                 , 'ts': span['start'] * 1e6, 'dur': span['duration'] * 1e6, 'args': span['args']}
+                  for span in summary['spans']]
+        counters = dict(summary['counters'], peakRssKiB=summary['peakRssKiB'] or 0)
+        events.append({'name': 'counters', 'ph': 'C', 'pid': pid, 'tid': 0
+                     , 'ts': summary['seconds'] * 1e6, 'args': counters})
+        return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+    def dump(self, pathfile, format='json'):
+        '''
+        Write the profile to pathfile as JSON, or as a Chrome trace with
+        format 'chrome'.
+        '''
+        data = self.chromeTrace() if format == 'chrome' else self.summary()
+        with open(pathfile, 'w') as fh:
+            json.dump(data, fh, indent=1)
+
+def peakRss():
+    '''
+    Return the peak resident set size of this process in KiB, or None
+    where it is not available.
+    '''
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss // 1024 if sys.platform == 'darwin' else rss
+
+class _NoSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+_noSpan = _NoSpan()
+_profile = None
+
+def span(name, **args):
+    '''
+    Time the enclosed block in the active profile, if any.
+    '''
+    if _profile is None:
+        return _noSpan
+    return _profile.span(name, **args)
+
+def count(name, n=1):
+    '''
+    Add n to a counter of the active profile, if any.
+    '''
+    if _profile is not None:
+        _profile.count(name, n)
+
+def profiled(name):
+    '''
+    Decorator timing every call of a function as a span called name.
+    '''
+    def decorate(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if _profile is None:
+                return func(*args, **kwargs)
+            with _profile.span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+@contextlib.contextmanager
+def useProfile(profile):
+    '''
+    Make profile the active profile of the process for the enclosed
+    block; None leaves the active profile as it is.
+    '''
+    global _profile
+    if profile is None:
+        yield None
+        return
+    previous, _profile = _profile, profile
     try:
-        with open(pathfile, "rb") as fh:
-            Reader = PyPDF2.PdfFileReader(fh)
-        return True  # PDF file
-    except PyPDF2.utils.PdfReadError:
-        return False  # not a PDF file
+        yield profile
+    finally:
+        _profile = previous
+
+@contextlib.contextmanager
+def profiling(pathfile='', format='', callback=None):
+    '''
+    Profile the enclosed block and write the profile to pathfile.
+    pathfile and format default to the PDFTOOLS_PROFILE and
+    PDFTOOLS_PROFILE_FORMAT environment variables, callback to the
+    function named module:function by PDFTOOLS_PROFILE_CALLBACK.
+    Without a pathfile or callback nothing is recorded.
+    '''
+    pathfile = pathfile or os.environ.get('PDFTOOLS_PROFILE', '')
+    format = format or os.environ.get('PDFTOOLS_PROFILE_FORMAT', '') or 'json'
+    if callback is None and os.environ.get('PDFTOOLS_PROFILE_CALLBACK'):
+        module, sep, func = os.environ['PDFTOOLS_PROFILE_CALLBACK'].partition(':')
+        callback = getattr(importlib.import_module(module), func)
+    if not pathfile and callback is None:
+        yield None
+        return
+    profile = Profile(callback)
+    try:
+        with useProfile(profile):
+            yield profile
+    finally:
+        if pathfile:
+            profile.dump(pathfile, format)
+
+class PdfDoc:
+    '''
+    An opened PDF document.
+    The file is memory-mapped and read through PdfIndex: opening it reads
+    only the trailers and the positions of the cross reference sections,
+    and an object is parsed from the mapping when it is first asked for.
+    Pages are located by descending the page tree by /Count, so working
+    on a few pages of a huge file reads little more than those pages and
+    the objects they reference. Stream data is copied, never decoded, and
+    is not kept once it has been handed out.
+    Encrypted files are decrypted by the index with a file key derived
+    once, when the file is opened, from the empty password or else from
+    password: the user or owner password, or a callable(pathfile)
+    returning it, such as a prompt or a keyring lookup, only called
+    when the empty password does not open the file. The derived key
+    is kept in key; passing it as key to another PdfDoc of the same
+    file, as worker processes do, skips the derivation.
+    Files PdfIndex cannot read are opened with PyPDF2's reader over the
+    same mapping instead; reader is then set.
+    With repair, unencrypted files whose cross reference sections are
+    broken are read through an index rebuilt by scanning the file (see
+    PdfIndex._rebuild); repaired tells whether that happened.
+    Validity, encryption, restriction and page count are available to
+    validate_inputs() and process() without reparsing the file.
+    Reads are serialized by lock, so several threads may copy pages of
+    the same document.
+    '''
+    def __init__(self, pathfile, repair=False, password='', key=None):
+        self.pathfile = pathfile
+        self.repair = repair
+        self.password = password
+        self.key = key
+        self.fh = None
+        self.buf = None
+        self.index = None
+        self.reader = None
+        self.trailer = None
+        self.isValid = False
+        self.isEncrypted = False
+        self.isRestricted = False
+        self.numPages = 0
+        self.version = '1.3'
+        self._kids = dict()  # page tree node -> (kid refs, first page of each kid, kid is a node)
+        self._exactKids = False
+        self.lock = threading.RLock()
+        self.open()
+
+    def open(self):
+        self.fh = open(self.pathfile, "rb")
+        try:
+            self.buf = mmap.mmap(self.fh.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            return  # empty file
+        i = self.buf.find(b'%PDF-', 0, 1024)
+        if i >= 0:
+            self.version = self.buf[i + 5:i + 8].decode('latin-1')
+        try:
+            with span('xref'):
+                index = PdfIndex(self.pathfile, self.buf, self.repair)
+        except Exception:
+            index = None
+        if index is not None and '/Encrypt' in index.trailer:
+            self.isEncrypted = True
+            try:
+                with span('decrypt'):
+                    if self.key is None:
+                        self.key = self._deriveKey(index.trailer)
+            except Exception:
+                # Unsupported or damaged encryption
+                self.key = None
+            if self.key is None:
+                self.trailer = index.trailer
+                self.isValid = True
+                self.isRestricted = True
+                index.close()
+                return
+            index.useKey(self.key)
+        if index is not None:
+            try:
+                self.numPages = int(index.trailer['/Root']['/Pages']['/Count'])
+                self.index = index
+            except Exception:
+                pass
+        if self.index is not None:
+            self.trailer = self.index.trailer
+            self.isValid = True
+            return
+        if index is not None:
+            index.close()
+        self.buf.seek(0)
+        try:
+            with span('parse'):
+                self.reader = PyPDF2.PdfFileReader(self.buf)
+        except Exception:
+            # Not a PDF file, or one too damaged for the parser
+            self.close()
+            return
+        self.trailer = self.reader.trailer
+        self.isValid = True
+        self.isEncrypted = self.reader.isEncrypted
+        if self.isEncrypted:
+            try:
+                with span('decrypt'):
+                    if self.key is None:
+                        for password in self._passwords():
+                            if self.reader.decrypt(password):
+                                self.key = self.reader._decryption_key
+                                break
+                    else:
+                        # Derived before; PyPDF2 keeps it there
+                        self.reader._decryption_key = self.key
+                self.isRestricted = self.key is None
+            except Exception:
+                self.isRestricted = True
+        if not self.isRestricted:
+            try:
+                self.numPages = self.reader.numPages
+            except Exception:
+                self.isValid = False
+                self.close()
+
+    def _passwords(self):
+        '''
+        Yield the passwords to try: the empty one, then password.
+        '''
+        yield ''
+        password = self.password
+        if callable(password):
+            password = password(self.pathfile)
+        if password:
+            yield password
+
+    def _deriveKey(self, trailer):
+        for password in self._passwords():
+            key = decryptionKey(trailer, password)
+            if key is not None:
+                return key
+        return None
+
+    def close(self):
+        self.reader = None
+        self._kids = dict()
+        if self.index is not None:
+            self.index.close()
+            self.index = None
+        if self.buf is not None:
+            self.buf.close()
+            self.buf = None
+        if self.fh is not None:
+            self.fh.close()
+            self.fh = None
+
+    @property
+    def repaired(self):
+        return self.index is not None and self.index.rebuilt
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def getObject(self, ref, cache=True, raw=False):
+        '''
+        Resolve an IndirectObject of this document.
+        cache - keep the object for later requests; objects that are only
+                visited once, like those being copied, should not be
+        raw   - see PdfIndex.getObject(); encrypted documents always
+                return decrypted bytes
+        '''
+        with self.lock:
+            if self.reader is not None:
+                return self.reader.getObject(ref)
+            return self.index.getObject(ref, cache, raw)
+
+    def _resolve(self, obj):
+        if isinstance(obj, PyPDF2.generic.IndirectObject):
+            return self.index.getObject(obj, False)
+        return obj
+
+    def _locatePage(self, pageNum):
+        '''
+        Return the reference to page pageNum, the page dictionary and the
+        attributes it inherits, descending the page tree by /Count. The
+        page is read, uncached, to check the guess of _kidPages that it
+        is not a page tree node; when it is, the tree is walked again
+        without guessing.
+        '''
+        if not 0 <= pageNum < self.numPages:
+            raise IndexError('page index out of range')
+        target = pageNum
+        ref = self.trailer['/Root'].raw_get('/Pages')
+        node = ref.getObject()
+        inherited = dict()
+        for depth in range(256):
+            for key in ('/Resources', '/MediaBox', '/CropBox', '/Rotate'):
+                if key in node:
+                    inherited[key] = node.raw_get(key)
+            refs, starts, isNode = self._kidPages(ref, node)
+            i = bisect.bisect_right(starts, pageNum) - 1
+            pageNum -= starts[i]
+            ref = refs[i]
+            if not isNode[i]:
+                node = self._resolve(ref)
+                if '/Kids' in node and not self._exactKids:
+                    # A kid taken for a page by _kidPages is a page tree node
+                    self._exactKids = True
+                    self._kids = dict()
+                    return self._locatePage(target)
+                return ref, node, inherited
+            node = ref.getObject()  # page tree nodes are few; keep them
+        raise PyPDF2.utils.PdfReadError('Page tree is too deep')
+
+    def getPageRef(self, pageNum):
+        '''
+        Return the IndirectObject of page pageNum (zero-based), or None.
+        '''
+        with self.lock:
+            if self.reader is not None:
+                return self.reader.getPage(pageNum).indirectRef
+            ref = self._locatePage(pageNum)[0]
+        return ref if isinstance(ref, PyPDF2.generic.IndirectObject) else None
+
+    def getPage(self, pageNum):
+        '''
+        Return page pageNum (zero-based) as a PageObject with its
+        inherited attributes filled in and indirectRef set.
+        '''
+        with self.lock:
+            if self.reader is not None:
+                return self.reader.getPage(pageNum)
+            ref, node, inherited = self._locatePage(pageNum)
+        G = PyPDF2.generic
+        page = PyPDF2.pdf.PageObject(self.index
+                                   , ref if isinstance(ref, G.IndirectObject) else None)
+        for key, value in inherited.items():
+            page[G.NameObject(key)] = value
+        for key, value in node.items():
+            page[key] = value
+        return page
+
+    def _kidPages(self, ref, node):
+        '''
+        Return the kids of page tree node, the number of the first page
+        below each kid, relative to the node, and whether each kid is
+        itself a page tree node.
+        '''
+        key = ref.idnum if isinstance(ref, PyPDF2.generic.IndirectObject) else id(node)
+        if key not in self._kids:
+            refs = list(node['/Kids'])
+            if not self._exactKids and int(node.get('/Count', -1)) == len(refs):
+                # As many pages as kids: the kids are pages, and need not
+                # be read to find out. _locatePage() checks this guess.
+                self._kids[key] = (refs, list(range(len(refs))), [False] * len(refs))
+                return self._kids[key]
+            starts = list()
+            isNode = list()
+            total = 0
+            for kid in refs:
+                starts.append(total)
+                kid = self._resolve(kid)
+                isNode.append('/Kids' in kid)
+                total += int(kid.get('/Count', 0)) if isNode[-1] else 1
+            self._kids[key] = (refs, starts, isNode)
+        return self._kids[key]
+
+class ByteRange:
+    '''
+    A run of bytes in a memory-mapped source file, standing in for the
+    data of a stream that is copied without being read into Python.
+    '''
+    chunk = 1 << 20
+
+    def __init__(self, buf, start, length):
+        self.buf = buf
+        self.start = start
+        self.length = length
+
+    def __len__(self):
+        return self.length
+
+    def __getitem__(self, key):
+        start, stop, step = key.indices(self.length)
+        return ByteRange(self.buf, self.start + start, max(0, stop - start))
+
+    def __bytes__(self):
+        return self.buf[self.start:self.start + self.length]
+
+    def _chunks(self):
+        end = self.start + self.length
+        with memoryview(self.buf) as view:
+            for pos in range(self.start, end, self.chunk):
+                yield view[pos:min(end, pos + self.chunk)]
+
+    def update(self, h):
+        '''
+        Feed the bytes to hash object h.
+        '''
+        for part in self._chunks():
+            h.update(part)
+
+    def writeTo(self, fh):
+        '''
+        Copy the bytes to fh straight from the mapping.
+        '''
+        for part in self._chunks():
+            fh.write(part)
+
+class _RawReader:
+    '''
+    File-like view of a mapping for PyPDF2's object parser. The parser
+    only reads stream data in large reads; those return a ByteRange and
+    skip over the data instead of copying it.
+    '''
+    minimum = 64  # the parser's own reads are at most 20 bytes
+
+    def __init__(self, buf):
+        self.buf = buf
+
+    def read(self, n=-1):
+        if n < self.minimum:
+            return self.buf.read(n)
+        start = self.buf.tell()
+        n = min(n, len(self.buf) - start)
+        self.buf.seek(start + n)
+        return ByteRange(self.buf, start, n)
+
+    def seek(self, *args):
+        return self.buf.seek(*args)
+
+    def tell(self):
+        return self.buf.tell()
+
+def _rc4(key, data):
+    '''
+    Return data encrypted, or decrypted, with RC4 and key.
+    '''
+    S = list(range(256))
+    j = 0
+    n = len(key)
+    for i in range(256):
+        j = (j + S[i] + key[i % n]) & 255
+        S[i], S[j] = S[j], S[i]
+    out = bytearray(len(data))
+    i = j = 0
+    for k, c in enumerate(data):
+        i = (i + 1) & 255
+        si = S[i]
+        j = (j + si) & 255
+        sj = S[j]
+        S[i] = sj
+        S[j] = si
+        out[k] = c ^ S[(si + sj) & 255]
+    return bytes(out)
+
+def decryptionKey(trailer, password=''):
+    '''
+    Return the file key of a document encrypted with the standard
+    security handler, derived from password, the user or the owner
+    password; None when password is neither.
+    Raises NotImplementedError for encryption other than RC4 (/V 1, 2).
+    '''
+    P = PyPDF2.pdf
+    encrypt = trailer['/Encrypt'].getObject()
+    if encrypt.get('/Filter') != '/Standard' or encrypt.get('/V', 0) not in (1, 2):
+        raise NotImplementedError('Only RC4 encryption of the standard security handler is supported')
+    # PyPDF2 takes passwords as latin-1 strings
+    if isinstance(password, str):
+        password = password.encode('latin-1', 'replace')
+    password = password.decode('latin-1')
+    rev = int(encrypt['/R'])
+    keylen = 5 if rev == 2 else int(encrypt.get('/Length', 40)) // 8
+    owner = encrypt['/O']
+    perms = encrypt['/P']
+    id1 = trailer['/ID'][0].getObject()
+    U = encrypt['/U'].original_bytes[:16]
+    # /EncryptMetadata only applies to revision 4, but PyPDF2 writes
+    # revision 3 files as if it were false
+    variants = (True, False) if rev == 3 and '/EncryptMetadata' not in encrypt else (True,)
+    def check(pw):
+        for metadata in variants:
+            if rev == 2:
+                u, key = P._alg34(pw, owner, perms, id1)
+            else:
+                u, key = P._alg35(pw, rev, keylen, owner, perms, id1, metadata)
+            if u[:16] == U:
+                return key
+        return None
+    key = check(password)
+    if key is None:
+        # An owner password decrypts /O to the user password
+        ownerKey = P._alg33_1(password, rev, keylen)
+        userpass = owner.original_bytes
+        for i in ([0] if rev == 2 else range(19, -1, -1)):
+            userpass = _rc4(bytes(c ^ i for c in ownerKey), userpass)
+        key = check(userpass)
+    return key
+
+class XrefMismatchError(PyPDF2.utils.PdfReadError):
+    '''
+    Raised when a cross reference entry points at another object than
+    the one it is for. Unlike a missing object, this is not copied as
+    null: the file would come out with the wrong objects in place.
+    '''
+
+class PdfIndex:
+    '''
+    Lightweight, read-only access to the objects of a PDF file.
+    The file is memory-mapped. Opening it reads only the trailers and the
+    positions of the cross reference subsections; an object's xref entry
+    is located when the object is first asked for, and the object is
+    then read at its offset.
+    Stream objects are not cached; each request reads them again.
+    buf    - optional mapping of pathfile to read instead of mapping it
+             here; it is left open by close()
+    repair - rebuild the index with _rebuild() when the cross reference
+             sections cannot be read or point to the wrong places;
+             rebuilt is then set
+    key    - file key of an encrypted file (see decryptionKey and
+             useKey()); objects are decrypted as they are read, and
+             decrypted objects, streams included, are kept up to
+             decryptedBytes bytes of the file, least recently used first
+             out, so that copying does not decrypt them again
+    '''
+    strict = False  # read by PyPDF2's object parser
+    decryptedBytes = 32 << 20
+
+    _xrefSubsection = re.compile(rb'\s*(\d+)\s+(\d+)[ \t]*[\r\n]+')
+    _xrefEntry = re.compile(rb'\s*(\d{10})\s(\d{5})\s([nf])')
+    _trailer = re.compile(rb'\s*trailer')
+    _objHeader = re.compile(rb'\s*(\d+)\s+(\d+)\s+obj')
+    # Used by _rebuild()
+    _scanObj = re.compile(rb'(?<!\S)(\d{1,10})\s+(\d{1,5})\s+obj\b')
+    _scanType = re.compile(rb'/Type\s*/(\w+)')
+    _scanLength = re.compile(rb'/Length\s+(\d+)(?!\s+\d+\s+R)')
+    _scanEndstream = re.compile(rb'\s*endstream')
+
+    def __init__(self, pathfile, buf=None, repair=False, key=None):
+        self.pathfile = pathfile
+        self.repair = repair
+        self.rebuilt = False
+        self.key = None
+        self._encryptId = None
+        self.decrypted = collections.OrderedDict()  # idnum -> (object, bytes read)
+        self._decryptedSize = 0
+        self.fh = None
+        self.buf = buf
+        if buf is None:
+            self.fh = open(pathfile, 'rb')
+            try:
+                self.buf = mmap.mmap(self.fh.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                self.fh.close()
+                raise PyPDF2.utils.PdfReadError('Cannot read an empty file')
+        # Cross reference subsections, newest first. Each is
+        # (section, first idnum, count, lookup) where section is the
+        # offset of the cross reference section, shared by a table and
+        # its /XRefStm, and lookup(i) returns the entry of object first + i
+        self.subsections = list()
+        self.entries = dict()  # idnum -> ('n', offset, gen) | ('c', stmnum, index) | None
+        self.resolved = dict()
+        self._objStm = (None, None)  # most recently decoded object stream
+        self.trailer = PyPDF2.generic.DictionaryObject()
+        try:
+            try:
+                self._readXref(startxref(self.buf))
+            except Exception:
+                if not repair:
+                    raise
+                self._rebuild()
+        except Exception:
+            self.close()
+            raise
+        if key is not None:
+            self.useKey(key)
+
+    def close(self):
+        self.resolved = dict()
+        self.decrypted = collections.OrderedDict()
+        self._decryptedSize = 0
+        self._objStm = (None, None)
+        if self.fh is not None:
+            self.buf.close()
+            self.fh.close()
+            self.fh = None
+        self.buf = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def useKey(self, key):
+        '''
+        Decrypt the objects read from now on with file key key.
+        '''
+        encrypt = self.trailer.raw_get('/Encrypt')
+        if isinstance(encrypt, PyPDF2.generic.IndirectObject):
+            self._encryptId = encrypt.idnum
+        self.key = key
+        self.resolved = dict()
+        self._objStm = (None, None)
+
+    def _decrypt(self, obj, idnum, generation):
+        '''
+        Decrypt the strings and stream data of obj, object idnum, in place.
+        '''
+        G = PyPDF2.generic
+        if idnum == self._encryptId or \
+                (isinstance(obj, G.StreamObject) and obj.get('/Type') == '/XRef'):
+            return obj
+        n = len(self.key)
+        key = hashlib.md5(self.key + (idnum & 0xffffff).to_bytes(3, 'little')
+                        + (generation & 0xffff).to_bytes(2, 'little')).digest()[:min(16, n + 5)]
+        def decrypt(value):
+            if isinstance(value, (G.ByteStringObject, G.TextStringObject)):
+                return G.createStringObject(_rc4(key, value.original_bytes))
+            if isinstance(value, G.StreamObject):
+                value._data = _rc4(key, value._data)
+            if isinstance(value, G.DictionaryObject):
+                for k, v in list(value.items()):
+                    value[k] = decrypt(v)
+            elif isinstance(value, G.ArrayObject):
+                for i, v in enumerate(value):
+                    value[i] = decrypt(v)
+            return value
+        return decrypt(obj)
+
+    def entry(self, idnum):
+        '''
+        Return the xref entry of object idnum: ('n', offset, generation)
+        for an uncompressed object, ('c', object stream idnum, index) for
+        one in an object stream, or None for a free or undefined object.
+        An object free in the table of a hybrid-reference section is
+        looked for in the section's /XRefStm, but not in older sections.
+        '''
+        if idnum not in self.entries:
+            found = None
+            freedIn = None
+            for section, first, count, lookup in self.subsections:
+                if freedIn is not None and section != freedIn:
+                    break
+                if first <= idnum < first + count:
+                    found = lookup(idnum - first)
+                    if found is not None:
+                        break
+                    freedIn = section
+            self.entries[idnum] = found
+        return self.entries[idnum]
+
+    def _readXref(self, offset):
+        seen = set()
+        while offset is not None and offset not in seen:
+            seen.add(offset)
+            self.buf.seek(offset)
+            if self.buf.read(4) == b'xref':
+                trailer = self._readXrefTable(offset, offset + 4)
+                if '/XRefStm' in trailer:
+                    self._readXrefStream(offset, trailer['/XRefStm'])
+            else:
+                trailer = self._readXrefStream(offset, offset)
+            for key in trailer:
+                if key not in self.trailer:
+                    self.trailer[key] = trailer.raw_get(key)
+            offset = trailer.get('/Prev')
+
+    def _tableEntry(self, pos):
+        e = self._xrefEntry.match(self.buf, pos)
+        if e is None:
+            raise PyPDF2.utils.PdfReadError('xref table read error')
+        if e.group(3) == b'n':
+            return ('n', int(e.group(1)), int(e.group(2)))
+        return None
+
+    def _readXrefTable(self, section, pos):
+        while True:
+            m = self._xrefSubsection.match(self.buf, pos)
+            if m is None:
+                break
+            pos = m.end()
+            first, count = int(m.group(1)), int(m.group(2))
+            # Entries are 20 bytes each; locate them arithmetically when
+            # the table follows the rule, otherwise read them one by one
+            end = pos + 20 * count
+            tail = self.buf[end - 2:end] if count else b'\n'
+            if tail and tail[-1:] in b'\r\n' and \
+                    (self._xrefSubsection.match(self.buf, end) or self._trailer.match(self.buf, end)):
+                lookup = lambda i, pos=pos: self._tableEntry(pos + 20 * i)
+            else:
+                entries = list()
+                for i in range(count):
+                    e = self._xrefEntry.match(self.buf, pos)
+                    if e is None:
+                        raise PyPDF2.utils.PdfReadError('xref table read error')
+                    entries.append(e.start())
+                    end = pos = e.end()
+                lookup = lambda i, entries=entries: self._tableEntry(entries[i])
+            self.subsections.append((section, first, count, lookup))
+            pos = end
+        return self._readTrailerAt(pos)
+
+    def _streamEntry(self, data, widths, row):
+        pos = 0
+        fields = list()
+        for width in widths:
+            fields.append(int.from_bytes(data[row + pos:row + pos + width], 'big'))
+            pos += width
+        if not widths[0]:
+            fields[0] = 1
+        if fields[0] == 1:
+            return ('n', fields[1], fields[2])
+        elif fields[0] == 2:
+            return ('c', fields[1], fields[2])
+        return None
+
+    def _readXrefStream(self, section, offset):
+        xrefStm = self._readObjectAt(offset)
+        data = xrefStm.getData()
+        widths = [int(w) for w in xrefStm['/W']]
+        index = xrefStm.get('/Index', [0, xrefStm['/Size']])
+        rowLength = sum(widths)
+        row = 0
+        for i in range(0, len(index), 2):
+            first, count = int(index[i]), int(index[i + 1])
+            lookup = lambda i, row=row: self._streamEntry(data, widths, row + rowLength * i)
+            self.subsections.append((section, first, count, lookup))
+            row += rowLength * count
+        return xrefStm
+
+    def _rebuild(self):
+        '''
+        Rebuild the index in one pass over the file, for files whose cross
+        reference sections are missing, damaged or point to the wrong
+        places. Every "N G obj" header is located, the last definition
+        of an object number winning. The data of streams is skipped
+        rather than searched, by its direct /Length or else up to
+        endstream, so that text in it is never taken for a header.
+        Objects in object streams are then read from the stream headers.
+        The trailer is the last trailer dictionary or cross reference
+        stream dictionary, with /Root pointing to the last catalog when
+        it does not resolve to one.
+        '''
+        buf = self.buf
+        size = len(buf)
+        entries = dict()
+        objStms = list()
+        xrefStm = None
+        catalog = None
+        pos = 0
+        while True:
+            m = self._scanObj.search(buf, pos)
+            if m is None:
+                break
+            idnum = int(m.group(1))
+            entries[idnum] = ('n', m.start(), int(m.group(2)))
+            pos = start = m.end()
+            # The dictionary ends at endobj or stream, looked for in a
+            # window that grows only for large dictionaries, or at the next
+            # header for an object missing its endobj
+            window = 4096
+            while True:
+                limit = min(size, pos + window)
+                head = buf.find(b'endobj', pos, limit)
+                stream = buf.find(b'stream', pos, limit if head < 0 else head)
+                if stream >= 0:
+                    head = stream
+                if head >= 0 or limit == size:
+                    break
+                window *= 16
+            if head < 0:
+                head = limit
+            following = None
+            if buf.find(b'obj', pos, head) >= 0:
+                following = self._scanObj.search(buf, pos, head)
+            if following is not None:
+                head = following.start()
+                stream = -1
+            kind = self._scanType.search(buf, pos, head)
+            kind = kind.group(1) if kind is not None else None
+            if kind == b'ObjStm':
+                objStms.append(idnum)
+            elif kind == b'XRef':
+                xrefStm = idnum
+            elif kind == b'Catalog':
+                catalog = idnum
+            if stream >= 0:
+                # Skip the data, so that headers in it are not taken for
+                # objects: by a direct /Length, else up to endstream
+                data = stream + 6
+                if buf[data:data + 1] == b'\r':
+                    data += 1
+                if buf[data:data + 1] == b'\n':
+                    data += 1
+                pos = data
+                length = self._scanLength.search(buf, start, head)
+                e = None
+                if length is not None:
+                    e = self._scanEndstream.match(buf, data + int(length.group(1)))
+                if e is not None:
+                    pos = e.end()
+                else:
+                    end = buf.find(b'endstream', data)
+                    if end >= 0:
+                        pos = end + 9
+        if not entries:
+            raise PyPDF2.utils.PdfReadError('No objects found')
+        self.subsections = list()
+        self.entries = entries
+        self.resolved = dict()
+        self._objStm = (None, None)
+        self.rebuilt = True
+        for stmnum in objStms:
+            try:
+                objStm = self._readObjectAt(entries[stmnum][1])
+                if self.key is not None:
+                    objStm = self._decrypt(objStm, stmnum, entries[stmnum][2])
+                header = objStm.getData()[:objStm['/First']].split()
+            except Exception:
+                continue
+            for i in range(len(header) // 2):
+                entries.setdefault(int(header[2 * i]), ('c', stmnum, i))
+        # The trailer nearest the end of the file is the newest
+        trailers = list()
+        i = buf.rfind(b'trailer')
+        if i >= 0:
+            trailers.append((i, lambda: self._readTrailerAt(i)))
+        if xrefStm is not None:
+            trailers.append((entries[xrefStm][1], lambda: self._readObjectAt(entries[xrefStm][1])))
+        trailer = PyPDF2.generic.DictionaryObject()
+        for offset, read in sorted(trailers, key=lambda item: -item[0]):
+            try:
+                found = read()
+            except Exception:
+                continue
+            for key in ('/Root', '/Info', '/Encrypt', '/ID'):
+                if key in found and key not in trailer:
+                    trailer[PyPDF2.generic.NameObject(key)] = found.raw_get(key)
+        try:
+            ok = '/Pages' in trailer['/Root']
+        except Exception:
+            ok = False
+        if not ok:
+            if catalog is None:
+                raise PyPDF2.utils.PdfReadError('No catalog found')
+            trailer[PyPDF2.generic.NameObject('/Root')] = \
+                PyPDF2.generic.IndirectObject(catalog, entries[catalog][2], self)
+        trailer[PyPDF2.generic.NameObject('/Size')] = PyPDF2.generic.NumberObject(max(entries) + 1)
+        self.trailer = trailer
+
+    def _readTrailerAt(self, pos):
+        m = self._trailer.match(self.buf, pos)
+        if m is None:
+            raise PyPDF2.utils.PdfReadError('trailer not found')
+        self.buf.seek(m.end())
+        PyPDF2.utils.readNonWhitespace(self.buf)
+        self.buf.seek(-1, 1)
+        return PyPDF2.generic.readObject(self.buf, self)
+
+    def _readObjectAt(self, offset, raw=False, idnum=None):
+        m = self._objHeader.match(self.buf, offset)
+        if m is None:
+            raise PyPDF2.utils.PdfReadError('No object at offset {0}'.format(offset))
+        if idnum is not None and int(m.group(1)) != idnum:
+            raise XrefMismatchError('Expected object {0} at offset {1}, found {2}'.format(
+                                            idnum, offset, int(m.group(1))))
+        self.buf.seek(m.end())
+        PyPDF2.utils.readNonWhitespace(self.buf)
+        self.buf.seek(-1, 1)
+        obj = PyPDF2.generic.readObject(_RawReader(self.buf) if raw else self.buf, self)
+        # Includes the data of raw streams, which is read when copied
+        count('bytesRead', self.buf.tell() - offset)
+        return obj
+
+    def _readCompressed(self, stmnum, index):
+        if self._objStm[0] != stmnum:
+            objStm = self.getObject(PyPDF2.generic.IndirectObject(stmnum, 0, self))
+            self._objStm = (stmnum, (objStm, BytesIO(objStm.getData())))
+        objStm, data = self._objStm[1]
+        data.seek(0)
+        header = data.read(objStm['/First']).split()
+        data.seek(objStm['/First'] + int(header[2 * index + 1]))
+        return PyPDF2.generic.readObject(data, self)
+
+    def getObject(self, ref, cache=True, raw=False):
+        '''
+        Resolve an IndirectObject. Undefined objects resolve to null.
+        cache - keep the object for later requests; streams are never kept
+        raw   - leave stream data in the file: the data of a stream object
+                is a ByteRange, to be copied with ByteRange.writeTo();
+                the data of encrypted files is always decrypted bytes
+        '''
+        obj = self.resolved.get(ref.idnum)
+        if obj is None and ref.idnum in self.decrypted:
+            self.decrypted.move_to_end(ref.idnum)
+            obj = self.decrypted[ref.idnum][0]
+        if obj is None:
+            entry = self.entry(ref.idnum)
+            size = 0
+            try:
+                if entry is None:
+                    obj = PyPDF2.generic.NullObject()
+                elif entry[0] == 'c':
+                    # Decrypted with their object stream
+                    obj = self._readCompressed(entry[1], entry[2])
+                else:
+                    # The header must name the object the entry is for
+                    obj = self._readObjectAt(entry[1], raw and self.key is None, ref.idnum)
+                    if self.key is not None:
+                        obj = self._decrypt(obj, ref.idnum, entry[2])
+                        size = self.buf.tell() - entry[1]
+            except PyPDF2.utils.PdfReadError:
+                if not self.repair or self.rebuilt:
+                    raise
+                self._rebuild()
+                return self.getObject(ref, cache, raw)
+            if cache and not isinstance(obj, PyPDF2.generic.StreamObject):
+                self.resolved[ref.idnum] = obj
+            elif size:
+                self.decrypted[ref.idnum] = (obj, size)
+                self._decryptedSize += size
+                while self._decryptedSize > self.decryptedBytes and len(self.decrypted) > 1:
+                    self._decryptedSize -= self.decrypted.popitem(last=False)[1][1]
+        return obj
+
+def readInfo(pathfile):
+    '''
+    Return (numPages, info) for pathfile using PdfIndex, where info maps
+    document info keys (without the leading slash) to values. Only the
+    trailer, cross reference sections, catalog, page tree root and info
+    dictionary are read.
+    Returns None when the lightweight path cannot be used (encrypted or
+    damaged files); callers then fall back to PdfDoc.
+    '''
+    try:
+        with PdfIndex(pathfile) as idx:
+            if '/Encrypt' in idx.trailer:
+                return None
+            N = int(idx.trailer['/Root']['/Pages']['/Count'])
+            info = dict()
+            if '/Info' in idx.trailer:
+                infoDict = idx.trailer['/Info']
+                for key in infoDict:
+                    info[key[1:]] = infoDict[key]
+            return N, info
+    except Exception:
+        return None
+
+def getCacheDir():
+    '''
+    Return the per-user cache directory for pdftools.
+    PDFTOOLS_CACHE_DIR overrides the platform default.
+    '''
+    if os.environ.get('PDFTOOLS_CACHE_DIR'):
+        return os.environ['PDFTOOLS_CACHE_DIR']
+    if os.name == 'nt':
+        base = os.environ.get('LOCALAPPDATA', os.path.expanduser('~'))
+    else:
+        base = os.environ.get('XDG_CACHE_HOME'
+                            , os.path.join(os.path.expanduser('~'), '.cache'))
+    return os.path.join(base, 'pdftools')
+
+class MetaCache:
+    '''
+    Persistent cache of file metadata (validity, restriction, page count
+    and document info) in an SQLite database.
+    Entries are keyed by absolute path and are only returned while the
+    file's size and modification time, and optionally its content hash,
+    are unchanged. The least recently used entries are evicted once the
+    cache holds more than maxEntries files.
+    '''
+    def __init__(self, pathfile=None, maxEntries=20000, useHash=False):
+        if pathfile is None:
+            pathfile = os.path.join(getCacheDir(), 'meta.sqlite')
+        os.makedirs(os.path.dirname(pathfile), exist_ok=True)
+        self.maxEntries = maxEntries
+        self.useHash = useHash
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(pathfile, timeout=30
+                                , isolation_level=None, check_same_thread=False)
+        self.db.execute('CREATE TABLE IF NOT EXISTS meta (path TEXT PRIMARY KEY'
+                        ', size INTEGER, mtime INTEGER, hash TEXT, data TEXT, used REAL)')
+        self.db.execute('CREATE INDEX IF NOT EXISTS meta_used ON meta (used)')
+
+    def _key(self, pathfile):
+        st = os.stat(pathfile)
+        digest = fileHash(pathfile) if self.useHash else ''
+        return os.path.abspath(pathfile), st.st_size, st.st_mtime_ns, digest
+
+    def get(self, pathfile):
+        '''
+        Return the cached metadata dict for pathfile, or None.
+        '''
+        path, size, mtime, digest = self._key(pathfile)
+        with self.lock:
+            row = self.db.execute('SELECT size, mtime, hash, data FROM meta WHERE path=?'
+                                , (path,)).fetchone()
+            if row is None or tuple(row[:3]) != (size, mtime, digest):
+                return None
+            self.db.execute('UPDATE meta SET used=? WHERE path=?', (time.time(), path))
+        return json.loads(row[3])
+
+    def put(self, pathfile, meta):
+        path, size, mtime, digest = self._key(pathfile)
+        with self.lock:
+            self.db.execute('INSERT OR REPLACE INTO meta VALUES (?, ?, ?, ?, ?, ?)'
+                          , (path, size, mtime, digest, json.dumps(meta), time.time()))
+            count = self.db.execute('SELECT COUNT(*) FROM meta').fetchone()[0]
+            if count > self.maxEntries:
+                # Evict down to 90% so eviction does not run on every put
+                excess = count - int(self.maxEntries * 0.9)
+                self.db.execute('DELETE FROM meta WHERE path IN (SELECT path FROM meta'
+                                ' ORDER BY used LIMIT ?)', (excess,))
+
+    def stats(self):
+        with self.lock:
+            return {'entries': self.db.execute('SELECT COUNT(*) FROM meta').fetchone()[0]
+                  , 'maxEntries': self.maxEntries}
+
+    def purge(self):
+        with self.lock:
+            self.db.execute('DELETE FROM meta')
+
+_metaCache = None
+
+def getMetaCache():
+    '''
+    Return the process-wide MetaCache, or None when caching is disabled
+    (PDFTOOLS_NO_CACHE is set) or the cache cannot be opened.
+    PDFTOOLS_CACHE_HASH adds a content hash to the cache key.
+    '''
+    global _metaCache
+    if os.environ.get('PDFTOOLS_NO_CACHE'):
+        return None
+    if _metaCache is None:
+        try:
+            _metaCache = MetaCache(useHash=bool(os.environ.get('PDFTOOLS_CACHE_HASH')))
+        except (OSError, sqlite3.Error):
+            _metaCache = False
+    return _metaCache or None
+
+def fileHash(pathfile):
+    '''
+    Return the SHA-256 hex digest of the contents of pathfile.
+    '''
+    h = hashlib.sha256()
+    with open(pathfile, 'rb') as fh:
+        for block in iter(lambda: fh.read(1 << 20), b''):
+            h.update(block)
+    return h.hexdigest()
+
+# Linux ioctl making a file share the extents of another (a reflink)
+_FICLONE = 0x40049409
+
+def cloneFile(src, dst):
+    '''
+    Make dst a copy of src as cheaply as the file system allows: a
+    copy-on-write clone (reflink), else a plain copy. dst never shares
+    its inode with src, so either may later be changed in place.
+    Returns 'reflink' or 'copy'.
+    '''
+    if fcntl is not None and sys.platform.startswith('linux'):
+        try:
+            with open(src, 'rb') as fi, open(dst, 'wb') as fo:
+                fcntl.ioctl(fo.fileno(), _FICLONE, fi.fileno())
+            return 'reflink'
+        except OSError:
+            removeFile(dst)
+    shutil.copyfile(src, dst)
+    return 'copy'
+
+class OutputCache:
+    '''
+    Persistent cache of the output files of jobs, so that a job run again
+    on unchanged inputs is served without being processed.
+    A job is keyed by the tool, its normalized parameters and, for each
+    input file, its content hash, or with quick its size, modification
+    time and inode. The outputs are stored as files in dirname, indexed
+    in an SQLite database, and placed at the requested output paths with
+    cloneFile(), so that a hit costs a reflink where the file system
+    supports them and a copy elsewhere. Outputs are never hard links to
+    the cache, so editing them in place leaves the cache unchanged.
+    Entries whose stored files changed size are dropped. The least
+    recently used entries are evicted once the outputs take more than
+    maxBytes.
+    '''
+    # Part of every key; bump it when the tools' output changes
+    version = 1
+
+    def __init__(self, dirname=None, maxBytes=1 << 30, quick=False):
+        if dirname is None:
+            dirname = os.path.join(getCacheDir(), 'outputs')
+        os.makedirs(dirname, exist_ok=True)
+        self.dirname = dirname
+        self.maxBytes = maxBytes
+        self.quick = quick
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(os.path.join(dirname, 'index.sqlite'), timeout=30
+                                , isolation_level=None, check_same_thread=False)
+        self.db.execute('CREATE TABLE IF NOT EXISTS outputs (key TEXT PRIMARY KEY'
+                        ', sizes TEXT, size INTEGER, used REAL)')
+        self.db.execute('CREATE INDEX IF NOT EXISTS outputs_used ON outputs (used)')
+        self.db.execute('CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value INTEGER)')
+
+    def _inputKey(self, pathfile):
+        if self.quick:
+            st = os.stat(pathfile)
+            return [st.st_size, st.st_mtime_ns, st.st_ino, st.st_dev]
+        return fileHash(pathfile)
+
+    def key(self, tool, inpaths, params):
+        '''
+        Return the key of a job of tool on the files inpaths with the
+        JSON serializable parameters params.
+        '''
+        data = json.dumps([self.version, tool, [self._inputKey(path) for path in inpaths], params]
+                        , sort_keys=True)
+        return hashlib.sha256(data.encode()).hexdigest()
+
+    def _path(self, key, i):
+        return os.path.join(self.dirname, '{0}-{1}.pdf'.format(key, i))
+
+    def _bump(self, name):
+        self.db.execute('INSERT OR IGNORE INTO counters VALUES (?, 0)', (name,))
+        self.db.execute('UPDATE counters SET value=value+1 WHERE name=?', (name,))
+
+    def _drop(self, key, nfiles):
+        self.db.execute('DELETE FROM outputs WHERE key=?', (key,))
+        for i in range(nfiles):
+            removeFile(self._path(key, i))
+
+    def get(self, key, ofiles):
+        '''
+        Place the cached outputs of key at ofiles and return True, or
+        return False if they are not cached.
+        '''
+        with self.lock:
+            row = self.db.execute('SELECT sizes FROM outputs WHERE key=?', (key,)).fetchone()
+            sizes = json.loads(row[0]) if row is not None else None
+            if sizes is not None and (len(sizes) != len(ofiles)
+                    or any(not os.path.isfile(self._path(key, i))
+                           or os.path.getsize(self._path(key, i)) != size
+                           for i, size in enumerate(sizes))):
+                self._drop(key, len(sizes))
+                sizes = None
+            self._bump('misses' if sizes is None else 'hits')
+            if sizes is None:
+                return False
+            self.db.execute('UPDATE outputs SET used=? WHERE key=?', (time.time(), key))
+        for i, ofile in enumerate(ofiles):
+            pdir, pfile = os.path.split(os.path.abspath(ofile))
+            temp = os.path.join(pdir, '.{0}.{1}.tmp'.format(pfile, uuid.uuid4().hex[:8]))
+            try:
+                cloneFile(self._path(key, i), temp)
+                os.replace(temp, ofile)
+            except OSError:
+                removeFile(temp)
+                # Evicted meanwhile
+                return False
+        return True
+
+    def put(self, key, ofiles):
+        '''
+        Add the output files ofiles of the job key.
+        '''
+        sizes = list()
+        for i, ofile in enumerate(ofiles):
+            path = self._path(key, i)
+            temp = '{0}.{1}.tmp'.format(path, uuid.uuid4().hex[:8])
+            try:
+                cloneFile(ofile, temp)
+                os.replace(temp, path)
+            except OSError:
+                removeFile(temp)
+                raise
+            sizes.append(os.path.getsize(path))
+        with self.lock:
+            self.db.execute('INSERT OR REPLACE INTO outputs VALUES (?, ?, ?, ?)'
+                          , (key, json.dumps(sizes), sum(sizes), time.time()))
+            total = self.db.execute('SELECT SUM(size) FROM outputs').fetchone()[0] or 0
+            if total > self.maxBytes:
+                # Evict down to 90% so eviction does not run on every put
+                rows = self.db.execute('SELECT key, sizes, size FROM outputs ORDER BY used').fetchall()
+                for oldKey, oldSizes, size in rows:
+                    if total <= self.maxBytes * 0.9:
+                        break
+                    self._drop(oldKey, len(json.loads(oldSizes)))
+                    total -= size
+
+    def stats(self):
+        with self.lock:
+            entries, size = self.db.execute('SELECT COUNT(*), SUM(size) FROM outputs').fetchone()
+            counters = dict(self.db.execute('SELECT name, value FROM counters').fetchall())
+        return {'entries': entries, 'bytes': size or 0, 'maxBytes': self.maxBytes
+              , 'hits': counters.get('hits', 0), 'misses': counters.get('misses', 0)}
+
+    def purge(self):
+        with self.lock:
+            self.db.execute('DELETE FROM outputs')
+            self.db.execute('DELETE FROM counters')
+            for path in glob.glob(os.path.join(self.dirname, '*.pdf')):
+                removeFile(path)
+
+_outputCache = None
+
+def getOutputCache():
+    '''
+    Return the process-wide OutputCache, or None when caching is disabled
+    (PDFTOOLS_NO_CACHE is set) or the cache cannot be opened.
+    PDFTOOLS_OUTPUT_CACHE_MB sets its size (default 1024 MB), and
+    PDFTOOLS_OUTPUT_CACHE_QUICK keys inputs by size, modification time and
+    inode instead of content hash.
+    '''
+    global _outputCache
+    if os.environ.get('PDFTOOLS_NO_CACHE'):
+        return None
+    if _outputCache is None:
+        try:
+            _outputCache = OutputCache(maxBytes=int(os.environ.get('PDFTOOLS_OUTPUT_CACHE_MB', 1024)) << 20
+                                     , quick=bool(os.environ.get('PDFTOOLS_OUTPUT_CACHE_QUICK')))
+        except (OSError, ValueError, sqlite3.Error):
+            _outputCache = False
+    return _outputCache or None
+
+def outputCacheKey(args_d, tool, inpaths, params):
+    '''
+    Return (cache, key) of a job when args_d enables the output cache
+    (the cache option) and does not replace an input, else (None, None).
+    params - the tool's normalized parameters; the output options of
+             args_d are added to them
+    '''
+    if not args_d.get('cache') or args_d.get('in_place') or args_d.get('clobber'):
+        return None, None
+    cache = getOutputCache()
+    if cache is None:
+        return None, None
+    params = dict(params, writer=writerOptions(args_d), linearize=bool(args_d.get('linearize'))
+                , parallel=args_d.get('parallel') or 1)
+    return cache, cache.key(tool, [os.path.abspath(path) for path in inpaths], params)
+
+@profiled('fileMeta')
+def fileMeta(pathfile):
+    '''
+    Return a dict describing pathfile: ispdf, restricted, numPages and
+    info (document info values as strings).
+    Served from the persistent cache when the file is unchanged,
+    otherwise read with readInfo, or PdfDoc when that is not possible,
+    and added to the cache.
+    '''
+    cache = getMetaCache()
+    if cache is not None:
+        meta = cache.get(pathfile)
+        if meta is not None:
+            return meta
+    meta = {'ispdf': False, 'restricted': False, 'numPages': 0, 'info': dict()}
+    fast = readInfo(pathfile)
+    if fast is not None:
+        meta = {'ispdf': True, 'restricted': False, 'numPages': fast[0]
+              , 'info': dict((key, str(value)) for key, value in fast[1].items())}
+    elif sniffPdf(pathfile)[0] != 'not-pdf':
+        try:
+            with PdfDoc(pathfile) as doc:
+                meta = {'ispdf': doc.isValid, 'restricted': doc.isRestricted
+                      , 'numPages': doc.numPages, 'info': dict()}
+                if doc.isValid and not doc.isRestricted:
+                    docInfo = doc.trailer['/Info'] if '/Info' in doc.trailer else dict()
+                    for key in docInfo:
+                        meta['info'][key[1:]] = str(docInfo[key])
+        except Exception:
+            # Any parser failure means the file cannot be used
+            meta = {'ispdf': False, 'restricted': False, 'numPages': 0, 'info': dict()}
+    if cache is not None:
+        cache.put(pathfile, meta)
+    return meta
+
+def passwordCallback():
+    '''
+    Return the function named module:function by the
+    PDFTOOLS_PASSWORD_CALLBACK environment variable, or None. It is
+    given the path of an encrypted file and returns its password, or
+    None, eg. from a keyring.
+    '''
+    name = os.environ.get('PDFTOOLS_PASSWORD_CALLBACK')
+    if not name:
+        return None
+    module, sep, func = name.partition(':')
+    return getattr(importlib.import_module(module), func)
+
+def openDoc(pathfile, repair=False, password=''):
+    '''
+    Open pathfile as a PdfDoc, rebuilding broken cross reference
+    sections with repair, and check that it can be processed.
+    Encrypted files are decrypted with password, a string or a
+    callable(pathfile) (see PdfDoc), by default the one named by
+    PDFTOOLS_PASSWORD_CALLBACK.
+    Returns (doc, msg); doc is None when the file cannot be used
+    and msg then explains why.
+    '''
+    if not pathfile or not os.path.isfile(pathfile):
+        return None, 'Cannot find input file {0}'.format(pathfile)
+    with span('open', path=pathfile):
+        doc = PdfDoc(pathfile, repair, password or passwordCallback())
+    if not doc.isValid:
+        doc.close()
+        if repair:
+            return None, 'Cannot repair {0}: no usable objects found.'.format(pathfile)
+        return None, '{0} does not look like a valid PDF.'.format(pathfile)
+    if doc.isRestricted:
+        doc.close()
+        if password:
+            return None, 'The password does not open the file:\n {0}'.format(pathfile)
+        return None, 'File is restricted:\n {0}'.format(pathfile)
+    return doc, 'Inputs validated'
+
+def outlines(doc):
+    '''
+    Return [(title, pageNum)] for the top-level bookmarks of doc, in
+    outline order, with zero-based page numbers. Bookmarks whose
+    destination is not a page of doc are left out.
+    '''
+    G = PyPDF2.generic
+    with doc.lock:
+        root = doc.trailer['/Root']
+        if '/Outlines' not in root:
+            return list()
+        pageOf = dict()
+        for pageNum in range(doc.numPages):
+            ref = doc.getPageRef(pageNum)
+            if ref is not None:
+                pageOf.setdefault(ref.idnum, pageNum)
+        result = list()
+        seen = set()
+        item = root['/Outlines'].raw_get('/First') if '/First' in root['/Outlines'] else None
+        while isinstance(item, G.IndirectObject) and item.idnum not in seen:
+            seen.add(item.idnum)
+            node = item.getObject()
+            if '/Dest' in node:
+                dest = node['/Dest']
+            elif '/A' in node and node['/A'].get('/S') == '/GoTo':
+                dest = node['/A']['/D']
+            else:
+                dest = None
+            pageNum = _destPage(root, dest, pageOf)
+            if pageNum is not None:
+                result.append((str(node['/Title']) if '/Title' in node else '', pageNum))
+            item = node.raw_get('/Next') if '/Next' in node else None
+    return result
+
+def _destPage(root, dest, pageOf):
+    '''
+    Return the page number of an explicit or named destination, or None.
+    '''
+    G = PyPDF2.generic
+    if isinstance(dest, (G.NameObject, G.TextStringObject, G.ByteStringObject)):
+        found = None
+        if '/Dests' in root:
+            found = root['/Dests'].get(dest)
+        if found is None and '/Names' in root and '/Dests' in root['/Names']:
+            found = _nameTreeLookup(root['/Names']['/Dests'], dest)
+        dest = found.getObject() if found is not None else None
+    if isinstance(dest, G.DictionaryObject):
+        dest = dest['/D']
+    if isinstance(dest, G.ArrayObject) and dest:
+        page = dest[0]
+        if isinstance(page, G.IndirectObject):
+            return pageOf.get(page.idnum)
+    return None
+
+def _nameTreeLookup(node, name, depth=0):
+    '''
+    Return the value for name in the name tree rooted at node, or None.
+    '''
+    if depth > 32:
+        return None
+    if '/Names' in node:
+        names = node['/Names']
+        for i in range(0, len(names) - 1, 2):
+            if str(names[i]) == str(name):
+                return names[i + 1]
+    for kid in node.get('/Kids', ()):
+        found = _nameTreeLookup(kid.getObject(), name, depth + 1)
+        if found is not None:
+            return found
+    return None
+
+def rotatePage(pageObj, rotation):
+    '''
+    Rotate pageObj in place.
+    rotation - CW, CCW or FV; anything else leaves the page unrotated
+    '''
+    if rotation == 'CW':
+        pageObj.rotateClockwise(90)
+    elif rotation == 'CCW':
+        pageObj.rotateCounterClockwise(90)
+    elif rotation == 'FV':
+        pageObj.rotateClockwise(180)
+    return pageObj
+
+_sniffStartxref = re.compile(rb'startxref\s+(\d+)\s+%%EOF')
+_sniffXref = re.compile(rb'\s*(xref|\d+\s+\d+\s+obj)')
+
+def sniffPdf(pathfile):
+    '''
+    Byte-level check of pathfile, reading only its first and last
+    kilobytes and the start of its last cross reference section.
+    Returns (status, version, reason), where status is
+        'not-pdf'   no %PDF- header in the first kilobyte
+        'damaged'   no %%EOF, or startxref missing or not pointing at
+                    a cross reference section
+        'encrypted' the last trailer names an /Encrypt dictionary
+        'ok'        none of the above
+    Raises OSError when pathfile cannot be read.
+    '''
+    with open(pathfile, 'rb') as fh:
+        head = fh.read(1024)
+        i = head.find(b'%PDF-')
+        if i < 0:
+            return 'not-pdf', None, 'No %PDF- header'
+        version = head[i + 5:i + 8].decode('latin-1')
+        fh.seek(0, 2)
+        size = fh.tell()
+        fh.seek(max(0, size - 2048))
+        tail = fh.read()
+        if b'%%EOF' not in tail:
+            return 'damaged', version, 'No %%EOF marker'
+        matches = _sniffStartxref.findall(tail)
+        if not matches:
+            return 'damaged', version, 'No startxref'
+        offset = int(matches[-1])
+        fh.seek(offset)
+        xref = fh.read(1024)
+    if offset >= size or not _sniffXref.match(xref):
+        return 'damaged', version, 'startxref does not point to a cross reference section'
+    # A classic trailer sits in the tail, a cross reference stream
+    # dictionary at the offset
+    if b'/Encrypt' in tail[tail.rfind(b'trailer'):] or (not xref.startswith(b'xref') and b'/Encrypt' in xref):
+        return 'encrypted', version, ''
+    return 'ok', version, ''
+
+def classify(pathfile):
+    '''
+    Tell whether pathfile is a usable PDF, as cheaply as possible.
+    Returns a dict with the path, status, version, numPages, reason and
+    tier, where status is one of
+        'valid'       readable, not encrypted
+        'encrypted'   encrypted, readable with the empty password
+        'restricted'  encrypted, needs a password
+        'damaged'     readable only by recovering from a broken cross
+                      reference section or trailer
+        'not-pdf'     not a PDF file, or not readable at all
+    and tier is the check that decided it: 'sniff', a byte-level check
+    of the header and trailer (sniffPdf); 'index', reading the trailer,
+    catalog and page tree root (readInfo); or 'parse', opening the file
+    with PdfDoc, rebuilding its index if needed, and if that fails with
+    PyPDF2's lenient parser.
+    '''
+    result = {'path': pathfile, 'status': 'not-pdf', 'version': None, 'numPages': None
+            , 'reason': '', 'tier': 'sniff'}
+    try:
+        sniffed, result['version'], result['reason'] = sniffPdf(pathfile)
+    except OSError as e:
+        result['reason'] = str(e)
+        return result
+    if sniffed == 'not-pdf':
+        return result
+    if sniffed == 'ok':
+        result['tier'] = 'index'
+        fast = readInfo(pathfile)
+        if fast is not None:
+            result['status'] = 'valid'
+            result['numPages'] = fast[0]
+            return result
+    result['tier'] = 'parse'
+    try:
+        with PdfDoc(pathfile, repair=True) as doc:
+            if doc.isValid:
+                result['numPages'] = doc.numPages if not doc.isRestricted else None
+                if doc.isRestricted:
+                    result['status'] = 'restricted'
+                elif doc.isEncrypted:
+                    result['status'] = 'encrypted'
+                elif sniffed == 'damaged' or doc.index is None or doc.repaired:
+                    # Recoverable only if the page tree is complete
+                    if doc.numPages:
+                        doc.getPage(0)
+                        doc.getPage(doc.numPages - 1)
+                    result['status'] = 'damaged'
+                else:
+                    result['status'] = 'valid'
+                return result
+    except Exception as e:
+        result['reason'] = '{0}: {1}'.format(type(e).__name__, e)
+    try:
+        with open(pathfile, 'rb') as fh:
+            reader = PyPDF2.PdfFileReader(fh, strict=False)
+            if reader.isEncrypted:
+                result['status'] = 'restricted'
+            else:
+                result['numPages'] = reader.getNumPages()
+                result['status'] = 'damaged'
+            result['reason'] = result['reason'] or 'Recovered by the lenient parser'
+    except Exception as e:
+        result['status'] = 'not-pdf'
+        result['numPages'] = None
+        result['reason'] = 'Unreadable: {0}: {1}'.format(type(e).__name__, e)
+    return result
+
+def _classifyChunk(paths):
+    return [classify(path) for path in paths]
+
+def classifyMany(paths, workers=None, chunkSize=64):
+    '''
+    Classify every path of the iterable paths in worker processes and
+    yield the results in order. Paths are sent to the workers chunkSize
+    at a time, with a bounded number of chunks in flight, so that paths
+    may come from a generator over millions of files.
+    '''
+    workers = workers or os.cpu_count() or 1
+    with concurrent.futures.ProcessPoolExecutor(workers) as ex:
+        pending = collections.deque()
+        chunk = list()
+        for path in paths:
+            chunk.append(path)
+            if len(chunk) == chunkSize:
+                pending.append(ex.submit(_classifyChunk, chunk))
+                chunk = list()
+                while len(pending) > 2 * workers:
+                    for result in pending.popleft().result():
+                        yield result
+        if chunk:
+            pending.append(ex.submit(_classifyChunk, chunk))
+        while pending:
+            for result in pending.popleft().result():
+                yield result
+
+def walkFiles(root, pattern=''):
+    '''
+    Yield the paths of the regular files under root, or root itself if
+    it is a file, optionally only those whose names match the glob
+    pattern (case-insensitive), eg. "*.pdf".
+    '''
+    if not os.path.isdir(root):
+        yield root
+        return
+    stack = [root]
+    while stack:
+        try:
+            entries = list(os.scandir(stack.pop()))
+        except OSError:
+            continue
+        for entry in sorted(entries, key=lambda entry: entry.name):
+            if entry.is_dir(follow_symlinks=False):
+                stack.append(entry.path)
+            elif entry.is_file() and (not pattern or fnmatch.fnmatch(entry.name.lower(), pattern.lower())):
+                yield entry.path
+
+def ispdf(pathfile):
+    return fileMeta(pathfile)['ispdf']
 
 def getNumPages(pathfile):
-    N = 0
-    if ispdf(pathfile) and not isRestricted(pathfile):
-        with open(pathfile, "rb") as fh:
-            Reader = PyPDF2.PdfFileReader(fh)
-            N = Reader.numPages
-    return N
+    meta = fileMeta(pathfile)
+    if meta['ispdf'] and not meta['restricted']:
+        return meta['numPages']
+    return 0
 
-def pages(pageString, N):
+class PageSpecError(ValueError):
+    '''
+    Raised for a malformed page specification.
+    '''
+
+class PageSpec:
     '''
-    Convert page specification into a list of pages
-    pageString - comma separated string of pages and page ranges
+    Compiled page specification.
+    pageString - comma separated string of pages and page ranges;
+                 a range may run backwards, eg. "10-1"
     N - total number of pages in the document
+    The ranges are kept in the order given, clamped to the document, as
+    (first, last, step) triples of zero-based pages. Iterating yields the
+    pages in specification order. len() is the number of pages yielded,
+    and membership tests bisect the sorted, merged ranges.
     '''
-    s_l = [item.strip() for item in pageString.split(',')]
-    pageRange = list()
-    for item in s_l:
-        if '-' in item:
-            l = item.split('-')
-            if len(l) > 2:
-                print('More than 1 dash not allowed in page range')
-                continue
-            if (not l[0].isnumeric()) or (not l[1].isnumeric()):
-                print('Non-numeric page not allowed')
+    def __init__(self, pageString, N):
+        self.N = N
+        self.ranges = list()
+        for item in pageString.split(','):
+            item = item.strip()
+            if not item:
                 continue
+            l = [part.strip() for part in item.split('-')]
+            if len(l) > 2:
+                raise PageSpecError('More than 1 dash not allowed in page range: {0}'.format(item))
+            for part in l:
+                if not part.isdecimal():
+                    raise PageSpecError('Non-numeric page not allowed: {0}'.format(item))
             be = int(l[0]) - 1 # zero-based
-            ed = int(l[1]) - 1
+            ed = int(l[-1]) - 1
             if be <= ed:
-                while be <= ed:
-                    if be in range(0, N):
-                        pageRange.append(be)
-                    be += 1
+                be, ed, step = max(be, 0), min(ed, N - 1), 1
             else:
-                while be >= ed:
-                    if be in range(0, N):
-                        pageRange.append(be)
-                    be -= 1
-        else:
-            if not item.isnumeric():
-                print('Non-numeric page not allowed')
-                continue
-            pg = int(item) - 1 # zero-based
-            if pg in range(0, N):
-                pageRange.append(pg)
-    return pageRange
+                be, ed, step = min(be, N - 1), max(ed, 0), -1
+            if (ed - be) * step >= 0:
+                self.ranges.append((be, ed, step))
+        self.length = sum(abs(ed - be) + 1 for be, ed, step in self.ranges)
+        spans = sorted((min(be, ed), max(be, ed)) for be, ed, step in self.ranges)
+        self.merged = list()
+        for lo, hi in spans:
+            if self.merged and lo <= self.merged[-1][1] + 1:
+                self.merged[-1] = (self.merged[-1][0], max(self.merged[-1][1], hi))
+            else:
+                self.merged.append((lo, hi))
+        self.starts = [lo for lo, hi in self.merged]
+
+    def __iter__(self):
+        for be, ed, step in self.ranges:
+            for pg in range(be, ed + step, step):
+                yield pg
+
+    def __len__(self):
+        return self.length
+
+    def __contains__(self, pg):
+        i = bisect.bisect_right(self.starts, pg) - 1
+        return i >= 0 and pg <= self.merged[i][1]
+
+    def sorted(self):
+        '''
+        Yield each page in the specification once, in ascending order.
+        '''
+        for lo, hi in self.merged:
+            for pg in range(lo, hi + 1):
+                yield pg
+
+def pages(pageString, N):
+    '''
+    Compile a page specification into a PageSpec.
+    Raises PageSpecError when pageString is malformed.
+    '''
+    return PageSpec(pageString, N)
 
 def isRestricted(pathfile):
     '''
     Return true if file is not decryptable (eg. file is restricted).
     '''
-    restricted = False
-    with open(pathfile, "rb") as fh:
-        Reader = PyPDF2.PdfFileReader(fh)
-        if Reader.isEncrypted:
+    return fileMeta(pathfile)['restricted']
+
+class Cancelled(Exception):
+    '''
+    Raised inside process() when the operation has been cancelled.
+    '''
+
+class Progress:
+    '''
+    Progress reporting and cancellation for the processor classes.
+    set_progress() registers callback(done, total), called as pages are
+    processed; cancel(), which may be called from another thread, stops
+    a running process() at the next page.
+    '''
+    def __init__(self):
+        self.progress_cb = None
+        self.cancel_event = threading.Event()
+
+    def set_progress(self, callback):
+        self.progress_cb = callback
+
+    def cancel(self):
+        self.cancel_event.set()
+
+    def reset_progress(self):
+        self.cancel_event.clear()
+
+    def report(self, done, total):
+        '''
+        Report progress and raise Cancelled if cancel() has been called.
+        '''
+        if self.cancel_event.is_set():
+            raise Cancelled()
+        if self.progress_cb is not None:
+            self.progress_cb(done, total)
+
+    async def validate_inputs_async(self, **kwargs):
+        '''
+        Awaitable validate_inputs(), run in the async executor.
+        '''
+        return await runAsync(lambda: self.validate_inputs(**kwargs))
+
+    async def process_async(self):
+        '''
+        Awaitable process(), run in the async executor. Cancelling the
+        awaiting task cancels process() and waits for it to clean up
+        before CancelledError propagates.
+        '''
+        return await runAsync(self.process, self.cancel)
+
+_asyncLimit = 4
+_asyncExecutor = None
+_asyncSlots = weakref.WeakKeyDictionary()
+
+def setAsyncLimit(n):
+    '''
+    Set the number of blocking calls the async API runs at once.
+    Call it before the first async call.
+    '''
+    global _asyncLimit, _asyncExecutor
+    _asyncLimit = max(1, n)
+    if _asyncExecutor is not None:
+        _asyncExecutor.shutdown(wait=False)
+        _asyncExecutor = None
+    _asyncSlots.clear()
+
+async def runAsync(func, onCancel=None):
+    '''
+    Run the blocking func() in a worker thread, at most setAsyncLimit()
+    calls at a time per event loop, and return its result.
+    If the awaiting task is cancelled, onCancel() is called and func()
+    is still waited for, so that it never outlives the cancellation.
+    '''
+    global _asyncExecutor
+    loop = asyncio.get_event_loop()
+    if _asyncExecutor is None:
+        _asyncExecutor = concurrent.futures.ThreadPoolExecutor(_asyncLimit)
+    if loop not in _asyncSlots:
+        _asyncSlots[loop] = asyncio.Semaphore(_asyncLimit)
+    async with _asyncSlots[loop]:
+        future = loop.run_in_executor(_asyncExecutor, func)
+        try:
+            return await asyncio.shield(future)
+        except asyncio.CancelledError:
+            if onCancel is not None:
+                onCancel()
+            await asyncio.wait([future])
+            raise
+
+def removeFile(pathfile):
+    '''
+    Remove a partially written output file, if any.
+    '''
+    if pathfile and os.path.isfile(pathfile):
+        os.remove(pathfile)
+
+class AtomicWriter:
+    '''
+    Write a file so that readers of pathfile only ever see its previous
+    content or the complete new content.
+    Data goes to a temporary file in the same directory through a large
+    buffer. commit() flushes it, syncs it to disk and renames it over
+    pathfile; leaving the with block commits, unless an exception is
+    raised, in which case the temporary file is removed instead. Callers
+    replacing one of their inputs should close it before committing.
+    With linearize, commit() first rewrites the complete file as a
+    linearized PDF with PdfLinearizer.
+
+    Usage:
+        with AtomicWriter(pathfile) as fw:
+            fw.write(data)
+    '''
+    bufferSize = 1 << 20
+
+    def __init__(self, pathfile, linearize=False):
+        self.pathfile = pathfile
+        self.linearize = linearize
+        self.tempfile = self._tempName()
+        self.fh = open(self.tempfile, 'xb', buffering=self.bufferSize)
+
+    def _tempName(self):
+        pdir, pfile = os.path.split(os.path.abspath(self.pathfile))
+        return os.path.join(pdir, '.{0}.{1}.tmp'.format(pfile, uuid.uuid4().hex[:8]))
+
+    def _linearize(self):
+        self.fh.close()
+        self.fh = None
+        plain = self.tempfile
+        self.tempfile = self._tempName()
+        self.fh = open(self.tempfile, 'xb', buffering=self.bufferSize)
+        try:
+            with PdfDoc(plain) as doc, span('linearize'):
+                PdfLinearizer(doc).write(self.fh)
+        finally:
+            removeFile(plain)
+
+    def write(self, data):
+        return self.fh.write(data)
+
+    def copyFrom(self, pathfile):
+        '''
+        Write the whole content of pathfile: as a copy-on-write clone
+        where the file system allows it, else with copy_file_range,
+        which copies inside the kernel, else through the buffer.
+        '''
+        self.fh.flush()
+        start = self.fh.tell()
+        with open(pathfile, 'rb') as fi:
+            if start == 0 and fcntl is not None and sys.platform.startswith('linux'):
+                try:
+                    fcntl.ioctl(self.fh.fileno(), _FICLONE, fi.fileno())
+                    self.fh.seek(0, 2)
+                    return
+                except OSError:
+                    pass
+            if hasattr(os, 'copy_file_range'):
+                try:
+                    size = os.fstat(fi.fileno()).st_size
+                    copied = 0
+                    while copied < size:
+                        n = os.copy_file_range(fi.fileno(), self.fh.fileno(), size - copied)
+                        if n == 0:
+                            break
+                        copied += n
+                    self.fh.seek(0, 2)
+                    if copied == size:
+                        return
+                except OSError:
+                    pass
+                self.fh.seek(start)
+                self.fh.truncate()
+                fi.seek(0)
+            shutil.copyfileobj(fi, self.fh, self.bufferSize)
+
+    def tell(self):
+        return self.fh.tell()
+
+    def seek(self, *args):
+        return self.fh.seek(*args)
+
+    def commit(self):
+        '''
+        Move the complete file into place.
+        '''
+        if self.fh is None:
+            return
+        if self.linearize:
             try:
-                Reader.decrypt('')
-            except NotImplementedError:
-                restricted = True
+                self._linearize()
             except Exception:
-                restricted = True
-    return restricted
+                self.discard()
+                raise
+        count('bytesWritten', self.fh.tell())
+        with span('commit'):
+            self._commit()
+
+    def _commit(self):
+        self.fh.flush()
+        os.fsync(self.fh.fileno())
+        self.fh.close()
+        self.fh = None
+        if os.path.exists(self.pathfile):
+            try:
+                shutil.copymode(self.pathfile, self.tempfile)
+            except OSError:
+                pass
+        os.replace(self.tempfile, self.pathfile)
+        # Make the rename itself durable
+        if hasattr(os, 'O_DIRECTORY'):
+            try:
+                fd = os.open(os.path.dirname(os.path.abspath(self.pathfile)), os.O_RDONLY | os.O_DIRECTORY)
+                try:
+                    os.fsync(fd)
+                finally:
+                    os.close(fd)
+            except OSError:
+                pass
+
+    def discard(self):
+        '''
+        Drop the new content, leaving pathfile as it was.
+        '''
+        if self.fh is None:
+            return
+        self.fh.close()
+        self.fh = None
+        removeFile(self.tempfile)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, excType, *exc):
+        if excType is None:
+            self.commit()
+        else:
+            self.discard()
+
+def cliProgress(P, show=False):
+    '''
+    Hook processor P to the terminal: optionally print progress to
+    stderr, and cancel P cleanly on Ctrl-C. P only sees the cancellation
+    between pages, so a second Ctrl-C raises KeyboardInterrupt at once,
+    eg. while a file is opened or repaired.
+    '''
+    if show:
+        def callback(done, total):
+            if done == total or done % max(1, total // 100) == 0:
+                sys.stderr.write('\r{0}/{1} pages'.format(done, total))
+            if done == total:
+                sys.stderr.write('\n')
+        P.set_progress(callback)
+    def interrupt(signum, frame):
+        P.cancel()
+        signal.signal(signal.SIGINT, signal.default_int_handler)
+        sys.stderr.write('\nCancelling; press Ctrl-C again to stop at once\n')
+    signal.signal(signal.SIGINT, interrupt)
+
+def batchJobs(spec, base):
+    '''
+    Expand a batch specification into a list of keyword argument dicts.
+    spec - a directory (every .pdf in it, the extension in any case), a
+           glob pattern, or a manifest file. Each manifest line is either
+           a path or a JSON object of arguments for one job; blank lines
+           and lines starting with # are skipped. A file matched twice
+           by a directory or pattern runs once.
+    base - arguments shared by every job; each job sets 'inpath'
+    '''
+    if os.path.isdir(spec):
+        # One case-insensitive match, so that no file is matched twice
+        # on case-insensitive file systems
+        paths = sorted(entry.path for entry in os.scandir(spec)
+                       if entry.is_file() and entry.name.lower().endswith('.pdf'))
+    elif os.path.isfile(spec) and not spec.lower().endswith('.pdf'):
+        jobs = list()
+        with open(spec) as fh:
+            for line in fh:
+                line = line.strip()
+                if not line or line.startswith('#'):
+                    continue
+                if line.startswith('{'):
+                    jobs.append(dict(base, **json.loads(line)))
+                else:
+                    jobs.append(dict(base, inpath=line))
+        return jobs
+    else:
+        paths = sorted(glob.glob(spec, recursive=True))
+    jobs = list()
+    seen = set()
+    for path in paths:
+        key = os.path.normcase(os.path.abspath(path))
+        if key not in seen:
+            seen.add(key)
+            jobs.append(dict(base, inpath=path))
+    return jobs
+
+# Job arguments never echoed in summaries
+secretArgs = ('password',)
+
+def redactArgs(kwargs):
+    '''
+    Return a copy of the job arguments kwargs fit for a summary, with
+    the values of secretArgs, and callables such as password callbacks,
+    replaced by '***'.
+    '''
+    return {key: '***' if (key in secretArgs and value) or callable(value) else value
+            for key, value in kwargs.items()}
+
+def runJob(module, className, kwargs):
+    '''
+    Run className from module on kwargs, normally in a worker process,
+    and return its summary entry. Exceptions are reported in the entry.
+    When kwargs sets profile, the entry holds the job's profile summary.
+    '''
+    result = {'args': redactArgs(kwargs), 'ok': False, 'msg': '', 'ofile': None}
+    profile = Profile() if kwargs.get('profile') else None
+    try:
+        with useProfile(profile):
+            P = getattr(importlib.import_module(module), className)()
+            result['ok'] = bool(P.validate_inputs(**kwargs) and P.process())
+        result['msg'] = P.status()
+        if hasattr(P, 'get_ofile'):
+            result['ofile'] = P.get_ofile()
+        if hasattr(P, 'get_doc_info') and result['ok']:
+            result['info'] = P.get_doc_info()
+    except Exception as e:
+        result['msg'] = '{0}: {1}'.format(type(e).__name__, e)
+    if profile is not None:
+        result['profile'] = profile.summary()
+    return result
+
+def runBatch(module, className, jobs, workers=None):
+    '''
+    Run className from module once per job across a pool of worker
+    processes. A failing job is recorded in the summary and does not
+    stop the batch.
+    Returns a summary dict with per-job results in job order.
+    '''
+    results = [None] * len(jobs)
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as ex:
+        futures = dict()
+        for i, job in enumerate(jobs):
+            futures[ex.submit(runJob, module, className, job)] = i
+        for future in concurrent.futures.as_completed(futures):
+            i = futures[future]
+            try:
+                results[i] = future.result()
+            except Exception as e:
+                # The worker itself died
+                results[i] = {'args': redactArgs(jobs[i]), 'ok': False, 'ofile': None
+                            , 'msg': '{0}: {1}'.format(type(e).__name__, e)}
+    nok = sum(1 for result in results if result['ok'])
+    return {'total': len(results), 'ok': nok, 'failed': len(results) - nok
+          , 'results': results}
+
+async def runJobAsync(module, className, kwargs):
+    '''
+    Awaitable runJob(), running the processor in the async executor of
+    the calling process rather than in a worker process.
+    '''
+    result = {'args': redactArgs(kwargs), 'ok': False, 'msg': '', 'ofile': None}
+    try:
+        P = getattr(importlib.import_module(module), className)()
+        result['ok'] = bool(await P.validate_inputs_async(**kwargs)
+                            and await P.process_async())
+        result['msg'] = P.status()
+        if hasattr(P, 'get_ofile'):
+            result['ofile'] = P.get_ofile()
+        if hasattr(P, 'get_doc_info') and result['ok']:
+            result['info'] = P.get_doc_info()
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        result['msg'] = '{0}: {1}'.format(type(e).__name__, e)
+    return result
+
+async def asCompleted(module, className, jobs):
+    '''
+    Run className from module once per job and yield the summary
+    entries as the jobs finish. Jobs still running when the consumer
+    stops iterating, or is cancelled, are cancelled and waited for.
+
+    Usage:
+        async for result in asCompleted('pdfinfo', 'PdfInfo', jobs):
+            ...
+    '''
+    tasks = [asyncio.ensure_future(runJobAsync(module, className, job)) for job in jobs]
+    try:
+        for future in asyncio.as_completed(tasks):
+            yield await future
+    finally:
+        pending = [task for task in tasks if not task.done()]
+        for task in pending:
+            task.cancel()
+        if pending:
+            await asyncio.wait(pending)
+
+def writeSummary(summary, pathfile=''):
+    '''
+    Write a batch summary as JSON to pathfile, or to stdout.
+    '''
+    if pathfile:
+        with open(pathfile, 'w') as fh:
+            json.dump(summary, fh, indent=2)
+    else:
+        json.dump(summary, sys.stdout, indent=2)
+        print()
+
+def addBatchArgs(parser):
+    '''
+    Add the batch mode options shared by the command line tools.
+    '''
+    parser.add_argument('-b', '--batch',   help='Directory, glob or manifest of input files', type=str, default = '')
+    parser.add_argument('-w', '--workers', help='Number of batch worker processes', type=int, default = None)
+    parser.add_argument('-m', '--summary', help='Batch summary JSON file (default stdout)', type=str, default = '')
+
+def addCompressionArgs(parser):
+    '''
+    Add the output compression options shared by the writing tools.
+    '''
+    parser.add_argument('-x', '--object-streams',   help='Pack objects into compressed object streams', action='store_true')
+    parser.add_argument('--compress-level',         help='zlib level of object streams (0-9)', type=int, default = 6)
+    parser.add_argument('--objects-per-stream',     help='Objects per object stream', type=int, default = 100)
+
+def addProfileArgs(parser):
+    '''
+    Add the profiling options shared by the command line tools.
+    '''
+    parser.add_argument('--profile',        help='Write a profile of the run to this file', type=str, default = '')
+    parser.add_argument('--profile-format', help='Profile format', choices=['json', 'chrome'], default = '')
+
+def addCacheArgs(parser):
+    '''
+    Add the output cache option shared by the writing tools.
+    '''
+    parser.add_argument('-C', '--cache', help='Serve repeated jobs from the output cache', action='store_true')
+
+def addRepairArgs(parser):
+    '''
+    Add the option rebuilding broken cross reference sections of inputs.
+    '''
+    parser.add_argument('-R', '--repair', help='Rebuild broken cross reference sections', action='store_true')
+
+def addPasswordArgs(parser):
+    '''
+    Add the option giving the password of encrypted inputs.
+    '''
+    parser.add_argument('-W', '--password', help='Password of encrypted inputs', type=str, default = '')
+
+def writerOptions(args_d):
+    '''
+    Return the PdfStreamWriter keyword arguments for the compression
+    options in args_d.
+    '''
+    return {'objectStreams': bool(args_d.get('object_streams', False))
+          , 'compressLevel': min(9, max(0, int(args_d.get('compress_level', 6))))
+          , 'objectsPerStream': int(args_d.get('objects_per_stream', 100))}
+
+def batchBase(args):
+    '''
+    Return the command line arguments shared by every job in a batch.
+    '''
+    base = dict(vars(args))
+    for key in ('batch', 'workers', 'summary'):
+        base.pop(key, None)
+    return base
+
+def startxref(fh):
+    '''
+    Return the offset recorded after the last startxref keyword of fh.
+    '''
+    fh.seek(0, 2)
+    size = fh.tell()
+    fh.seek(max(0, size - 1024))
+    tail = fh.read()
+    i = tail.rfind(b'startxref')
+    if i < 0:
+        raise PyPDF2.utils.PdfReadError('startxref not found')
+    return int(tail[i + len(b'startxref'):].split()[0])
+
+def hasXrefStream(fh):
+    '''
+    Return true if the last cross reference section of fh is a
+    cross reference stream rather than a classic xref table.
+    '''
+    fh.seek(startxref(fh))
+    return fh.read(4) != b'xref'
+
+@profiled('incrementalUpdate')
+def appendIncrementalUpdate(doc, pageObjs, fh):
+    '''
+    Append an incremental update section to fh, a file opened for
+    appending that holds an exact copy of doc.
+    pageObjs - modified PageObjects read with doc.getPage()
+    Only the page dictionaries in pageObjs are written, followed by a
+    cross reference section (table or stream, matching the previous one)
+    and a trailer whose /Prev points at the original cross reference.
+    The original bytes are left untouched.
+    '''
+    G = PyPDF2.generic
+    trailer = doc.trailer
+    prev = startxref(doc.buf)
+    xrefStream = hasXrefStream(doc.buf)
+    size = trailer.get('/Size', 0)
+    if doc.reader is not None:
+        # PyPDF2 does not keep /Size for cross reference streams
+        for ids in list(doc.reader.xref.values()) + [doc.reader.xref_objStm]:
+            if ids:
+                size = max(size, max(ids) + 1)
+
+    fh.seek(0, 2)
+    fh.write(b'\n')
+    offsets = dict()
+    for pageObj in pageObjs:
+        ref = pageObj.indirectRef
+        offsets[ref.idnum] = (fh.tell(), ref.generation)
+        fh.write('{0} {1} obj\n'.format(ref.idnum, ref.generation).encode())
+        pageObj.writeToStream(fh, None)
+        fh.write(b'\nendobj\n')
+
+    newTrailer = G.DictionaryObject()
+    for key in ('/Root', '/Info', '/ID'):
+        if key in trailer:
+            newTrailer[G.NameObject(key)] = trailer.raw_get(key)
+    newTrailer[G.NameObject('/Prev')] = G.NumberObject(prev)
+
+    xref = fh.tell()
+    if xrefStream:
+        # The cross reference stream is itself a new object
+        offsets[size] = (xref, 0)
+        size += 1
+        ids = sorted(offsets)
+        width = max(4, (xref.bit_length() + 7) // 8)
+        data = b''
+        for idnum in ids:
+            offset, gen = offsets[idnum]
+            data += b'\x01' + offset.to_bytes(width, 'big') + gen.to_bytes(2, 'big')
+        index = list()
+        for idnum in ids:
+            index += [G.NumberObject(idnum), G.NumberObject(1)]
+        newTrailer[G.NameObject('/Type')] = G.NameObject('/XRef')
+        newTrailer[G.NameObject('/Size')] = G.NumberObject(size)
+        newTrailer[G.NameObject('/Index')] = G.ArrayObject(index)
+        newTrailer[G.NameObject('/W')] = G.ArrayObject(
+            [G.NumberObject(1), G.NumberObject(width), G.NumberObject(2)])
+        newTrailer[G.NameObject('/Length')] = G.NumberObject(len(data))
+        fh.write('{0} 0 obj\n'.format(size - 1).encode())
+        newTrailer.writeToStream(fh, None)
+        fh.write(b'\nstream\n' + data + b'\nendstream\nendobj\n')
+    else:
+        # Lead with the free list head; PyPDF2 treats a table that does not
+        # start at object 0 as mis-numbered
+        fh.write(b'xref\n0 1\n0000000000 65535 f\r\n')
+        for idnum in sorted(offsets):
+            offset, gen = offsets[idnum]
+            fh.write('{0} 1\n{1:010d} {2:05d} n\r\n'.format(idnum, offset, gen).encode())
+        newTrailer[G.NameObject('/Size')] = G.NumberObject(size)
+        fh.write(b'trailer\n')
+        newTrailer.writeToStream(fh, None)
+        fh.write(b'\n')
+    fh.write('startxref\n{0}\n%%EOF\n'.format(xref).encode())
+
+
+class PdfStreamWriter:
+    '''
+    Write a PDF file while its pages are being added.
+    Pages are taken from one source document at a time. The objects they
+    reference are serialized as soon as they are reached, so the writer
+    keeps only the output cross reference offsets in memory and a source
+    can be closed as soon as addPages() returns for it.
+
+    Stream data is copied as it is, still encoded. For unencrypted
+    sources it goes from the file mapping to the output in chunks and is
+    never held in memory as a whole.
+
+    With dedup, stream objects (fonts, images, form XObjects, ...) whose
+    dictionary and data are byte-identical to one already written, from
+    this or an earlier source, are written once and shared.
+
+    With objectStreams, every object other than a stream is packed into
+    a compressed object stream of up to objectsPerStream objects, written
+    as soon as it is full, and the cross reference section is written as
+    a compressed cross reference stream. The file is then PDF 1.5 at
+    least. compressLevel is the zlib level of both.
+
+    addPagesParallel() copies ranges of pages in worker processes, each
+    writing a segment of the file that is then appended to the output.
+
+    Usage:
+        W = PdfStreamWriter(fh)
+        W.addPages(doc1, range(doc1.numPages))
+        W.addPages(doc2, [2, 0], 'CW')
+        W.close()
+    '''
+    def __init__(self, fh, version='1.3', dedup=False, objectStreams=False
+               , compressLevel=6, objectsPerStream=100, segment=None):
+        self.fh = fh
+        # Cross reference subsections [first object number, entries]; an
+        # entry is a file offset, (object stream, index), or None if free
+        self.sections = [[0, [None]]]
+        self.pageIds = list()
+        if segment is not None:
+            # Write part of another writer's file: no header, objects
+            # numbered from firstId and pages below its page tree root
+            firstId, self.pagesId = segment
+            self.sections = [[firstId, list()]]
+        else:
+            self.pagesId = self._reserve()
+        self.objectsWritten = 0
+        self.dedup = dedup
+        self.streamIds = dict()  # content hash -> output object number
+        self.duplicates = 0
+        self.bytesSaved = 0
+        self.objectStreams = objectStreams
+        self.compressLevel = compressLevel
+        self.objectsPerStream = max(1, objectsPerStream)
+        self._packed = list()  # (object number, serialized object) not yet written
+        if objectStreams and version < '1.5':
+            version = '1.5'
+        if segment is None:
+            fh.write('%PDF-{0}\n'.format(version).encode() + b'%\xe2\xe3\xcf\xd3\n')
+
+    def _reserve(self):
+        first, entries = self.sections[-1]
+        entries.append(None)
+        return first + len(entries) - 1
+
+    def _setEntry(self, idnum, entry):
+        for first, entries in reversed(self.sections):
+            if idnum >= first:
+                entries[idnum - first] = entry
+                return
+
+    def _size(self):
+        first, entries = self.sections[-1]
+        return first + len(entries)
+
+    def _write(self, idnum, obj):
+        if self.objectStreams and not isinstance(obj, PyPDF2.generic.StreamObject):
+            data = BytesIO()
+            obj.writeToStream(data, None)
+            self._packed.append((idnum, data.getvalue()))
+            self.objectsWritten += 1
+            if len(self._packed) >= self.objectsPerStream:
+                self._writeObjectStream()
+        else:
+            self._writeDirect(idnum, obj)
+
+    def _writeDirect(self, idnum, obj):
+        self._setEntry(idnum, self.fh.tell())
+        self.fh.write('{0} 0 obj\n'.format(idnum).encode())
+        if isinstance(obj, PyPDF2.generic.StreamObject):
+            head, data = self._streamParts(obj)
+            self.fh.write(head)
+            if isinstance(data, ByteRange):
+                data.writeTo(self.fh)
+            else:
+                self.fh.write(data)
+            self.fh.write(b'\nendstream')
+        else:
+            obj.writeToStream(self.fh, None)
+        self.fh.write(b'\nendobj\n')
+        self.objectsWritten += 1
+
+    def _writeObjectStream(self):
+        '''
+        Write the objects packed so far as one compressed object stream.
+        '''
+        if not self._packed:
+            return
+        G = PyPDF2.generic
+        stmId = self._reserve()
+        header = list()
+        body = BytesIO()
+        for i, (idnum, data) in enumerate(self._packed):
+            header.append('{0} {1}'.format(idnum, body.tell()))
+            body.write(data)
+            body.write(b'\n')
+            self._setEntry(idnum, (stmId, i))
+        header = ' '.join(header).encode() + b'\n'
+        stm = G.StreamObject()
+        stm[G.NameObject('/Type')] = G.NameObject('/ObjStm')
+        stm[G.NameObject('/N')] = G.NumberObject(len(self._packed))
+        stm[G.NameObject('/First')] = G.NumberObject(len(header))
+        stm[G.NameObject('/Filter')] = G.NameObject('/FlateDecode')
+        stm._data = zlib.compress(header + body.getvalue(), self.compressLevel)
+        self._packed = list()
+        self._writeDirect(stmId, stm)
+
+    @staticmethod
+    def _streamParts(obj):
+        '''
+        Return the serialized dictionary of stream obj, up to and including
+        the stream keyword, and its data, which is bytes or a ByteRange.
+        The data is passed through as it is, still encoded.
+        '''
+        G = PyPDF2.generic
+        head = BytesIO()
+        d = G.DictionaryObject(obj)
+        d[G.NameObject('/Length')] = G.NumberObject(len(obj._data))
+        d.writeToStream(head, None)
+        head.write(b'\nstream\n')
+        return head.getvalue(), obj._data
+
+    @profiled('copyPages')
+    def addPages(self, doc, pageNums, rotation=None, progress=None, pageMap=None):
+        '''
+        Append pages of doc to the output.
+        pageNums - zero-based page numbers, in output order; repeats allowed
+        rotation - optional rotation applied to every page added, or a list
+                   with one rotation per page
+        progress - optional callback(i) called after the i-th page is written
+        pageMap  - optional (idnum, generation) of pages of doc written
+                   elsewhere in the output -> their output object number
+        '''
+        G = PyPDF2.generic
+        self._refMap = dict(pageMap or ())
+        self._pending = dict()
+        newIds = list()
+        for pageNum in pageNums:
+            newId = self._reserve()
+            newIds.append(newId)
+            ref = doc.getPageRef(pageNum)
+            if ref is not None:
+                self._refMap.setdefault((ref.idnum, ref.generation), newId)
+        if isinstance(rotation, (list, tuple)):
+            rotations = rotation
+        else:
+            rotations = [rotation] * len(newIds)
+        for i, (pageNum, newId) in enumerate(zip(pageNums, newIds)):
+            # Pages are read one at a time and the copy is rotated; a page
+            # may be added more than once
+            with span('getPage'):
+                pageObj = doc.getPage(pageNum)
+            newPage = PyPDF2.pdf.PageObject()
+            for key, value in list(pageObj.items()):
+                if key != '/Parent':
+                    newPage[key] = self._copy(doc, value)
+            newPage[G.NameObject('/Parent')] = G.IndirectObject(self.pagesId, 0, None)
+            rotatePage(newPage, rotations[i])
+            self._write(newId, newPage)
+            self.pageIds.append(newId)
+            if progress is not None:
+                progress(i + 1)
+        self._refMap = None
+        self._pending = None
+
+    @profiled('copyPagesParallel')
+    def addPagesParallel(self, doc, pageNums, rotation=None, progress=None
+                       , workers=None, tempdir=None):
+        '''
+        Append pages of doc to the output like addPages(), splitting them
+        into ranges that worker processes copy at the same time. Each
+        worker opens doc.pathfile itself, reusing the file key of an
+        encrypted doc, and writes its range, numbered in an object
+        number range of its own, to a segment file in tempdir; the
+        segments are then appended in order. Objects used
+        by pages of several ranges are written once per range.
+        progress - optional callback(i), called as ranges are appended
+        workers  - number of worker processes (default: number of CPUs)
+        '''
+        pageNums = list(pageNums)
+        if isinstance(rotation, (list, tuple)):
+            rotations = list(rotation)
+        else:
+            rotations = [rotation] * len(pageNums)
+        workers = workers or os.cpu_count() or 1
+        # A few ranges per worker keep the workers busy and progress moving
+        nchunks = max(1, min(len(pageNums), 4 * workers))
+        bounds = [len(pageNums) * k // nchunks for k in range(nchunks + 1)]
+        # A range cannot copy more objects than the source holds, plus one
+        # object per page it adds
+        sourceSize = int(doc.trailer.get('/Size', 0)) if doc.trailer is not None else 0
+        bases = list()
+        base = self._size()
+        pageMap = dict()
+        for k in range(nchunks):
+            bases.append(base)
+            for j, pageNum in enumerate(pageNums[bounds[k]:bounds[k + 1]]):
+                ref = doc.getPageRef(pageNum)
+                if ref is not None:
+                    pageMap.setdefault((ref.idnum, ref.generation), base + j)
+            base += sourceSize + 2 * (bounds[k + 1] - bounds[k]) + 1
+        options = {'dedup': self.dedup, 'objectStreams': self.objectStreams
+                 , 'compressLevel': self.compressLevel, 'objectsPerStream': self.objectsPerStream}
+        segfiles = list()
+        for k in range(nchunks):
+            fd, segfile = tempfile.mkstemp(prefix='.pdfseg-', suffix='.tmp', dir=tempdir)
+            os.close(fd)
+            segfiles.append(segfile)
+        try:
+            with concurrent.futures.ProcessPoolExecutor(min(workers, nchunks)) as ex:
+                futures = [ex.submit(_writeSegment, doc.pathfile, doc.repaired, doc.key
+                                   , pageNums[bounds[k]:bounds[k + 1]]
+                                   , rotations[bounds[k]:bounds[k + 1]]
+                                   , (bases[k], self.pagesId), options, pageMap, segfiles[k])
+                           for k in range(nchunks)]
+                try:
+                    for k, future in enumerate(futures):
+                        entries, pageIds, count = future.result()
+                        end = bases[k + 1] if k + 1 < nchunks else base
+                        if bases[k] + len(entries) > end:
+                            raise PyPDF2.utils.PdfReadError('Page range {0} used too many objects'.format(k + 1))
+                        start = self.fh.tell()
+                        with open(segfiles[k], 'rb') as fi:
+                            shutil.copyfileobj(fi, self.fh, AtomicWriter.bufferSize)
+                        self.sections.append([bases[k], [entry if isinstance(entry, tuple) else start + entry
+                                                         for entry in entries]])
+                        self.sections.append([bases[k] + len(entries), list()])
+                        self.pageIds.extend(pageIds)
+                        self.objectsWritten += count
+                        removeFile(segfiles[k])
+                        if progress is not None:
+                            progress(bounds[k + 1])
+                finally:
+                    for future in futures:
+                        future.cancel()
+        finally:
+            for segfile in segfiles:
+                removeFile(segfile)
+
+    def flush(self):
+        '''
+        Write the objects still waiting for an object stream.
+        '''
+        self._writeObjectStream()
+
+    def _copy(self, doc, obj):
+        '''
+        Return a copy of obj whose indirect references point at objects
+        written to the output. Referenced objects are written first.
+        References to pages that are not copied, and to page tree nodes,
+        become null so they do not drag the rest of doc along.
+        '''
+        G = PyPDF2.generic
+        if isinstance(obj, G.IndirectObject):
+            key = (obj.idnum, obj.generation)
+            if key in self._refMap:
+                return G.IndirectObject(self._refMap[key], 0, None)
+            if key in self._pending:
+                # Reference back to an object still being copied
+                if self._pending[key] is None:
+                    self._pending[key] = self._reserve()
+                return G.IndirectObject(self._pending[key], 0, None)
+            try:
+                target = doc.getObject(obj, cache=False, raw=True)
+            except XrefMismatchError:
+                raise
+            except PyPDF2.utils.PdfReadError:
+                return G.NullObject()
+            if isinstance(target, G.DictionaryObject) and target.get('/Type') in ('/Page', '/Pages'):
+                return G.NullObject()
+            self._pending[key] = None
+            new = self._copy(doc, target)
+            newId = self._pending.pop(key)
+            if self.dedup and newId is None and isinstance(new, G.StreamObject):
+                head, data = self._streamParts(new)
+                h = hashlib.sha256(head)
+                if isinstance(data, ByteRange):
+                    data.update(h)
+                else:
+                    h.update(data)
+                digest = h.digest()
+                if digest in self.streamIds:
+                    self.duplicates += 1
+                    self.bytesSaved += len(head) + len(data) + len(b'\nendstream')
+                    newId = self.streamIds[digest]
+                else:
+                    newId = self.streamIds[digest] = self._reserve()
+                    self._write(newId, new)
+                self._refMap[key] = newId
+                return G.IndirectObject(newId, 0, None)
+            if newId is None:
+                newId = self._reserve()
+            self._refMap[key] = newId
+            self._write(newId, new)
+            return G.IndirectObject(newId, 0, None)
+        elif isinstance(obj, G.StreamObject):
+            new = obj.__class__()
+            new._data = obj._data
+        elif isinstance(obj, G.DictionaryObject):
+            new = G.DictionaryObject()
+        elif isinstance(obj, G.ArrayObject):
+            return G.ArrayObject([self._copy(doc, item) for item in obj])
+        else:
+            return obj
+        for key, value in list(obj.items()):
+            new[key] = self._copy(doc, value)
+        return new
+
+    @profiled('writeXref')
+    def close(self):
+        '''
+        Write the page tree, catalog, cross reference table and trailer.
+        '''
+        G = PyPDF2.generic
+        count('pages', len(self.pageIds))
+        count('objectsCopied', self.objectsWritten)
+        pages = G.DictionaryObject()
+        pages[G.NameObject('/Type')] = G.NameObject('/Pages')
+        pages[G.NameObject('/Kids')] = G.ArrayObject(
+            [G.IndirectObject(idnum, 0, None) for idnum in self.pageIds])
+        pages[G.NameObject('/Count')] = G.NumberObject(len(self.pageIds))
+        self._write(self.pagesId, pages)
+        catalog = G.DictionaryObject()
+        catalog[G.NameObject('/Type')] = G.NameObject('/Catalog')
+        catalog[G.NameObject('/Pages')] = G.IndirectObject(self.pagesId, 0, None)
+        rootId = self._reserve()
+        self._write(rootId, catalog)
+        info = G.DictionaryObject()
+        info[G.NameObject('/Producer')] = G.createStringObject('PyPDF2')
+        infoId = self._reserve()
+        self._write(infoId, info)
+        if self.objectStreams:
+            self._writeObjectStream()
+            self._writeXrefStream(rootId, infoId)
+            return
+
+        xref = self.fh.tell()
+        self.fh.write(b'xref\n')
+        for first, entries in self.sections:
+            if not entries:
+                continue
+            self.fh.write('{0} {1}\n'.format(first, len(entries)).encode())
+            for entry in entries:
+                if entry is None:
+                    self.fh.write(b'0000000000 65535 f\r\n')
+                else:
+                    self.fh.write('{0:010d} 00000 n\r\n'.format(entry).encode())
+        trailer = G.DictionaryObject()
+        trailer[G.NameObject('/Size')] = G.NumberObject(self._size())
+        trailer[G.NameObject('/Root')] = G.IndirectObject(rootId, 0, None)
+        trailer[G.NameObject('/Info')] = G.IndirectObject(infoId, 0, None)
+        self.fh.write(b'trailer\n')
+        trailer.writeToStream(self.fh, None)
+        self.fh.write('\nstartxref\n{0}\n%%EOF\n'.format(xref).encode())
+
+    def _writeXrefStream(self, rootId, infoId):
+        '''
+        Write a compressed cross reference stream, which is also the
+        trailer, covering plain and packed objects.
+        '''
+        G = PyPDF2.generic
+        xrefId = self._reserve()
+        xref = self.fh.tell()
+        self._setEntry(xrefId, xref)
+        width = max(1, (max(xref, self._size()).bit_length() + 7) // 8)
+        rows = bytearray()
+        index = list()
+        for first, entries in self.sections:
+            if not entries:
+                continue
+            index += [G.NumberObject(first), G.NumberObject(len(entries))]
+            for entry in entries:
+                if entry is None:
+                    rows += b'\x00' + bytes(width) + b'\xff\xff'
+                elif isinstance(entry, tuple):
+                    rows += b'\x02' + entry[0].to_bytes(width, 'big') + entry[1].to_bytes(2, 'big')
+                else:
+                    rows += b'\x01' + entry.to_bytes(width, 'big') + b'\x00\x00'
+        stm = G.StreamObject()
+        stm[G.NameObject('/Type')] = G.NameObject('/XRef')
+        stm[G.NameObject('/Size')] = G.NumberObject(self._size())
+        if len(index) > 2:
+            stm[G.NameObject('/Index')] = G.ArrayObject(index)
+        stm[G.NameObject('/W')] = G.ArrayObject(
+            [G.NumberObject(1), G.NumberObject(width), G.NumberObject(2)])
+        stm[G.NameObject('/Root')] = G.IndirectObject(rootId, 0, None)
+        stm[G.NameObject('/Info')] = G.IndirectObject(infoId, 0, None)
+        stm[G.NameObject('/Filter')] = G.NameObject('/FlateDecode')
+        stm._data = zlib.compress(bytes(rows), self.compressLevel)
+        self._writeDirect(xrefId, stm)
+        self.fh.write('startxref\n{0}\n%%EOF\n'.format(xref).encode())
+
+def _writeSegment(pathfile, repair, key, pageNums, rotations, segment, options, pageMap, segfile):
+    '''
+    Worker of PdfStreamWriter.addPagesParallel(): write pageNums of
+    pathfile, decrypted with file key key, to segfile and return its
+    cross reference entries, relative to the start of segfile, the
+    object numbers of its pages and the number of objects written.
+    '''
+    with PdfDoc(pathfile, repair, key=key) as doc, open(segfile, 'wb', buffering=AtomicWriter.bufferSize) as fh:
+        W = PdfStreamWriter(fh, segment=segment, **options)
+        W.addPages(doc, pageNums, rotations, pageMap=pageMap)
+        W.flush()
+    return W.sections[0][1], W.pageIds, W.objectsWritten
+
+class _BitWriter:
+    '''
+    Accumulate unsigned integers of given bit widths, most significant
+    bit first, as used by the hint tables of linearized files.
+    '''
+    def __init__(self):
+        self.data = bytearray()
+        self.acc = 0
+        self.nbits = 0
+
+    def write(self, value, nbits):
+        self.acc = (self.acc << nbits) | value
+        self.nbits += nbits
+        while self.nbits >= 8:
+            self.nbits -= 8
+            self.data.append((self.acc >> self.nbits) & 0xff)
+        self.acc &= (1 << self.nbits) - 1
+
+    def align(self):
+        if self.nbits:
+            self.write(0, 8 - self.nbits)
+
+class _BitReader:
+    def __init__(self, data, pos=0):
+        self.data = data
+        self.bit = 8 * pos
+
+    def read(self, nbits):
+        value = 0
+        for i in range(nbits):
+            byte = self.data[self.bit >> 3]
+            value = (value << 1) | ((byte >> (7 - (self.bit & 7))) & 1)
+            self.bit += 1
+        return value
+
+    def align(self):
+        self.bit = (self.bit + 7) // 8 * 8
+
+def _bits(value):
+    return int(value).bit_length()
+
+class PdfLinearizer:
+    '''
+    Write a linearized ("fast web view") copy of a document, so that a
+    viewer reading the file from its start can display the first page
+    before the rest has arrived.
+    The layout follows Annex F of the PDF reference: the linearization
+    parameter dictionary and the first page cross reference table come
+    first, then the catalog, the hint stream and the first page with
+    every object it uses; then each other page with the objects only it
+    uses, the objects shared by several pages, the remaining objects and
+    the main cross reference table. Objects are renumbered, the page tree
+    is flattened and stream data is passed through.
+    The offsets recorded in the parameter dictionary and the hint tables
+    are found by laying the file out before it is written, so that the
+    serialized objects, but not their stream data, are held in memory.
+
+    Usage:
+        with PdfDoc('in.pdf') as doc, open('out.pdf', 'wb') as fh:
+            PdfLinearizer(doc).write(fh)
+    '''
+    def __init__(self, doc):
+        if doc.index is None:
+            raise PyPDF2.utils.PdfReadError('Cannot linearize an encrypted document')
+        if not doc.numPages:
+            raise PyPDF2.utils.PdfReadError('Cannot linearize a document without pages')
+        self.doc = doc
+        self.kind = dict()  # source key -> 'obj', 'page', 'pages' or 'null'
+        self.kids = dict()  # source key -> keys of the objects it references
+        self._scan()
+        self._number()
+
+    @staticmethod
+    def _refs(obj, out):
+        G = PyPDF2.generic
+        if isinstance(obj, G.IndirectObject):
+            out.append((obj.idnum, obj.generation))
+        elif isinstance(obj, G.DictionaryObject):
+            for value in obj.values():
+                PdfLinearizer._refs(value, out)
+        elif isinstance(obj, G.ArrayObject):
+            for item in obj:
+                PdfLinearizer._refs(item, out)
+        return out
+
+    def _kindOf(self, key):
+        if key not in self.kind:
+            G = PyPDF2.generic
+            if key in self.pageIndex:
+                self.kind[key] = 'page'
+                return 'page'
+            try:
+                target = self.doc.getObject(G.IndirectObject(key[0], key[1], None), cache=False, raw=True)
+            except XrefMismatchError:
+                raise
+            except PyPDF2.utils.PdfReadError:
+                target = G.NullObject()
+            if isinstance(target, G.NullObject):
+                self.kind[key] = 'null'
+            elif isinstance(target, G.DictionaryObject) and target.get('/Type') == '/Pages':
+                self.kind[key] = 'pages'
+            elif isinstance(target, G.DictionaryObject) and target.get('/Type') == '/Page':
+                # A page outside the page tree
+                self.kind[key] = 'null'
+            else:
+                self.kind[key] = 'obj'
+                self.kids[key] = self._refs(target, list())
+        return self.kind[key]
+
+    def _walk(self, keys, seen):
+        '''
+        Return the objects reachable from keys that are not in seen, in
+        depth-first order, and add them to seen. Pages and page tree
+        nodes are not followed.
+        '''
+        order = list()
+        stack = list(reversed(keys))
+        while stack:
+            key = stack.pop()
+            if key in seen or self._kindOf(key) != 'obj':
+                continue
+            seen.add(key)
+            order.append(key)
+            stack.extend(reversed(self.kids[key]))
+        return order
+
+    def _pageRefs(self, page):
+        return self._refs(PyPDF2.generic.ArrayObject(
+            value for key, value in page.items() if key != '/Parent'), list())
+
+    def _scan(self):
+        '''
+        Find the objects used by each page and sort them into the parts
+        of the linearized file.
+        '''
+        doc = self.doc
+        N = doc.numPages
+        self.pageKeys = list()
+        for pageNum in range(N):
+            ref = doc.getPageRef(pageNum)
+            if ref is None:
+                raise PyPDF2.utils.PdfReadError('Page {0} is not an indirect object'.format(pageNum + 1))
+            self.pageKeys.append((ref.idnum, ref.generation))
+        self.pageIndex = dict((key, i) for i, key in enumerate(self.pageKeys))
+        if len(self.pageIndex) != N:
+            raise PyPDF2.utils.PdfReadError('A page appears twice in the page tree')
+
+        closures = [self._walk(self._pageRefs(doc.getPage(pageNum)), set()) for pageNum in range(N)]
+        self.part6 = closures[0]
+        first = set(self.part6)
+        owner = dict()  # object -> the only page using it, or -1 if shared
+        for pageNum in range(1, N):
+            for key in closures[pageNum]:
+                if key not in first:
+                    owner[key] = pageNum if owner.get(key, pageNum) == pageNum else -1
+        self.part7 = [[key for key in closures[pageNum] if owner.get(key) == pageNum]
+                      for pageNum in range(N)]
+        self.part7[0] = list()
+        self.part8 = list()
+        placed = set(first)
+        for pageNum in range(1, N):
+            for key in closures[pageNum]:
+                if owner.get(key) == -1 and key not in placed:
+                    placed.add(key)
+                    self.part8.append(key)
+        # Shared object hint table entries: the first page objects, then
+        # the shared objects, one object per group
+        groups = dict((key, i + 1) for i, key in enumerate(self.part6))
+        groups.update((key, len(self.part6) + 1 + i) for i, key in enumerate(self.part8))
+        self.sharedRefs = [list()] + [[groups[key] for key in closures[pageNum]
+                                       if key in first or owner.get(key) == -1]
+                                      for pageNum in range(1, N)]
+
+        for pageNum in range(N):
+            placed.update(self.part7[pageNum])
+        self.rootKey = None
+        roots = list()
+        rootRef = doc.trailer.raw_get('/Root')
+        if isinstance(rootRef, PyPDF2.generic.IndirectObject):
+            self.rootKey = (rootRef.idnum, rootRef.generation)
+            placed.add(self.rootKey)
+        self.catalog = doc.getObject(rootRef, cache=False, raw=True) if isinstance(
+            rootRef, PyPDF2.generic.IndirectObject) else rootRef
+        for key, value in self.catalog.items():
+            if key != '/Pages':
+                self._refs(value, roots)
+        self.info = doc.trailer.raw_get('/Info') if '/Info' in doc.trailer else None
+        self._refs(self.info, roots)
+        self.part9 = self._walk(roots, placed)
+
+    def _number(self):
+        '''
+        Number the objects: the main part from 1, in file order, and the
+        first page part after it, starting with the parameter dictionary.
+        '''
+        self.ids = dict()
+        self.pageIds = [None] * len(self.pageKeys)
+        self.main = list()  # (new id, source) in file order
+        idnum = 1
+        for pageNum in range(1, len(self.pageKeys)):
+            self.pageIds[pageNum] = idnum
+            self.main.append((idnum, ('page', pageNum)))
+            idnum += 1
+            for key in self.part7[pageNum]:
+                self.ids[key] = idnum
+                self.main.append((idnum, ('obj', key)))
+                idnum += 1
+        self.firstShared = idnum
+        for key in self.part8:
+            self.ids[key] = idnum
+            self.main.append((idnum, ('obj', key)))
+            idnum += 1
+        self.pagesId = idnum
+        self.main.append((idnum, ('pages', None)))
+        idnum += 1
+        for key in self.part9:
+            self.ids[key] = idnum
+            self.main.append((idnum, ('obj', key)))
+            idnum += 1
+        self.mainSize = idnum
+        self.linId = idnum
+        self.catalogId = idnum + 1
+        self.hintId = idnum + 2
+        self.pageIds[0] = idnum + 3
+        self.first = [(self.pageIds[0], ('page', 0))]
+        idnum += 4
+        for key in self.part6:
+            self.ids[key] = idnum
+            self.first.append((idnum, ('obj', key)))
+            idnum += 1
+        self.size = idnum
+
+    def _renumber(self, obj):
+        G = PyPDF2.generic
+        if isinstance(obj, G.IndirectObject):
+            key = (obj.idnum, obj.generation)
+            kind = self._kindOf(key) if key != self.rootKey else 'root'
+            if kind == 'page':
+                return G.IndirectObject(self.pageIds[self.pageIndex[key]], 0, None)
+            elif kind == 'pages':
+                return G.IndirectObject(self.pagesId, 0, None)
+            elif kind == 'root':
+                return G.IndirectObject(self.catalogId, 0, None)
+            elif key in self.ids:
+                return G.IndirectObject(self.ids[key], 0, None)
+            return G.NullObject()
+        elif isinstance(obj, G.StreamObject):
+            new = obj.__class__()
+            new._data = obj._data
+        elif isinstance(obj, G.DictionaryObject):
+            new = G.DictionaryObject()
+        elif isinstance(obj, G.ArrayObject):
+            return G.ArrayObject([self._renumber(item) for item in obj])
+        else:
+            return obj
+        for key, value in list(obj.items()):
+            new[key] = self._renumber(value)
+        return new
+
+    def _object(self, source):
+        '''
+        Return the output object for source, with renumbered references.
+        '''
+        G = PyPDF2.generic
+        what, key = source
+        if what == 'page':
+            page = self.doc.getPage(key)
+            new = G.DictionaryObject()
+            for name, value in list(page.items()):
+                if name != '/Parent':
+                    new[name] = self._renumber(value)
+            new[G.NameObject('/Parent')] = G.IndirectObject(self.pagesId, 0, None)
+            return new
+        elif what == 'pages':
+            new = G.DictionaryObject()
+            new[G.NameObject('/Type')] = G.NameObject('/Pages')
+            new[G.NameObject('/Kids')] = G.ArrayObject(
+                [G.IndirectObject(idnum, 0, None) for idnum in self.pageIds])
+            new[G.NameObject('/Count')] = G.NumberObject(len(self.pageIds))
+            return new
+        elif what == 'catalog':
+            new = self._renumber(self.catalog)
+            new[G.NameObject('/Pages')] = G.IndirectObject(self.pagesId, 0, None)
+            return new
+        return self._renumber(self.doc.getObject(G.IndirectObject(key[0], key[1], None), cache=False, raw=True))
+
+    def _serialize(self, idnum, source):
+        '''
+        Return the parts of object idnum as written: bytes, and the
+        ByteRange of stream data passed through.
+        '''
+        obj = self._object(source)
+        out = BytesIO()
+        out.write('{0} 0 obj\n'.format(idnum).encode())
+        if isinstance(obj, PyPDF2.generic.StreamObject):
+            head, data = PdfStreamWriter._streamParts(obj)
+            out.write(head)
+            return [out.getvalue(), data, b'\nendstream\nendobj\n']
+        obj.writeToStream(out, None)
+        out.write(b'\nendobj\n')
+        return [out.getvalue()]
+
+    def _linDict(self, L, hint, hintLength, E, T):
+        return ('{0} 0 obj\n<< /Linearized 1 /L {1} /H [ {2} {3} ] /O {4} /E {5} /N {6} /T {7} >>'
+                .format(self.linId, L, hint, hintLength, self.pageIds[0], E, len(self.pageIds), T)).encode()
+
+    def _firstXref(self, offsets, mainXref):
+        out = BytesIO()
+        # Lead with the free list head, as PyPDF2 takes a table that does
+        # not start at object 0 for a mis-numbered one
+        out.write('xref\n0 1\n0000000000 65535 f\r\n{0} {1}\n'.format(self.linId, self.size - self.linId).encode())
+        for idnum in range(self.linId, self.size):
+            out.write('{0:010d} 00000 n\r\n'.format(offsets[idnum]).encode())
+        infoId = self.ids.get((self.info.idnum, self.info.generation)) if isinstance(
+            self.info, PyPDF2.generic.IndirectObject) else None
+        out.write('trailer\n<< /Size {0} /Root {1} 0 R'.format(self.size, self.catalogId).encode())
+        if infoId is not None:
+            out.write(' /Info {0} 0 R'.format(infoId).encode())
+        out.write(' /Prev {0} >>\nstartxref\n0\n%%EOF\n'.format(mainXref).encode())
+        return out.getvalue()
+
+    def _mainXref(self, offsets, firstXref):
+        out = BytesIO()
+        out.write('xref\n0 {0}\n0000000000 65535 f\r\n'.format(self.mainSize).encode())
+        for idnum in range(1, self.mainSize):
+            out.write('{0:010d} 00000 n\r\n'.format(offsets[idnum]).encode())
+        out.write('trailer\n<< /Size {0} >>\nstartxref\n{1}\n%%EOF\n'.format(self.mainSize, firstXref).encode())
+        return out.getvalue()
+
+    def _hints(self, offsets, lengths, E):
+        '''
+        Return the hint stream data: the page offset hint table, then
+        the shared object hint table, and the offset of the latter.
+        '''
+        N = len(self.pageIds)
+        nobjects = [1 + len(self.part6)] + [1 + len(self.part7[i]) for i in range(1, N)]
+        pageLength = [E - offsets[self.pageIds[0]]]
+        for i in range(1, N):
+            pageLength.append(lengths[self.pageIds[i]]
+                              + sum(lengths[self.ids[key]] for key in self.part7[i]))
+        nshared = [len(refs) for refs in self.sharedRefs]
+        maxShared = max([ref for refs in self.sharedRefs for ref in refs] or [0])
+        minObjects, minLength = min(nobjects), min(pageLength)
+        bitsObjects = _bits(max(nobjects) - minObjects)
+        bitsLength = _bits(max(pageLength) - minLength)
+        bitsShared = _bits(max(nshared))
+        bitsId = _bits(maxShared)
+
+        w = _BitWriter()
+        # Content streams are described as spanning the whole page
+        for value, nbits in ((minObjects, 32), (offsets[self.pageIds[0]], 32), (bitsObjects, 16)
+                           , (minLength, 32), (bitsLength, 16), (0, 32), (0, 16)
+                           , (minLength, 32), (bitsLength, 16), (bitsShared, 16)
+                           , (bitsId, 16), (0, 16), (1, 16)):
+            w.write(value, nbits)
+        for i in range(N):
+            w.write(nobjects[i] - minObjects, bitsObjects)
+        w.align()
+        for i in range(N):
+            w.write(pageLength[i] - minLength, bitsLength)
+        w.align()
+        for i in range(N):
+            w.write(nshared[i], bitsShared)
+        w.align()
+        for refs in self.sharedRefs:
+            for ref in refs:
+                w.write(ref, bitsId)
+        w.align()
+        # No numerators, no content stream offsets
+        w.align()
+        w.align()
+        for i in range(N):
+            w.write(pageLength[i] - minLength, bitsLength)
+        w.align()
+        sharedOffset = len(w.data)
+
+        groups = [self.pageIds[0]] + [self.ids[key] for key in self.part6] + [self.ids[key] for key in self.part8]
+        groupLength = [lengths[idnum] for idnum in groups]
+        minGroup = min(groupLength)
+        bitsGroup = _bits(max(groupLength) - minGroup)
+        firstShared = self.ids[self.part8[0]] if self.part8 else 0
+        for value, nbits in ((firstShared, 32), (offsets[firstShared] if self.part8 else 0, 32)
+                           , (1 + len(self.part6), 32), (len(groups), 32), (0, 16)
+                           , (minGroup, 32), (bitsGroup, 16)):
+            w.write(value, nbits)
+        for length in groupLength:
+            w.write(length - minGroup, bitsGroup)
+        w.align()
+        for length in groupLength:
+            w.write(0, 1)
+        w.align()
+        return bytes(w.data), sharedOffset
+
+    def _hintObject(self, data, sharedOffset):
+        return ('{0} 0 obj\n<< /Length {1} /S {2} >>\nstream\n'.format(
+            self.hintId, len(data), sharedOffset)).encode() + data + b'\nendstream\nendobj\n'
+
+    def write(self, fh):
+        '''
+        Write the linearized document to fh.
+        '''
+        header = '%PDF-{0}\n'.format(self.doc.version).encode() + b'%\xe2\xe3\xcf\xd3\n'
+        order = [(self.catalogId, ('catalog', None))] + self.first + self.main
+        # Serialized objects are kept until they are written; stream data
+        # stays in the source file
+        parts = dict()
+        lengths = dict()
+        for idnum, source in order:
+            parts[idnum] = self._serialize(idnum, source)
+            lengths[idnum] = sum(len(part) for part in parts[idnum])
+
+        # The parameter dictionary, the first page cross reference table and
+        # the hint stream record offsets that depend on their own lengths.
+        # Lay the file out until those lengths settle; each only grows, and
+        # is padded to the length it settled at.
+        linLength = firstLength = hintLength = hintPad = 0
+        for attempt in range(20):
+            offsets = dict()
+            pos = len(header)
+            offsets[self.linId] = pos
+            pos += linLength
+            firstXref = pos
+            pos += firstLength
+            offsets[self.catalogId] = pos
+            pos += lengths[self.catalogId]
+            offsets[self.hintId] = hint = pos
+            pos += hintLength
+            for idnum, source in self.first + [(None, None)] + self.main:
+                if idnum is None:
+                    E = pos
+                    continue
+                offsets[idnum] = pos
+                pos += lengths[idnum]
+            mainXref = pos
+            data, sharedOffset = self._hints(offsets, lengths, E)
+            hintPad = max(hintPad, len(data))
+            hintObject = self._hintObject(data + bytes(hintPad - len(data)), sharedOffset)
+            mainTable = self._mainXref(offsets, firstXref)
+            L = mainXref + len(mainTable)
+            T = mainXref + len('xref\n0 {0}\n'.format(self.mainSize)) - 1
+            lin = self._linDict(L, hint, hintLength, E, T) + b'\nendobj\n'
+            first = self._firstXref(offsets, mainXref)
+            if len(lin) <= linLength and len(first) <= firstLength and len(hintObject) == hintLength:
+                break
+            linLength = max(linLength, len(lin))
+            firstLength = max(firstLength, len(first))
+            hintLength = max(hintLength, len(hintObject))
+        else:
+            raise PyPDF2.utils.PdfReadError('Linearized layout does not settle')
+
+        start = fh.tell()
+        fh.write(header)
+        fh.write(lin[:-len(b'\nendobj\n')] + b' ' * (linLength - len(lin)) + b'\nendobj\n')
+        fh.write(first + b' ' * (firstLength - len(first)))
+        self._writeObject(fh, parts.pop(self.catalogId))
+        fh.write(hintObject)
+        for idnum, source in self.first + self.main:
+            self._writeObject(fh, parts.pop(idnum))
+        fh.write(mainTable)
+        if fh.tell() - start != L:
+            raise PyPDF2.utils.PdfReadError('Linearized file length differs from its layout')
+
+    @staticmethod
+    def _writeObject(fh, parts):
+        for part in parts:
+            if isinstance(part, ByteRange):
+                part.writeTo(fh)
+            else:
+                fh.write(part)
+
+def checkLinearized(pathfile):
+    '''
+    Check the linearization of pathfile.
+    Returns None if the file is not linearized, otherwise a list of the
+    problems found, empty when the parameter dictionary, the cross
+    reference tables and the hint tables all agree with the file.
+    '''
+    G = PyPDF2.generic
+    with PdfDoc(pathfile) as doc:
+        if doc.index is None:
+            return None
+        index = doc.index
+        m = re.compile(rb'%PDF-[^\r\n]*[\r\n]+(%[^\r\n]*[\r\n]+)?').match(doc.buf)
+        try:
+            lin = index._readObjectAt(m.end() if m else 0)
+            linId = int(index._objHeader.match(doc.buf, m.end() if m else 0).group(1))
+        except Exception:
+            return None
+        if not isinstance(lin, G.DictionaryObject) or '/Linearized' not in lin:
+            return None
+        problems = list()
+        size = len(doc.buf)
+        try:
+            L, (hint, hintLength), O, E, N, T = (lin['/L'], list(lin['/H'])[:2], lin['/O']
+                                                , lin['/E'], lin['/N'], lin['/T'])
+        except (KeyError, ValueError):
+            return ['Incomplete linearization parameter dictionary']
+        if L != size:
+            problems.append('/L is {0}, the file length is {1}'.format(L, size))
+        if N != doc.numPages:
+            problems.append('/N is {0}, the document has {1} pages'.format(N, doc.numPages))
+        page0 = doc.getPageRef(0)
+        if page0 is None or page0.idnum != O:
+            problems.append('/O is {0}, not the first page object'.format(O))
+
+        # The first page cross reference table follows the dictionary and
+        # the last startxref points at it; its /Prev is the main table
+        end = doc.buf.find(b'endobj', m.end() if m else 0) + len(b'endobj')
+        firstXref = re.compile(rb'\s*').match(doc.buf, end).end()
+        if doc.buf[firstXref:firstXref + 4] != b'xref':
+            problems.append('No cross reference table after the parameter dictionary')
+        elif startxref(doc.buf) != firstXref:
+            problems.append('The last startxref does not point at the first page cross reference table')
+        entry = index.entry(linId)
+        if entry is None or entry[0] != 'n':
+            problems.append('The parameter dictionary is not in the first page cross reference table')
+        else:
+            doc.buf.seek(firstXref + 4)
+            first = index._readXrefTable(firstXref, firstXref + 4)
+            prev = first.get('/Prev')
+            if prev is None or doc.buf[prev:prev + 4] != b'xref':
+                problems.append('The first page trailer does not point at the main cross reference table')
+            else:
+                sub = index._xrefSubsection.match(doc.buf, prev + 4)
+                if sub is None or sub.end() - 1 != T:
+                    problems.append('/T does not point at the first entry of the main cross reference table')
+
+        def offset(idnum):
+            entry = index.entry(idnum)
+            return entry[1] if entry is not None and entry[0] == 'n' else None
+
+        # Every object used by the first page lies before /E
+        seen = set()
+        stack = [page0] if page0 is not None else []
+        while stack:
+            ref = stack.pop()
+            if ref.idnum in seen:
+                continue
+            seen.add(ref.idnum)
+            if offset(ref.idnum) is None or offset(ref.idnum) >= E:
+                problems.append('Object {0} of the first page is not before /E'.format(ref.idnum))
+                break
+            obj = doc.getObject(ref, cache=False, raw=True)
+            refs = PdfLinearizer._refs(G.ArrayObject(value for key, value in obj.items()
+                                       if key != '/Parent') if isinstance(obj, G.DictionaryObject)
+                                       and obj.get('/Type') == '/Page' else obj, list())
+            for key in refs:
+                target = doc.getObject(G.IndirectObject(key[0], key[1], None), cache=False, raw=True)
+                if not (isinstance(target, G.DictionaryObject) and target.get('/Type') in ('/Page', '/Pages')):
+                    stack.append(G.IndirectObject(key[0], key[1], None))
+
+        # The hint tables locate every page
+        try:
+            m2 = index._objHeader.match(doc.buf, hint)
+            stream = index._readObjectAt(hint)
+            data = stream.getData()
+            if m2 is None or not doc.buf[hint:hint + hintLength].rstrip().endswith(b'endobj'):
+                problems.append('/H does not span the hint stream')
+            r = _BitReader(data)
+            (minObjects, firstOffset, bitsObjects, minLength, bitsLength, minContentOffset
+             , bitsContentOffset, minContentLength, bitsContentLength, bitsShared, bitsId
+             , bitsNumerator, denominator) = [r.read(n) for n in (32, 32, 16, 32, 16, 32, 16
+                                                                 , 32, 16, 16, 16, 16, 16)]
+            nobjects = [minObjects + r.read(bitsObjects) for i in range(N)]
+            r.align()
+            lengths = [minLength + r.read(bitsLength) for i in range(N)]
+            r.align()
+            nshared = [r.read(bitsShared) for i in range(N)]
+            r.align()
+            shared = [[r.read(bitsId) for j in range(k)] for k in nshared]
+            r.align()
+            s = _BitReader(data, stream['/S'])
+            firstShared, firstSharedOffset, nsharedFirst, nsharedTotal = [s.read(32) for i in range(4)]
+            # Each page section holds as many objects as the table says
+            starts = sorted(filter(None, (offset(idnum) for idnum in range(1, int(index.trailer['/Size'])))))
+            def objectsIn(start, length):
+                return bisect.bisect_left(starts, start + length) - bisect.bisect_left(starts, start)
+            if firstOffset != offset(O):
+                problems.append('The hint table does not locate the first page')
+            pos = firstOffset + lengths[0]
+            if pos != E:
+                problems.append('The hint table length of the first page does not end at /E')
+            if objectsIn(firstOffset, lengths[0]) != nobjects[0]:
+                problems.append('The hint table object count of the first page is wrong')
+            for i in range(1, N):
+                ref = doc.getPageRef(i)
+                if ref is None or offset(ref.idnum) != pos:
+                    problems.append('The hint table does not locate page {0}'.format(i + 1))
+                    break
+                if objectsIn(pos, lengths[i]) != nobjects[i]:
+                    problems.append('The hint table object count of page {0} is wrong'.format(i + 1))
+                    break
+                pos += lengths[i]
+            if any(ref >= nsharedTotal for refs in shared for ref in refs):
+                problems.append('A page refers to an undefined shared object group')
+            if firstShared and offset(firstShared) != firstSharedOffset:
+                problems.append('The shared object hint table does not locate the shared objects')
+        except Exception as e:
+            problems.append('Cannot read the hint stream: {0}'.format(e))
+        return problems